@@ -1,7 +1,38 @@
 import uvicorn
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
+from src.utils.settings import ASSISTANT_CONFIG_SYNC
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The assistant config is synced in the background, so startup doesn't wait for OpenAI
+    if ASSISTANT_CONFIG_SYNC:
+        app.state.assistant_sync_task = asyncio.create_task(sync_assistant_config())
+    # Empty threads for /chat/create are pre-created in the background
+    from src.domains.chat.thread_pool import prewarmed_thread_pool
+    if prewarmed_thread_pool.enabled:
+        app.state.thread_pool_task = asyncio.create_task(prewarmed_thread_pool.run())
+    yield
+    # A sync still waiting for OpenAI doesn't outlive the app
+    if ASSISTANT_CONFIG_SYNC:
+        app.state.assistant_sync_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await app.state.assistant_sync_task
+    if prewarmed_thread_pool.enabled:
+        app.state.thread_pool_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await app.state.thread_pool_task
+        await prewarmed_thread_pool.drain()
+
+async def sync_assistant_config():
+    from src.domains.openai_integration.assistant_sync import sync_assistant_config
+    try:
+        await asyncio.to_thread(sync_assistant_config, Database().session_factory)
+    except Exception as error:
+        print("Could not sync the Binna assistant config", repr(error))
+
+app = FastAPI(lifespan=lifespan)
 
 # Initializing database
 from src.database.database import Database
@@ -6,8 +6,39 @@ import os
 # Import like this: from src.domains.task import models as task_models
 from src.domains.auth import models as auth_models
 from src.domains.customer import models as customer_models
+from src.domains.chat import models as chat_models
+from src.domains.openai_integration import models as openai_integration_models
+from src.domains.chat.search import create_search_index
 from src.utils.settings import USE_MYSQL, MYSQL_CONNECTION_URL
 
+class UnitOfWorkSession(Session):
+    """
+    Session that can group the work of several controllers in a single transaction. Between
+    `begin_unit_of_work` and `end_unit_of_work` the `commit()` of the controllers only flushes
+    (the rows get their ids, nothing is committed), and the whole unit is committed or rolled
+    back at the end.
+    """
+    in_unit_of_work = False
+
+    def commit(self):
+        if self.in_unit_of_work:
+            self.flush()
+            return
+        super().commit()
+
+    def begin_unit_of_work(self):
+        self.in_unit_of_work = True
+
+    def end_unit_of_work(self, commit: bool):
+        """
+        Commit or roll back the work done since `begin_unit_of_work`
+        """
+        self.in_unit_of_work = False
+        if commit:
+            self.commit()
+        else:
+            self.rollback()
+
 class Databases:
     LOCAL = os.path.join("db", "local_database.db")
     TEST = os.path.join("db", "test_database.db")
@@ -21,11 +52,19 @@ class Database:
         self.engine = create_engine(self.connection_url)
 
     def get_db_session(self) -> Generator[Session, None, None]:
-        with Session(self.engine) as session:
+        with UnitOfWorkSession(self.engine) as session:
             yield session
 
+    def session_factory(self) -> UnitOfWorkSession:
+        """
+        Open a new standalone session. The caller owns it and must close it (use it as a
+        context manager) so the pooled connection is released as soon as the work is done.
+        """
+        return UnitOfWorkSession(self.engine)
+
     def migrate(self):
         SQLModel.metadata.create_all(self.engine)
+        create_search_index(self.engine)
 
     def drop_all_tables(self):
         SQLModel.metadata.drop_all(self.engine)
\ No newline at end of file
@@ -1,5 +1,6 @@
-from sqlmodel import Session, select
+from sqlmodel import Session, func, select
 from typing import Optional
+from src.domains.auth.models.user import User
 from src.domains.auth.models.user_usage import UserUsage
 from src.domains.auth.models.user_usage_limit import UserUsageLimit
 from datetime import datetime
@@ -27,7 +28,11 @@ class UserUsageController:
         total_tokens: Optional[int] = None,
         prompt_tokens: Optional[int] = None,
         completion_tokens: Optional[int] = None,
-        cached_tokens: Optional[int] = None
+        cached_tokens: Optional[int] = None,
+        saved_prompt_tokens: Optional[int] = 0,
+        thread_id: Optional[str] = None,
+        thread_messages: int = 0,
+        context_messages: int = 0
     ):
         """
         Registra el uso de tokens de un usuario.
@@ -38,6 +43,11 @@ class UserUsageController:
          - prompt_tokens: Tokens utilizados en prompts.
          - completion_tokens: Tokens utilizados en completions.
          - cached_tokens: Tokens utilizados en cache.
+         - saved_prompt_tokens: Tokens de prompt ahorrados (estimados) al enviar solo parte de
+           las herramientas.
+         - thread_id: ID del hilo del turno.
+         - thread_messages: Mensajes guardados en el hilo antes del turno.
+         - context_messages: Mensajes del hilo que pudo leer la ejecución.
         """
         current_usage = UserUsageController.get_active_usage_limit(db, user_id)
 
@@ -46,6 +56,10 @@ class UserUsageController:
             prompt_tokens=prompt_tokens,
             completion_tokens=completion_tokens,
             cached_tokens=cached_tokens,
+            saved_prompt_tokens=saved_prompt_tokens,
+            thread_id=thread_id,
+            thread_messages=thread_messages,
+            context_messages=context_messages,
             user_id=user_id,
             usage_limit_id=current_usage.id
         )
@@ -55,13 +69,47 @@ class UserUsageController:
         current_usage.current_total_tokens_usage += total_tokens
         current_usage.current_prompt_tokens_usage += prompt_tokens
         current_usage.current_completion_tokens_usage += completion_tokens
-        current_usage.current_cached_tokens_usage += cached_tokens
+        current_usage.current_cached_tokens_usage += cached_tokens or 0
 
         db.commit()
         db.refresh(new_usage)
 
         return new_usage
-    
+
+    @staticmethod
+    def add_usage_tokens(
+        db: Session,
+        usage_id: int,
+        total_tokens: int,
+        prompt_tokens: int,
+        completion_tokens: int
+    ) -> UserUsage:
+        """
+        Suma tokens a un uso ya registrado, y a su límite de uso.
+
+        Args:
+         - usage_id: ID del UserUsage al que se suman los tokens.
+         - total_tokens: Total de tokens a sumar.
+         - prompt_tokens: Tokens de prompts a sumar.
+         - completion_tokens: Tokens de completions a sumar.
+        """
+        usage = db.get(UserUsage, usage_id)
+        usage.total_tokens += total_tokens
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+
+        usage_limit = db.get(UserUsageLimit, usage.usage_limit_id)
+        usage_limit.current_total_tokens_usage += total_tokens
+        usage_limit.current_prompt_tokens_usage += prompt_tokens
+        usage_limit.current_completion_tokens_usage += completion_tokens
+
+        db.add(usage)
+        db.add(usage_limit)
+        db.commit()
+        db.refresh(usage)
+
+        return usage
+
     @staticmethod
     def get_active_usage_limit(db: Session, user_id: int) -> Optional[UserUsageLimit]:
         """
@@ -82,4 +130,46 @@ class UserUsageController:
             raise NotCurrentUsageLimitException()
 
         return usage
-    
\ No newline at end of file
+
+    @staticmethod
+    def get_cache_report(db: Session, active_period_only: bool = False) -> list[dict]:
+        """
+        Reporte por usuario de los tokens de prompt: el promedio por turno y los servidos desde
+        el caché del proveedor.
+
+        Args:
+         - active_period_only: Considera solo el uso del período de límite activo de cada
+           usuario.
+        """
+        query = select(
+            UserUsage.user_id,
+            User.username,
+            func.count(UserUsage.id),
+            func.coalesce(func.sum(UserUsage.prompt_tokens), 0),
+            func.coalesce(func.sum(UserUsage.cached_tokens), 0),
+            func.coalesce(func.sum(UserUsage.saved_prompt_tokens), 0),
+        ).join(User, User.id == UserUsage.user_id).where(
+            UserUsage.deleted == False
+        ).group_by(UserUsage.user_id, User.username)
+
+        if active_period_only:
+            now = datetime.now()
+            query = query.join(UserUsageLimit, UserUsageLimit.id == UserUsage.usage_limit_id).where(
+                UserUsageLimit.start_period_date <= now,
+                UserUsageLimit.finish_period_date >= now
+            )
+
+        return [
+            {
+                "user_id": user_id,
+                "username": username,
+                "runs": runs,
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "cache_hit_ratio": cached_tokens / prompt_tokens if prompt_tokens else None,
+                "saved_prompt_tokens": saved_prompt_tokens,
+                "prompt_tokens_per_run": prompt_tokens / runs if runs else None,
+            }
+            for user_id, username, runs, prompt_tokens, cached_tokens, saved_prompt_tokens
+            in db.exec(query).all()
+        ]
@@ -12,6 +12,7 @@ if TYPE_CHECKING:
     from src.domains.customer.models.meet import Meet
     from src.domains.auth.models.user_usage import UserUsage
     from src.domains.auth.models.user_usage_limit import UserUsageLimit
+    from src.domains.chat.models.chat_thread import ChatThread
 
 class UserBase(SQLModel):
     username: str
@@ -41,6 +42,7 @@ class User(UserBase, table = True):
     usages: List["UserUsage"] = Relationship(back_populates="user")
     usage_limits: List["UserUsageLimit"] = Relationship(back_populates="user")
     meets: List["Meet"] = Relationship(back_populates="user")
+    chat_threads: List["ChatThread"] = Relationship(back_populates="user")
 
 class UserInDB(UserBase):
     hashed_password: str
@@ -1,3 +1,4 @@
+from typing import Optional
 from sqlmodel import SQLModel, Field, Relationship
 
 from src.utils.base_models import DeletableModel
@@ -9,6 +10,13 @@ class UserUsageBase(SQLModel):
     prompt_tokens: int = Field(default=0)
     completion_tokens: int = Field(default=0)
     cached_tokens: int = Field(default=0)
+    # Estimated prompt tokens not spent because only part of the tools were sent
+    saved_prompt_tokens: int = Field(default=0)
+    # Thread of the turn, the messages stored in it before the turn and the messages the run
+    # could read (the last CHAT_CONTEXT_LAST_MESSAGES), to follow prompt tokens per turn
+    thread_id: Optional[str] = Field(default=None, index=True)
+    thread_messages: int = Field(default=0)
+    context_messages: int = Field(default=0)
 
 
 class UserUsage(UserUsageBase, DeletableModel, table=True):
@@ -8,6 +8,7 @@ from src.domains.auth.controller import (
     authenticate_user,
     create_access_token,
     get_current_active_user,
+    get_current_admin_user,
     save_user_session,
     get_user,
     get_password_hash,
@@ -15,6 +16,7 @@ from src.domains.auth.controller import (
 )
 from src.domains.auth.models.user_session import UserSession
 from src.domains.auth.models.user import User, UserRegister, UserBase, UserResponse
+from src.domains.auth.controllers.user_usage_controller import UserUsageController
 
 router = APIRouter(prefix="/auth",)
 database = Database()
@@ -79,6 +81,14 @@ def get_user_session(
 ) -> UserSession:
     return current_session
 
+@router.get("/usage/cache-report")
+def get_usage_cache_report(
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    active_period_only: bool = False,
+    db: Session = Depends(database.get_db_session)
+):
+    return UserUsageController.get_cache_report(db, active_period_only)
+
 @router.post("/register", response_model=UserBase)
 def register_user(
     user: UserRegister,
@@ -0,0 +1,54 @@
+from typing import AsyncIterator, Callable
+from contextlib import aclosing
+import time
+from src.domains.openai_integration.stream_events import ChatStreamEvent, make_event, TEXT_DELTA
+
+async def coalesce_text_deltas(
+    events: AsyncIterator[ChatStreamEvent],
+    flush_interval_ms: int,
+    flush_bytes: int,
+    clock: Callable[[], float] = time.monotonic
+) -> AsyncIterator[ChatStreamEvent]:
+    """
+    Merge consecutive `text.delta` events so the response is written in fewer, bigger frames.
+
+    The buffered text is flushed when `flush_interval_ms` have passed since the last flush or
+    when it reaches `flush_bytes`. Both limits are checked as deltas arrive, so a pause of the
+    model keeps the buffer until the next event or the end of the stream. The first delta after
+    the start of the turn or after a tool boundary is flushed at once, so time-to-first-token
+    doesn't change, and any other event (tools, usage, done) flushes the buffer before going
+    out.
+
+    Args:
+        events (AsyncIterator[ChatStreamEvent]): events of the turn
+        flush_interval_ms (int): max milliseconds a delta waits in the buffer
+        flush_bytes (int): max UTF-8 bytes buffered before flushing
+        clock (Callable[[], float]): monotonic clock in seconds
+    """
+    buffer: list[str] = []
+    buffered_bytes = 0
+    last_flush = None
+
+    async with aclosing(events):
+        async for chat_event in events:
+            if chat_event["event"] != TEXT_DELTA:
+                if buffer:
+                    yield make_event(TEXT_DELTA, value="".join(buffer))
+                    buffer, buffered_bytes = [], 0
+                last_flush = None
+                yield chat_event
+                continue
+
+            value = chat_event["data"]["value"]
+            buffer.append(value)
+            buffered_bytes += len(value.encode())
+            now = clock()
+
+            if last_flush is None or buffered_bytes >= flush_bytes or \
+                    (now - last_flush) * 1000 >= flush_interval_ms:
+                yield make_event(TEXT_DELTA, value="".join(buffer))
+                buffer, buffered_bytes = [], 0
+                last_flush = now
+
+        if buffer:
+            yield make_event(TEXT_DELTA, value="".join(buffer))
@@ -1,23 +1,121 @@
+from typing import Optional
 from sqlmodel import Session
+import anyio
 from src.domains.auth.models.user import User
 from src.domains.chat.models import MessageCreate
 from src.domains.openai_integration.thread_manager import ThreadManager
+from src.domains.chat.controllers.chat_message_controller import ChatMessageController
+from src.domains.openai_integration.event_handler import SessionFactory
+from src.domains.openai_integration.stream_events import text_deltas
+from src.domains.chat.coalescing import coalesce_text_deltas
+from src.domains.chat.scheduler import chat_scheduler
+from src.domains.chat.run_tracker import chat_run_tracker
+from src.domains.chat.thread_pool import prewarmed_thread_pool
+from src.domains.openai_integration.http_client import (
+    ensure_openai_available, openai_circuit_breaker
+)
+from src.domains.chat.controllers.chat_thread_controller import ChatThreadController
+from src.domains.openai_integration.tool_cache import tool_cache_stats
+from src.utils.settings import CHAT_STREAM_FLUSH_INTERVAL_MS, CHAT_STREAM_FLUSH_BYTES
 from src.domains.auth.controllers.user_usage_controller import (
     UserUsageController, UserTokenLimitIsReachedException
 )
 
-def send_message(db: Session, message: MessageCreate, user: User):
+def send_message(
+    db: Session,
+    message: MessageCreate,
+    user: User,
+    session_factory: SessionFactory,
+    typed_events: bool = False
+):
     user_usage_limit = UserUsageController.get_active_usage_limit(db, user.id)
 
     if not user_usage_limit.can_use_more_tokens:
         raise UserTokenLimitIsReachedException
 
-    return ThreadManager(
-        message.thread_id, db, user
-    ).stream_response(message.content)
+    # Raises OpenAIUnavailableException while OpenAI is failing, instead of waiting for it
+    ensure_openai_available()
+
+    # Raises ChatRunLimitException before the response starts, so the client gets a 429.
+    # The run only starts once the previous messages of the thread are answered. A new thread
+    # is only created once the message is admitted, so a rejection doesn't leave it behind.
+    ticket = chat_scheduler.admit(user.id, message.thread_id)
+
+    # The stream outlives the request session, so it only opens short-lived sessions.
+    # It is an async generator: the response streams on the event loop, not on a worker thread.
+    try:
+        thread_manager = ThreadManager(
+            message.thread_id, None, user, session_factory=session_factory
+        )
+    except BaseException:
+        ticket.release()
+        raise
+    if not message.thread_id:
+        chat_scheduler.assign_thread(ticket, thread_manager.thread_id)
+
+    events = coalesce_text_deltas(
+        chat_scheduler.run(ticket, thread_manager.astream_events(message.content)),
+        flush_interval_ms=CHAT_STREAM_FLUSH_INTERVAL_MS,
+        flush_bytes=CHAT_STREAM_FLUSH_BYTES
+    )
+
+    # The run streams in a background task, not in the response, so a client that loses the
+    # connection can reattach to it with `stream_run`. send_message is called from a worker
+    # thread (sync route), the task is started on the event loop.
+    tracked_run = chat_run_tracker.track(thread_manager, events)
+    anyio.from_thread.run_sync(tracked_run.start)
+
+    if typed_events:
+        return tracked_run.subscribe()
+    return text_deltas(tracked_run.subscribe())
 
-def create_thread(db: Session, user: User):
-    return ThreadManager(None, db, user).thread.id
+def stream_run(thread_id: str, user: User, typed_events: bool = False):
+    """
+    Reattach to the in-progress or recently finished run of the thread. The events already
+    streamed are sent again, then the live ones.
+
+    Args:
+     - thread_id: ID of the thread
+     - user: owner of the thread
+     - typed_events: stream typed events instead of the text of the answer
+    """
+    events = chat_run_tracker.get_run(thread_id, user.id).subscribe(resumed=True)
+
+    if typed_events:
+        return events
+    return text_deltas(events)
+
+def get_metrics():
+    return {
+        "scheduler": chat_scheduler.metrics(),
+        "runs": chat_run_tracker.metrics(),
+        "tool_cache": tool_cache_stats.metrics(),
+        "thread_pool": prewarmed_thread_pool.metrics(),
+        "openai_circuit": openai_circuit_breaker.metrics()
+    }
+
+def create_thread(user: User, session_factory: SessionFactory):
+    # No request session is held while OpenAI creates the thread
+    thread_id = prewarmed_thread_pool.take() if prewarmed_thread_pool.enabled else None
+    if thread_id is None:
+        ensure_openai_available()
+        return ThreadManager(None, None, user, session_factory=session_factory).thread_id
+
+    with session_factory() as db:
+        ChatThreadController.register_thread(db, user.id, thread_id)
+    return thread_id
+
+def retrieve_messages(
+    thread_id: str,
+    user: User,
+    session_factory: SessionFactory,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None
+):
+    # Legacy threads are retrieved and backfilled from OpenAI with no session open
+    return ThreadManager(
+        thread_id, None, user, session_factory=session_factory
+    ).retrieve_messages(limit, cursor)
 
-def retrieve_messages(db: Session, thread_id: str, user: User):
-    return ThreadManager(thread_id, db, user).retrieve_messages()
\ No newline at end of file
+def search_messages(db: Session, user: User, query: str, limit: int):
+    return ChatMessageController.search_chat_history(db, user.id, query, limit)
@@ -0,0 +1,199 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Session, func, select
+from sqlalchemy.exc import IntegrityError
+from openai.types.beta.threads import Message
+from src.domains.chat.controllers.chat_thread_controller import ChatThreadController
+from src.domains.chat.models.chat_message import (
+    ChatMessage, ChatMessagePage, ChatMessageSearchResult
+)
+from src.domains.chat import search
+from src.domains.openai_integration import Ignored
+from src.utils.pagination import paginate
+
+def get_message_text(message: Message) -> str:
+    """
+    Text of an OpenAI message (the other content blocks, like images, are not stored)
+    """
+    return "".join(block.text.value for block in message.content if block.type == "text")
+
+class ChatMessageController:
+
+    @staticmethod
+    def save_turn(
+        db: Session,
+        thread_id: str,
+        user_message: Optional[str],
+        user_message_created_at: datetime,
+        assistant_messages: list[Message]
+    ):
+        """
+        Guarda los mensajes de un turno: el mensaje del usuario y las respuestas del asistente.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+         - user_message: Mensaje enviado por el usuario (vacío si el turno no tuvo mensaje).
+         - user_message_created_at: Fecha en que se envió el mensaje del usuario.
+         - assistant_messages: Mensajes completos del asistente, en orden.
+        """
+        if user_message:
+            db.add(ChatMessage(
+                thread_id=thread_id,
+                role="user",
+                content=user_message,
+                created_at=user_message_created_at
+            ))
+
+        for message in assistant_messages:
+            db.add(ChatMessage(
+                thread_id=thread_id,
+                role=message.role,
+                content=get_message_text(message),
+                created_at=datetime.fromtimestamp(message.created_at),
+                openai_message_id=message.id,
+                run_id=message.run_id
+            ))
+
+        db.commit()
+
+    @staticmethod
+    def save_backfilled_messages(
+        db: Session,
+        thread_id: str,
+        messages: list[Message]
+    ) -> bool:
+        """
+        Guarda una sola vez los mensajes de OpenAI de un hilo creado antes de que los mensajes
+        se guardaran localmente, y lo marca como sincronizado.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+         - messages: Mensajes del hilo en OpenAI, del más antiguo al más reciente.
+
+        Returns:
+         - bool: Verdadero si los mensajes se guardaron en esta llamada.
+        """
+        chat_thread = ChatThreadController.get_thread(db, thread_id)
+        # Another request backfilled the thread while its messages were being listed
+        if chat_thread is None or chat_thread.messages_synced_at is not None:
+            return False
+
+        for message in messages:
+            db.add(ChatMessage(
+                thread_id=thread_id,
+                role=message.role,
+                content=get_message_text(message),
+                created_at=datetime.fromtimestamp(message.created_at),
+                openai_message_id=message.id,
+                run_id=message.run_id
+            ))
+
+        chat_thread.messages_synced_at = datetime.now()
+        db.add(chat_thread)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request backfilled the same thread at the same time
+            db.rollback()
+            return False
+
+        return True
+
+    @staticmethod
+    def get_messages(
+        db: Session,
+        thread_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None
+    ) -> ChatMessagePage:
+        """
+        Obtiene los mensajes de un hilo, del más reciente al más antiguo, de a una página.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+         - limit: Cantidad máxima de mensajes a obtener.
+         - cursor: next_cursor de la página anterior, para obtener mensajes más antiguos.
+        """
+        query = select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+        page = paginate(db, query, ChatMessage.id, limit, cursor, descending=True)
+
+        return ChatMessagePage(
+            messages=page.items,
+            total_count=page.total_count,
+            next_cursor=page.next_cursor
+        )
+
+    @staticmethod
+    def count_messages(
+        db: Session,
+        thread_id: str,
+        after_message_id: Optional[int] = None
+    ) -> int:
+        """
+        Cantidad de mensajes guardados de un hilo.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+         - after_message_id: Cuenta solo los mensajes posteriores a este ID.
+        """
+        query = select(func.count(ChatMessage.id)).where(ChatMessage.thread_id == thread_id)
+        if after_message_id is not None:
+            query = query.where(ChatMessage.id > after_message_id)
+        return db.exec(query).one()
+
+    @staticmethod
+    def get_messages_outside_context(
+        db: Session,
+        thread_id: str,
+        last_messages: int,
+        after_message_id: Optional[int] = None
+    ) -> list[ChatMessage]:
+        """
+        Obtiene, del más antiguo al más reciente, los mensajes de un hilo anteriores a sus
+        últimos `last_messages` mensajes.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+         - last_messages: Cantidad de mensajes recientes que se excluyen.
+         - after_message_id: Obtiene solo los mensajes posteriores a este ID.
+        """
+        query = select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+
+        if last_messages > 0:
+            first_recent_id = db.exec(
+                select(ChatMessage.id)
+                .where(ChatMessage.thread_id == thread_id)
+                .order_by(ChatMessage.id.desc())
+                .offset(last_messages - 1)
+                .limit(1)
+            ).first()
+            if first_recent_id is None:
+                return []
+            query = query.where(ChatMessage.id < first_recent_id)
+
+        if after_message_id is not None:
+            query = query.where(ChatMessage.id > after_message_id)
+
+        return db.exec(query.order_by(ChatMessage.id)).all()
+
+    @staticmethod
+    def search_chat_history(
+        db: Ignored[Session],
+        user_id: Ignored[int],
+        query: str,
+        limit: Optional[int] = search.DEFAULT_SEARCH_RESULTS
+    ) -> list[ChatMessageSearchResult]:
+        """
+        Busca en las conversaciones anteriores del usuario con Binna. Úsala cuando el usuario
+        pregunte qué o cuándo te contó algo (por ejemplo "¿cuándo te hablé del precio de Acme?").
+
+        Args:
+         - query: Palabras a buscar. Todas deben estar en el mensaje, también encuentra palabras que empiezan con ellas.
+         - limit: Cantidad máxima de resultados (máximo 50).
+
+        Returns:
+         - list[ChatMessageSearchResult]: los mensajes encontrados, de mejor a peor coincidencia, con su hilo, fecha y un fragmento con las palabras encontradas entre **.
+        """
+        return search.search_messages(
+            db, user_id, query, limit or search.DEFAULT_SEARCH_RESULTS
+        )
@@ -0,0 +1,89 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+from src.domains.chat.models.chat_thread import ChatThread
+
+class ThreadNotFoundException(Exception):
+    """
+    This error is triggered when a thread doesn't exist or doesn't belong to the user.
+    """
+    pass
+
+class ChatThreadController:
+
+    @staticmethod
+    def get_thread(db: Session, thread_id: str) -> Optional[ChatThread]:
+        """
+        Obtiene un hilo registrado, sin importar a qué usuario pertenece.
+
+        Args:
+         - thread_id: ID del hilo en OpenAI.
+        """
+        return db.exec(select(ChatThread).where(
+            ChatThread.thread_id == thread_id,
+            ChatThread.deleted == False
+        )).first()
+
+    @staticmethod
+    def register_thread(
+        db: Session,
+        user_id: int,
+        thread_id: str,
+        is_new: bool = True
+    ) -> ChatThread:
+        """
+        Registra un hilo de OpenAI como propiedad de un usuario.
+
+        Args:
+         - user_id: ID del usuario dueño del hilo.
+         - thread_id: ID del hilo en OpenAI.
+         - is_new: Falso si el hilo existía antes del registro y puede tener mensajes en OpenAI.
+
+        Raises:
+         - ThreadNotFoundException: Otro usuario registró el hilo al mismo tiempo.
+        """
+        # A new thread has no messages to copy from OpenAI, an old one is copied on first read
+        chat_thread = ChatThread(
+            thread_id=thread_id,
+            user_id=user_id,
+            messages_synced_at=datetime.now() if is_new else None
+        )
+
+        db.add(chat_thread)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request registered the same thread first
+            db.rollback()
+            chat_thread = ChatThreadController.get_thread(db, thread_id)
+            if chat_thread is None or chat_thread.user_id != user_id:
+                raise ThreadNotFoundException()
+            return chat_thread
+        db.refresh(chat_thread)
+
+        return chat_thread
+
+    @staticmethod
+    def save_context_summary(
+        db: Session,
+        chat_thread: ChatThread,
+        summary: str,
+        until_message_id: int
+    ) -> ChatThread:
+        """
+        Guarda el resumen de los mensajes que quedaron fuera del contexto de las ejecuciones.
+
+        Args:
+         - chat_thread: Hilo resumido.
+         - summary: Resumen de la conversación hasta until_message_id.
+         - until_message_id: ID del último ChatMessage incluido en el resumen.
+        """
+        chat_thread.context_summary = summary
+        chat_thread.context_summary_until_id = until_message_id
+
+        db.add(chat_thread)
+        db.commit()
+        db.refresh(chat_thread)
+
+        return chat_thread
@@ -1,6 +1,11 @@
 from sqlmodel import SQLModel
 from typing import Optional
 
+from src.domains.chat.models.chat_thread import ChatThread
+from src.domains.chat.models.chat_message import (
+    ChatMessage, ChatMessageResponse, ChatMessagePage, ChatMessageSearchResult
+)
+
 class MessageCreate(SQLModel):
     content: str
-    thread_id: Optional[str]
\ No newline at end of file
+    thread_id: Optional[str]
@@ -0,0 +1,38 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+class ChatMessageBase(SQLModel):
+    role: str
+    content: str
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class ChatMessage(ChatMessageBase, table=True):
+    """
+    Local copy of a message of an OpenAI thread, written as the turns stream so the
+    conversation can be read without calling OpenAI
+    """
+    __tablename__ = "chat_message"
+
+    id: int = Field(default=None, primary_key=True)
+
+    thread_id: str = Field(foreign_key="chat_thread.thread_id", index=True)
+    # Empty for the user messages, they are sent with the run and OpenAI doesn't return their id
+    openai_message_id: Optional[str] = Field(default=None, unique=True)
+    run_id: Optional[str] = None
+
+class ChatMessageResponse(ChatMessageBase):
+    id: int
+
+class ChatMessagePage(SQLModel):
+    messages: list[ChatMessageResponse]
+    total_count: int
+    next_cursor: Optional[int] = None
+
+class ChatMessageSearchResult(SQLModel):
+    message_id: int
+    thread_id: str
+    role: str
+    created_at: datetime
+    # Words around the match, with the matched words between **
+    snippet: str
@@ -0,0 +1,34 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import SQLModel, Field, Relationship
+
+from src.utils.base_models import DeletableModel
+from src.domains.auth.models.user import User
+
+class ChatThreadBase(SQLModel):
+    thread_id: str = Field(index=True, unique=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class ChatThread(ChatThreadBase, DeletableModel, table=True):
+    """
+    OpenAI thread owned by a user. Chat requests are checked against this table instead of
+    retrieving the thread from OpenAI every time.
+    """
+    __tablename__ = "chat_thread"
+
+    id: int = Field(default=None, primary_key=True)
+
+    user_id: int = Field(foreign_key="user.id", index=True)
+    user: User = Relationship(back_populates="chat_threads")
+
+    # When the local copy of the messages was completed with the messages stored in OpenAI.
+    # Empty for threads created before the messages were stored locally.
+    messages_synced_at: Optional[datetime] = None
+
+    # Rolling summary of the messages left out of the context of the runs, and the id of the
+    # last ChatMessage it covers
+    context_summary: Optional[str] = None
+    context_summary_until_id: Optional[int] = None
+
+class ChatThreadResponse(ChatThreadBase):
+    id: int
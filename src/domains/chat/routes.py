@@ -1,29 +1,59 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session
 from fastapi.responses import StreamingResponse
-from src.domains.auth.controller import get_current_active_user
+from src.domains.auth.controller import get_current_active_user, get_current_admin_user
 from src.domains.auth.models.user import User
 from src.database.database import Database
 import src.domains.chat.controller as chat_controller
-from src.domains.chat.models import MessageCreate
+from src.domains.chat.models import MessageCreate, ChatMessagePage, ChatMessageSearchResult
+from src.domains.chat.sse import SSE_MEDIA_TYPE, accepts_sse, sse_stream
 from src.domains.auth.controllers.user_usage_controller import (
     UserTokenLimitIsReachedException, NotCurrentUsageLimitException
 )
+from src.domains.chat.controllers.chat_thread_controller import ThreadNotFoundException
+from src.domains.chat.scheduler import ChatRunLimitException
+from src.domains.chat.run_tracker import ActiveRunNotFoundException
+from src.domains.openai_integration.http_client import OpenAIUnavailableException
 
 router = APIRouter(prefix="/chat",)
 database = Database()
 
+def raise_openai_unavailable(error: OpenAIUnavailableException):
+    raise HTTPException(503, {
+        "detail": "El asistente no está disponible en este momento, intenta nuevamente en unos segundos",
+        "error_code": OpenAIUnavailableException.__name__
+    }, headers={"Retry-After": str(error.retry_after)})
+
+def make_stream_response(stream, use_sse: bool) -> StreamingResponse:
+    if use_sse:
+        return StreamingResponse(
+            sse_stream(stream),
+            media_type=SSE_MEDIA_TYPE,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    return StreamingResponse(stream)
+
 @router.post("/send")
 def send_message(
     message: MessageCreate,
+    request: Request,
+    sse: Annotated[bool, "Stream typed Server-Sent Events instead of plain text"] = False,
     user: User = Depends(get_current_active_user),
     db: Session = Depends(database.get_db_session)
 ):
+    # SSE mode is negotiated with the Accept header or the `sse` query flag
+    use_sse = sse or accepts_sse(request.headers.get("accept"))
+
     try:
-        return StreamingResponse(
-            chat_controller.send_message(db, message, user)
+        stream = chat_controller.send_message(
+            db,
+            message,
+            user,
+            session_factory=database.session_factory,
+            typed_events=use_sse
         )
+        return make_stream_response(stream, use_sse)
     except UserTokenLimitIsReachedException:
         raise HTTPException(403, {
             "detail": "Limite de tokens alcanzado",
@@ -34,20 +64,77 @@ def send_message(
             "detail": "No se cuenta con una suscripción activa durante el periodo actual",
             "error_code": NotCurrentUsageLimitException.__name__
         })
+    except ThreadNotFoundException:
+        raise HTTPException(404, {
+            "detail": "Conversación no encontrada",
+            "error_code": ThreadNotFoundException.__name__
+        })
+    except ChatRunLimitException as e:
+        raise HTTPException(429, {
+            "detail": "Demasiados mensajes en curso, intenta nuevamente en unos segundos",
+            "error_code": ChatRunLimitException.__name__,
+            "reason": e.reason
+        }, headers={"Retry-After": str(e.retry_after)})
+    except OpenAIUnavailableException as e:
+        raise_openai_unavailable(e)
+
+@router.get("/stream")
+def stream_run(
+    thread_id: Annotated[str, "The ID of the thread"],
+    request: Request,
+    sse: Annotated[bool, "Stream typed Server-Sent Events instead of plain text"] = False,
+    user: User = Depends(get_current_active_user)
+):
+    use_sse = sse or accepts_sse(request.headers.get("accept"))
+
+    try:
+        stream = chat_controller.stream_run(thread_id, user, typed_events=use_sse)
+        return make_stream_response(stream, use_sse)
+    except ActiveRunNotFoundException:
+        raise HTTPException(404, {
+            "detail": "No hay una respuesta en curso en la conversación",
+            "error_code": ActiveRunNotFoundException.__name__
+        })
+
+@router.get("/metrics")
+def get_metrics(
+    user: User = Depends(get_current_admin_user)
+):
+    return chat_controller.get_metrics()
 
 @router.post("/create")
 def create(
-    user: User = Depends(get_current_active_user),
-    db: Session = Depends(database.get_db_session)
+    user: User = Depends(get_current_active_user)
 ):
-    return {
-        "thread_id": chat_controller.create_thread(db, user)
-    }
+    try:
+        return {
+            "thread_id": chat_controller.create_thread(user, database.session_factory)
+        }
+    except OpenAIUnavailableException as e:
+        raise_openai_unavailable(e)
 
-@router.get("/retrieve")
+@router.get("/retrieve", response_model=ChatMessagePage)
 def retrieve_messages(
     thread_id: Annotated[str, "The ID of the thread"],
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    user: User = Depends(get_current_active_user)
+):
+    try:
+        return chat_controller.retrieve_messages(
+            thread_id, user, database.session_factory, limit, cursor
+        )
+    except ThreadNotFoundException:
+        raise HTTPException(404, {
+            "detail": "Conversación no encontrada",
+            "error_code": ThreadNotFoundException.__name__
+        })
+
+@router.get("/search", response_model=list[ChatMessageSearchResult])
+def search_messages(
+    query: Annotated[str, "Words to search in the messages"],
+    limit: int = 10,
     user: User = Depends(get_current_active_user),
     db: Session = Depends(database.get_db_session)
 ):
-    return chat_controller.retrieve_messages(db, thread_id, user)
\ No newline at end of file
+    return chat_controller.search_messages(db, user, query, limit)
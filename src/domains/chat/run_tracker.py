@@ -0,0 +1,266 @@
+from typing import AsyncIterator, Optional
+from collections import deque
+from contextlib import aclosing
+import asyncio
+import json
+import threading
+import time
+from src.domains.openai_integration.thread_manager import ThreadManager
+from src.domains.openai_integration.stream_events import ChatStreamEvent, make_event, RESUMED
+from src.utils.settings import (
+    CHAT_RUN_BUFFER_BYTES, CHAT_RUN_REATTACH_GRACE_SECONDS, CHAT_RUN_RETENTION_SECONDS
+)
+
+class ActiveRunNotFoundException(Exception):
+    """
+    This error is triggered when there isn't an in-progress or recently finished run to
+    reattach to in the thread
+    """
+    pass
+
+class TrackedRun:
+    """
+    Chat turn streamed in the background, decoupled from the HTTP response that started it.
+
+    The events are kept in a buffer bounded to `max_buffer_bytes` (the oldest are dropped
+    first), so a client that lost the connection can reattach, get what was already streamed
+    and keep receiving the rest live. If no client is attached for `grace_seconds` while the
+    run is in progress, the stream is closed and the run cancelled as if the client had just
+    disconnected.
+    """
+
+    def __init__(
+        self,
+        thread_manager: ThreadManager,
+        events: AsyncIterator[ChatStreamEvent],
+        max_buffer_bytes: int,
+        grace_seconds: float
+    ):
+        self.thread_manager = thread_manager
+        self.thread_id = thread_manager.thread_id
+        self.user_id = thread_manager.user.id
+        self.max_buffer_bytes = max_buffer_bytes
+        self.grace_seconds = grace_seconds
+
+        self.status = "queued"
+        self.error: Optional[Exception] = None
+        self.finished_at: Optional[float] = None
+
+        # Sequence number of the first buffered event and of the next event
+        self.first_sequence = 0
+        self.next_sequence = 0
+        self.buffered_bytes = 0
+        self.__buffer: deque[tuple[ChatStreamEvent, int]] = deque()
+
+        self.subscribers = 0
+        self.__events = events
+        self.__task: Optional[asyncio.Task] = None
+        self.__changed: Optional[asyncio.Event] = None
+        self.__abandon_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def run_id(self) -> Optional[str]:
+        return self.thread_manager.current_run_id
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self):
+        """
+        Start streaming the run on the running event loop. Calling it again does nothing.
+        """
+        if self.__task is not None:
+            return
+        self.__changed = asyncio.Event()
+        self.__task = asyncio.get_running_loop().create_task(self.__produce())
+        if self.subscribers == 0:
+            self.__schedule_abandon()
+
+    async def __produce(self):
+        try:
+            async with aclosing(self.__events) as events:
+                async for chat_event in events:
+                    self.status = "in_progress"
+                    self.__append(chat_event)
+            self.status = "completed"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+        except Exception as error:
+            print("Error while streaming tracked run", self.thread_id, repr(error))
+            self.status = "failed"
+            self.error = error
+        finally:
+            self.finished_at = time.monotonic()
+            self.__notify()
+
+    def __append(self, chat_event: ChatStreamEvent):
+        size = len(json.dumps(chat_event["data"], default=str))
+        self.__buffer.append((chat_event, size))
+        self.buffered_bytes += size
+        self.next_sequence += 1
+
+        while self.buffered_bytes > self.max_buffer_bytes and len(self.__buffer) > 1:
+            _, dropped_size = self.__buffer.popleft()
+            self.buffered_bytes -= dropped_size
+            self.first_sequence += 1
+
+        self.__notify()
+
+    def __notify(self):
+        self.__changed.set()
+        self.__changed = asyncio.Event()
+
+    def __schedule_abandon(self):
+        self.__abandon_handle = asyncio.get_running_loop().call_later(
+            self.grace_seconds, self.__cancel_if_abandoned
+        )
+
+    def __cancel_if_abandoned(self):
+        if self.subscribers == 0 and not self.finished:
+            print("Closing abandoned run of thread", self.thread_id)
+            self.__task.cancel()
+
+    async def subscribe(self, resumed: bool = False) -> AsyncIterator[ChatStreamEvent]:
+        """
+        Stream the buffered events of the run and then the live ones until it finishes.
+
+        Args:
+            resumed (bool): the client is reattaching, a `resumed` event goes first
+        """
+        self.start()
+        self.subscribers += 1
+        if self.__abandon_handle is not None:
+            self.__abandon_handle.cancel()
+            self.__abandon_handle = None
+
+        try:
+            sequence = self.first_sequence
+            if resumed:
+                yield make_event(
+                    RESUMED,
+                    thread_id=self.thread_id,
+                    run_id=self.run_id,
+                    status=self.status,
+                    # The buffer dropped the beginning of the answer
+                    truncated=self.first_sequence > 0
+                )
+
+            while True:
+                while sequence < self.next_sequence:
+                    sequence = max(sequence, self.first_sequence)
+                    chat_event, _ = self.__buffer[sequence - self.first_sequence]
+                    sequence += 1
+                    yield chat_event
+
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+
+                await self.__changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                self.__schedule_abandon()
+
+class ChatRunTracker:
+    """
+    Runs of every thread, so a client can reattach to the one streaming after a dropped
+    connection instead of sending the message again. The messages of a thread are answered one
+    at a time (see ChatRunScheduler), so a thread can have queued runs behind the active one.
+    Finished runs are kept for `retention_seconds`.
+    """
+
+    def __init__(self, max_buffer_bytes: int, grace_seconds: float, retention_seconds: float):
+        self.max_buffer_bytes = max_buffer_bytes
+        self.grace_seconds = grace_seconds
+        self.retention_seconds = retention_seconds
+
+        self.lock = threading.Lock()
+        # Runs of every thread in the order their messages were sent
+        self.runs_by_thread: dict[str, list[TrackedRun]] = {}
+        self.tracked_total = 0
+        self.reattached_total = 0
+
+    def track(
+        self,
+        thread_manager: ThreadManager,
+        events: AsyncIterator[ChatStreamEvent]
+    ) -> TrackedRun:
+        """
+        Register the run of a new message of the thread, after the runs already registered
+        """
+        tracked_run = TrackedRun(
+            thread_manager,
+            events,
+            max_buffer_bytes=self.max_buffer_bytes,
+            grace_seconds=self.grace_seconds
+        )
+        with self.lock:
+            self.__forget_expired()
+            self.runs_by_thread.setdefault(tracked_run.thread_id, []).append(tracked_run)
+            self.tracked_total += 1
+        return tracked_run
+
+    def get_run(self, thread_id: str, user_id: int) -> TrackedRun:
+        """
+        Get the run of the thread to reattach to: the oldest unfinished one (the one streaming
+        while the others wait for it), or the last finished one
+
+        Raises:
+            ActiveRunNotFoundException: there isn't a run of the user to reattach to
+        """
+        with self.lock:
+            self.__forget_expired()
+            thread_runs = self.runs_by_thread.get(thread_id, [])
+            tracked_run = next(
+                (tracked_run for tracked_run in thread_runs if not tracked_run.finished),
+                thread_runs[-1] if thread_runs else None
+            )
+            if tracked_run is None or tracked_run.user_id != user_id:
+                raise ActiveRunNotFoundException()
+            self.reattached_total += 1
+            return tracked_run
+
+    def __forget_expired(self):
+        """
+        Forget the finished runs that expired or that a later run of the thread replaced
+        """
+        now = time.monotonic()
+        for thread_id in list(self.runs_by_thread):
+            thread_runs = self.runs_by_thread[thread_id]
+            last_run = thread_runs[-1]
+            thread_runs = [
+                tracked_run for tracked_run in thread_runs
+                if not tracked_run.finished or (
+                    tracked_run is last_run
+                    and now - tracked_run.finished_at <= self.retention_seconds
+                )
+            ]
+            if thread_runs:
+                self.runs_by_thread[thread_id] = thread_runs
+            else:
+                del self.runs_by_thread[thread_id]
+
+    def metrics(self) -> dict:
+        with self.lock:
+            self.__forget_expired()
+            runs = [
+                tracked_run
+                for thread_runs in self.runs_by_thread.values()
+                for tracked_run in thread_runs
+            ]
+            return {
+                "tracked_runs": len(runs),
+                "in_progress_runs": sum(1 for run in runs if not run.finished),
+                "buffered_bytes": sum(run.buffered_bytes for run in runs),
+                "tracked_total": self.tracked_total,
+                "reattached_total": self.reattached_total,
+            }
+
+chat_run_tracker = ChatRunTracker(
+    max_buffer_bytes=CHAT_RUN_BUFFER_BYTES,
+    grace_seconds=CHAT_RUN_REATTACH_GRACE_SECONDS,
+    retention_seconds=CHAT_RUN_RETENTION_SECONDS
+)
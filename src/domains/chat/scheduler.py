@@ -0,0 +1,232 @@
+from typing import AsyncIterator, Optional, TypeVar
+from collections import deque
+from contextlib import aclosing
+import asyncio
+import math
+import threading
+import time
+import uuid
+import weakref
+from src.utils.settings import (
+    CHAT_MAX_ACTIVE_RUNS, CHAT_MAX_ACTIVE_RUNS_PER_USER, CHAT_MAX_QUEUED_PER_THREAD
+)
+
+T = TypeVar("T")
+
+class ChatRunLimitException(Exception):
+    """
+    This error is triggered when a message can't be admitted because the thread queue, the
+    user or the whole process reached its limit of runs.
+    """
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ChatRunTicket:
+    """
+    Admission of a message in the scheduler. It is either running (it holds a run slot) or
+    queued behind the active run of its thread.
+    """
+
+    def __init__(self, scheduler: "ChatRunScheduler", user_id: int, thread_id: str):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.granted = False
+        self.released = False
+        self.granted_at: Optional[float] = None
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__event: Optional[asyncio.Event] = None
+
+    def grant(self):
+        """
+        Give the run slot to the ticket. Must be called holding the scheduler lock.
+        """
+        self.granted = True
+        self.granted_at = time.monotonic()
+        if self.__event is not None:
+            self.__loop.call_soon_threadsafe(self.__event.set)
+
+    async def wait(self):
+        """
+        Wait until the previous runs of the thread are finished
+        """
+        with self.scheduler.lock:
+            if self.granted:
+                return
+            self.__loop = asyncio.get_running_loop()
+            self.__event = asyncio.Event()
+        await self.__event.wait()
+
+    def release(self):
+        self.scheduler.release(self)
+
+class ChatRunScheduler:
+    """
+    In-process admission control for chat runs.
+
+    OpenAI rejects a new run on a thread that already has an active one, so messages sent to a
+    busy thread wait in a FIFO queue (up to `max_queued_per_thread`) and inherit the run slot of
+    the previous message when it finishes. New runs are capped per user and globally, so a
+    single user can't take all the OpenAI concurrency. Messages over any limit are rejected at
+    once with `ChatRunLimitException` instead of waiting until they time out.
+    """
+
+    def __init__(
+        self,
+        max_active_runs: int,
+        max_active_runs_per_user: int,
+        max_queued_per_thread: int
+    ):
+        self.max_active_runs = max_active_runs
+        self.max_active_runs_per_user = max_active_runs_per_user
+        self.max_queued_per_thread = max_queued_per_thread
+
+        self.lock = threading.Lock()
+        self.active_by_thread: dict[str, ChatRunTicket] = {}
+        self.queued_by_thread: dict[str, deque[ChatRunTicket]] = {}
+        self.active_by_user: dict[int, int] = {}
+        self.active_runs = 0
+
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected_total: dict[str, int] = {}
+        # Moving average of the run duration, used to estimate Retry-After
+        self.average_run_seconds: Optional[float] = None
+
+    def admit(self, user_id: int, thread_id: Optional[str]) -> ChatRunTicket:
+        """
+        Admit a message for the thread. It runs at once or waits behind the active run.
+
+        Args:
+            user_id (int): user that sends the message
+            thread_id (Optional[str]): None for the first message of a thread not created yet.
+                The thread is created only once the message is admitted, and given to the
+                ticket with `assign_thread`.
+
+        Raises:
+            ChatRunLimitException: the message was rejected
+        """
+        # A thread not created yet has no runs, its ticket is kept under a unique key
+        ticket = ChatRunTicket(self, user_id, thread_id or f"new-thread-{uuid.uuid4().hex}")
+        thread_id = ticket.thread_id
+
+        with self.lock:
+            if thread_id in self.active_by_thread:
+                queue = self.queued_by_thread.setdefault(thread_id, deque())
+                if len(queue) >= self.max_queued_per_thread:
+                    self.__reject("thread_queue_full", len(queue) + 1)
+                queue.append(ticket)
+                self.queued_total += 1
+            elif self.active_by_user.get(user_id, 0) >= self.max_active_runs_per_user:
+                self.__reject("user_limit_reached", 1)
+            elif self.active_runs >= self.max_active_runs:
+                self.__reject("global_limit_reached", 1)
+            else:
+                self.active_by_thread[thread_id] = ticket
+                self.active_by_user[user_id] = self.active_by_user.get(user_id, 0) + 1
+                self.active_runs += 1
+                ticket.grant()
+
+            self.admitted_total += 1
+
+        return ticket
+
+    def assign_thread(self, ticket: ChatRunTicket, thread_id: str):
+        """
+        Move the ticket of a new thread to the id of the thread created for it
+        """
+        with self.lock:
+            if self.active_by_thread.get(ticket.thread_id) is ticket:
+                del self.active_by_thread[ticket.thread_id]
+                self.active_by_thread[thread_id] = ticket
+            ticket.thread_id = thread_id
+
+    def __reject(self, reason: str, runs_ahead: int):
+        self.rejected_total[reason] = self.rejected_total.get(reason, 0) + 1
+        average_run_seconds = self.average_run_seconds or 5
+        raise ChatRunLimitException(reason, max(1, math.ceil(average_run_seconds * runs_ahead)))
+
+    def release(self, ticket: ChatRunTicket):
+        """
+        Free the slot of a finished (or abandoned) ticket and hand it to the next message
+        queued on the same thread. Calling it more than once does nothing.
+        """
+        with self.lock:
+            if ticket.released:
+                return
+            ticket.released = True
+
+            if not ticket.granted:
+                self.queued_by_thread[ticket.thread_id].remove(ticket)
+                if not self.queued_by_thread[ticket.thread_id]:
+                    del self.queued_by_thread[ticket.thread_id]
+                return
+
+            run_seconds = time.monotonic() - ticket.granted_at
+            if self.average_run_seconds is None:
+                self.average_run_seconds = run_seconds
+            else:
+                self.average_run_seconds = 0.8 * self.average_run_seconds + 0.2 * run_seconds
+
+            queue = self.queued_by_thread.get(ticket.thread_id)
+            if queue:
+                # The slot (same user, same thread) goes to the next message of the thread
+                next_ticket = queue.popleft()
+                if not queue:
+                    del self.queued_by_thread[ticket.thread_id]
+                self.active_by_thread[ticket.thread_id] = next_ticket
+                next_ticket.grant()
+                return
+
+            del self.active_by_thread[ticket.thread_id]
+            self.active_by_user[ticket.user_id] -= 1
+            if self.active_by_user[ticket.user_id] == 0:
+                del self.active_by_user[ticket.user_id]
+            self.active_runs -= 1
+
+    def run(self, ticket: ChatRunTicket, events: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Stream `events` once the ticket gets its turn, releasing the ticket when the stream
+        ends. If the stream is dropped without being started, the ticket is released when it
+        is garbage collected.
+        """
+        async def stream():
+            try:
+                await ticket.wait()
+                async with aclosing(events):
+                    async for event in events:
+                        yield event
+            finally:
+                ticket.release()
+
+        scheduled_stream = stream()
+        weakref.finalize(scheduled_stream, ticket.release)
+        return scheduled_stream
+
+    def metrics(self) -> dict:
+        with self.lock:
+            queue_depths = [len(queue) for queue in self.queued_by_thread.values()]
+            return {
+                "active_runs": self.active_runs,
+                "active_users": len(self.active_by_user),
+                "queued_messages": sum(queue_depths),
+                "queued_threads": len(queue_depths),
+                "max_thread_queue_depth": max(queue_depths, default=0),
+                "admitted_total": self.admitted_total,
+                "queued_total": self.queued_total,
+                "rejected_total": dict(self.rejected_total),
+                "average_run_seconds": self.average_run_seconds,
+                "limits": {
+                    "max_active_runs": self.max_active_runs,
+                    "max_active_runs_per_user": self.max_active_runs_per_user,
+                    "max_queued_per_thread": self.max_queued_per_thread,
+                },
+            }
+
+chat_scheduler = ChatRunScheduler(
+    max_active_runs=CHAT_MAX_ACTIVE_RUNS,
+    max_active_runs_per_user=CHAT_MAX_ACTIVE_RUNS_PER_USER,
+    max_queued_per_thread=CHAT_MAX_QUEUED_PER_THREAD
+)
@@ -0,0 +1,187 @@
+import re
+from sqlalchemy import Engine, text
+from sqlmodel import Session
+from src.domains.chat.models.chat_message import ChatMessageSearchResult
+
+# Results of a search when no limit is sent, and the max allowed
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 50
+
+# Shorter words are matched whole ("de" would find every "descuento")
+MIN_PREFIX_LENGTH = 4
+
+# Words shown around the first match of a result, and the marks of the matched words
+SNIPPET_WORDS = 16
+SNIPPET_MATCH_START = "**"
+SNIPPET_MATCH_END = "**"
+SNIPPET_ELLIPSIS = "…"
+
+# SQLite: FTS5 table over the content of the messages and their owner (a `u<user_id>`
+# token), so the user filter is part of the full-text match instead of a filter of every
+# match. The text is read from a view (external content), kept in sync by triggers.
+SQLITE_SEARCH_INDEX_TRIGGER = "chat_message_fts_insert"
+SQLITE_SEARCH_INDEX_STATEMENTS = (
+    "DROP TABLE IF EXISTS chat_message_fts",
+    "DROP VIEW IF EXISTS chat_message_search",
+    "CREATE VIEW chat_message_search AS "
+    "SELECT chat_message.id, chat_message.content, 'u' || chat_thread.user_id AS owner "
+    "FROM chat_message JOIN chat_thread ON chat_thread.thread_id = chat_message.thread_id",
+    "CREATE VIRTUAL TABLE chat_message_fts USING fts5("
+    "content, owner, content='chat_message_search', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    # Only the content counts for the rank
+    "INSERT INTO chat_message_fts(chat_message_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+    "CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(rowid, content, owner) "
+    "SELECT new.id, new.content, 'u' || user_id FROM chat_thread "
+    "WHERE thread_id = new.thread_id; END",
+    "CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, owner) "
+    "SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_thread "
+    "WHERE thread_id = old.thread_id; END",
+    "CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content, owner) "
+    "SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_thread "
+    "WHERE thread_id = old.thread_id; "
+    "INSERT INTO chat_message_fts(rowid, content, owner) "
+    "SELECT new.id, new.content, 'u' || user_id FROM chat_thread "
+    "WHERE thread_id = new.thread_id; END",
+    # Index the messages stored before the index existed
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+)
+
+# MySQL: FULLTEXT index on chat_message.content
+MYSQL_SEARCH_INDEX_NAME = "ix_chat_message_content_fulltext"
+
+SQLITE_SEARCH_QUERY = text(f"""
+    SELECT chat_message.id, chat_message.thread_id, chat_message.role, chat_message.created_at,
+        snippet(
+            chat_message_fts, 0, '{SNIPPET_MATCH_START}', '{SNIPPET_MATCH_END}',
+            '{SNIPPET_ELLIPSIS}', {SNIPPET_WORDS}
+        )
+    FROM chat_message_fts
+    JOIN chat_message ON chat_message.id = chat_message_fts.rowid
+    JOIN chat_thread ON chat_thread.thread_id = chat_message.thread_id
+    WHERE chat_message_fts MATCH :match
+        AND chat_thread.deleted = 0
+    ORDER BY chat_message_fts.rank
+    LIMIT :limit
+""")
+
+MYSQL_SEARCH_QUERY = text("""
+    SELECT chat_message.id, chat_message.thread_id, chat_message.role, chat_message.created_at,
+        chat_message.content
+    FROM chat_message
+    JOIN chat_thread ON chat_thread.thread_id = chat_message.thread_id
+    WHERE MATCH(chat_message.content) AGAINST (:match IN BOOLEAN MODE)
+        AND chat_thread.user_id = :user_id
+        AND chat_thread.deleted = 0
+    ORDER BY MATCH(chat_message.content) AGAINST (:match IN BOOLEAN MODE) DESC
+    LIMIT :limit
+""")
+
+def create_search_index(engine: Engine):
+    """
+    Create the full-text index of the chat messages if it doesn't exist. Run after the
+    tables are created.
+    """
+    with engine.begin() as connection:
+        if engine.dialect.name == "mysql":
+            index_count = connection.execute(text(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'chat_message' "
+                "AND index_name = :index_name"
+            ), {"index_name": MYSQL_SEARCH_INDEX_NAME}).scalar()
+            if not index_count:
+                connection.execute(text(
+                    f"ALTER TABLE chat_message ADD FULLTEXT INDEX {MYSQL_SEARCH_INDEX_NAME} (content)"
+                ))
+            return
+
+        # The triggers are dropped with chat_message, so the index is (re)built without them
+        trigger_count = connection.execute(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = :name"
+        ), {"name": SQLITE_SEARCH_INDEX_TRIGGER}).scalar()
+        if not trigger_count:
+            for statement in SQLITE_SEARCH_INDEX_STATEMENTS:
+                connection.execute(text(statement))
+
+def get_search_terms(query: str) -> list[str]:
+    """
+    Words of a search. Operators and punctuation are dropped, so any text is a valid query.
+    """
+    return re.findall(r"\w+", query)
+
+def is_prefix_term(term: str) -> bool:
+    return len(term) >= MIN_PREFIX_LENGTH
+
+def make_snippet(content: str, terms: list[str]) -> str:
+    """
+    Words around the first match of a message, with the matched words marked (the FTS5
+    `snippet` function does this on SQLite)
+    """
+    words = content.split()
+    prefixes = tuple(term.lower() for term in terms if is_prefix_term(term))
+    whole_words = {term.lower() for term in terms if not is_prefix_term(term)}
+    is_match = []
+    for word in words:
+        word = re.sub(r"\W", "", word.lower())
+        is_match.append(word.startswith(prefixes) or word in whole_words)
+
+    first_match = is_match.index(True) if True in is_match else 0
+    start = max(0, min(first_match - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS))
+    end = start + SNIPPET_WORDS
+
+    snippet = " ".join(
+        f"{SNIPPET_MATCH_START}{word}{SNIPPET_MATCH_END}" if matched else word
+        for word, matched in zip(words[start:end], is_match[start:end])
+    )
+    if start > 0:
+        snippet = SNIPPET_ELLIPSIS + snippet
+    if end < len(words):
+        snippet += SNIPPET_ELLIPSIS
+    return snippet
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    limit: int = DEFAULT_SEARCH_RESULTS
+) -> list[ChatMessageSearchResult]:
+    """
+    Search the stored messages of the threads of a user, best matches first. Every word of
+    the query must be in the message, words of 4 or more letters also as the start of a word
+    ("precio" finds "precios").
+
+    Args:
+        query (str): words to search
+        limit (int): max number of results, capped to MAX_SEARCH_RESULTS
+    """
+    terms = get_search_terms(query)
+    if not terms:
+        return []
+
+    parameters = {"user_id": user_id, "limit": min(max(limit, 1), MAX_SEARCH_RESULTS)}
+    if db.get_bind().dialect.name == "mysql":
+        parameters["match"] = " ".join(
+            f"+{term}*" if is_prefix_term(term) else f"+{term}" for term in terms
+        )
+        rows = db.execute(MYSQL_SEARCH_QUERY, parameters).all()
+        rows = [(*row[:4], make_snippet(row[4], terms)) for row in rows]
+    else:
+        content_match = " ".join(
+            f'"{term}"*' if is_prefix_term(term) else f'"{term}"' for term in terms
+        )
+        parameters["match"] = f'owner : "u{user_id}" AND content : ({content_match})'
+        rows = db.execute(SQLITE_SEARCH_QUERY, parameters).all()
+
+    return [
+        ChatMessageSearchResult(
+            message_id=message_id,
+            thread_id=thread_id,
+            role=role,
+            created_at=created_at,
+            snippet=snippet
+        )
+        for message_id, thread_id, role, created_at, snippet in rows
+    ]
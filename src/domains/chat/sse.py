@@ -0,0 +1,40 @@
+from typing import AsyncIterator
+from contextlib import aclosing
+import json
+from src.domains.openai_integration.stream_events import ChatStreamEvent, make_event, ERROR
+from src.domains.openai_integration.http_client import OpenAIUnavailableException
+from src.domains.chat.scheduler import ChatRunLimitException
+from src.domains.auth.controllers.user_usage_controller import UserTokenLimitIsReachedException
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Errors the client can react to keep their own code, any other error gets a generic one
+CLIENT_ERRORS = (
+    OpenAIUnavailableException, ChatRunLimitException, UserTokenLimitIsReachedException
+)
+STREAM_ERROR_CODE = "ChatStreamError"
+STREAM_ERROR_DETAIL = "Ocurrió un error al generar la respuesta, intenta nuevamente"
+
+def encode_sse(chat_event: ChatStreamEvent) -> str:
+    """
+    Encode an event as a Server-Sent Events frame
+    """
+    return f"event: {chat_event['event']}\ndata: {json.dumps(chat_event['data'], default=str)}\n\n"
+
+async def sse_stream(events: AsyncIterator[ChatStreamEvent]) -> AsyncIterator[str]:
+    """
+    Encode a stream of chat events as Server-Sent Events. An error raised while streaming is
+    sent to the client as an `error` event, since the response status was already sent. The
+    event only has a generic message and the error code, the error itself is only logged.
+    """
+    try:
+        async with aclosing(events):
+            async for chat_event in events:
+                yield encode_sse(chat_event)
+    except Exception as error:
+        print("Error while streaming chat events", repr(error))
+        error_code = type(error).__name__ if isinstance(error, CLIENT_ERRORS) else STREAM_ERROR_CODE
+        yield encode_sse(make_event(ERROR, detail=STREAM_ERROR_DETAIL, error_code=error_code))
+
+def accepts_sse(accept_header: str) -> bool:
+    return SSE_MEDIA_TYPE in (accept_header or "")
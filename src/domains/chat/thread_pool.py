@@ -0,0 +1,100 @@
+from typing import Optional
+from collections import deque
+import asyncio
+import threading
+from src.domains.openai_integration.openai_integration import async_openai
+from src.domains.openai_integration.http_client import openai_circuit_breaker
+from src.utils.settings import CHAT_THREAD_POOL_SIZE, CHAT_THREAD_POOL_REFILL_PER_SECOND
+
+class PrewarmedThreadPool:
+    """
+    Empty OpenAI threads created in the background, so a new chat doesn't wait for a
+    `threads.create` round trip. The pool only keeps thread ids: the thread gets its owner when
+    it is handed out. Threads left in the pool when the process stops are deleted by `drain`.
+
+    The pool is refilled by `run` (a task of the event loop) at `refill_per_second` threads per
+    second at most, up to `size` threads. When it is empty the caller creates the thread itself.
+    """
+
+    def __init__(self, size: int, refill_per_second: float):
+        self.size = size
+        self.refill_interval = 1 / refill_per_second if refill_per_second > 0 else 1
+        self.lock = threading.Lock()
+        self.__thread_ids: deque[str] = deque()
+
+        self.hits = 0
+        self.misses = 0
+        self.created_total = 0
+        self.failed_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def take(self) -> Optional[str]:
+        """
+        Hand out a pre-created thread, or None when the pool is empty
+        """
+        with self.lock:
+            if self.__thread_ids:
+                self.hits += 1
+                return self.__thread_ids.popleft()
+            self.misses += 1
+            return None
+
+    async def run(self):
+        """
+        Keep the pool filled until the task is cancelled
+        """
+        while True:
+            with self.lock:
+                is_full = len(self.__thread_ids) >= self.size
+
+            # Nothing is created while the circuit breaker of OpenAI is open
+            if not is_full and openai_circuit_breaker.is_available():
+                try:
+                    thread = await async_openai.beta.threads.create()
+                except Exception as error:
+                    self.failed_total += 1
+                    print("Could not pre-create a chat thread", repr(error))
+                else:
+                    with self.lock:
+                        self.__thread_ids.append(thread.id)
+                        self.created_total += 1
+
+            await asyncio.sleep(self.refill_interval)
+
+    async def drain(self):
+        """
+        Delete the threads left in the pool, so they don't leak on every restart. Called at
+        shutdown once `run` is cancelled.
+        """
+        with self.lock:
+            thread_ids = list(self.__thread_ids)
+            self.__thread_ids.clear()
+
+        results = await asyncio.gather(
+            *(async_openai.beta.threads.delete(thread_id) for thread_id in thread_ids),
+            return_exceptions=True
+        )
+        for thread_id, result in zip(thread_ids, results):
+            if isinstance(result, Exception):
+                print(f"Could not delete pre-created chat thread {thread_id}", repr(result))
+
+    def metrics(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "available_threads": len(self.__thread_ids),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / requests if requests else None,
+                "created_total": self.created_total,
+                "failed_total": self.failed_total,
+            }
+
+prewarmed_thread_pool = PrewarmedThreadPool(
+    size=CHAT_THREAD_POOL_SIZE,
+    refill_per_second=CHAT_THREAD_POOL_REFILL_PER_SECOND
+)
@@ -1,7 +1,8 @@
 from typing import Optional
 from sqlmodel import Session, select
-from src.domains.customer.models.contact import Contact
+from src.domains.customer.models.contact import Contact, ContactCreateItem
 from src.domains.openai_integration import Ignored
+from src.utils.pagination import Page, paginate, DEFAULT_PAGE_SIZE
 
 class ContactController:
 
@@ -44,20 +45,63 @@ class ContactController:
         return new_contact
     
 
+    @staticmethod
+    def create_contacts(
+        db: Ignored[Session],
+        user_id: Ignored[int],
+        contacts: list[ContactCreateItem]
+    ) -> list[int]:
+        """
+        Registra varios contactos de clientes en una sola llamada. Úsala en vez de llamar varias
+        veces a create_contact cuando hay que registrar más de un contacto.
+
+        Args:
+         - contacts: Contactos que se van a registrar.
+
+        Returns:
+         - list[int]: IDs de los contactos registrados, en el mismo orden en que fueron enviados.
+        """
+        new_contacts = [
+            Contact(
+                user_id=user_id,
+                establishment_id=contact.customer_id,
+                name=contact.name,
+                role=contact.role,
+                email=contact.email,
+                phone=contact.phone
+            )
+            for contact in contacts
+        ]
+
+        # A single flush inserts every row (in batches) and sets their ids
+        db.add_all(new_contacts)
+        db.flush()
+        contact_ids = [contact.id for contact in new_contacts]
+        db.commit()
+
+        return contact_ids
+    
+
     @staticmethod
     def get_all_contacts(
         db: Ignored[Session],
         user_id: Ignored[int],
-        customer_id: Optional[int] = None
-    ) -> list[Contact]:
+        customer_id: Optional[int] = None,
+        name_prefix: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[int] = None
+    ) -> Page:
         """
-        Obtiene todos los contactos registrados por el usuario.
+        Obtiene los contactos registrados por el usuario, de a una página.
 
         Args:
          - customer_id: ID del cliente al que pertenecen los contactos.
+         - name_prefix: Obtiene solo los contactos cuyo nombre comienza con este texto.
+         - limit: Cantidad máxima de contactos a obtener (por defecto 50, máximo 100).
+         - cursor: Valor de next_cursor de la respuesta anterior, para obtener la página siguiente.
 
         Returns:
-         - list[Contact]: lista con todos los contactos registrados por el usuario.
+         - Page: los contactos de la página (items), la cantidad total de contactos que cumplen los filtros (total_count) y el cursor de la página siguiente (next_cursor, vacío si no hay más).
         """
         query = select(Contact).where(
             Contact.user_id == user_id,
@@ -66,8 +110,25 @@ class ContactController:
 
         if customer_id:
             query = query.where(Contact.establishment_id == customer_id)
+        if name_prefix:
+            query = query.where(Contact.name.startswith(name_prefix, autoescape=True))
+
+        return paginate(db, query, Contact.id, limit, cursor)
+
+    @staticmethod
+    def list_contacts(db: Session, user_id: int, customer_id: int) -> list[Contact]:
+        """
+        Obtiene todos los contactos de un cliente del usuario, sin paginar. Solo para las
+        rutas, el asistente usa get_all_contacts.
 
-        return db.exec(query).all()
+        Args:
+         - customer_id: ID del cliente al que pertenecen los contactos.
+        """
+        return db.exec(select(Contact).where(
+            Contact.user_id == user_id,
+            Contact.establishment_id == customer_id,
+            Contact.deleted == False
+        ).order_by(Contact.id)).all()
     
     @staticmethod
     def get_contact(
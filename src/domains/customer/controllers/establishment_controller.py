@@ -1,7 +1,36 @@
 from typing import Optional
-from sqlmodel import Session, select
-from src.domains.customer.models.establishment import CustomerEstablishment
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, func, select
+from src.domains.customer.models.establishment import (
+    CustomerEstablishment, CustomerEstablishmentCreateItem
+)
+from src.domains.customer.models.additional_note import (
+    AdditionalNote, AdditionalNoteSummarizedResponse
+)
+from src.domains.customer.models.contact import Contact
+from src.domains.customer.models.task import Task
+from src.domains.customer.models.meet import Meet
+from src.domains.customer.models.opportunity import Opportunity
 from src.domains.openai_integration import Ignored
+from src.utils.pagination import Page, paginate, DEFAULT_PAGE_SIZE
+
+def find_customer_by_name(
+    customers: list[CustomerEstablishment],
+    name: str
+) -> Optional[CustomerEstablishment]:
+    """
+    Fuzzy match of `get_customer_by_name`: the customer with exactly that name or, if there is
+    none, the first one whose name contains it (case insensitive)
+    """
+    for customer in customers:
+        if customer.name == name:
+            return customer
+
+    for customer in customers:
+        if name.lower() in customer.name.lower():
+            return customer
+
+    return None
 
 class EstablishmentController:
 
@@ -47,23 +76,90 @@ class EstablishmentController:
         return new_customer
     
 
+    @staticmethod
+    def create_customers(
+        db: Ignored[Session],
+        user_id: Ignored[int],
+        customers: list[CustomerEstablishmentCreateItem]
+    ) -> list[int]:
+        """
+        Registra varios clientes en una sola llamada. Úsala en vez de llamar varias veces a
+        create_customer cuando hay que registrar más de un cliente.
+
+        Args:
+         - customers: Clientes que se van a registrar.
+
+        Returns:
+         - list[int]: IDs de los clientes, en el mismo orden en que fueron enviados. Si ya existe un cliente con el mismo nombre (o un nombre similar, como en create_customer) se retorna el ID del cliente existente.
+        """
+        # Customers are matched like create_customer does, against the customers of the user
+        # read in a single query and the ones created earlier in the batch
+        known_customers = list(db.exec(select(CustomerEstablishment).where(
+            CustomerEstablishment.user_id == user_id,
+            CustomerEstablishment.deleted == False
+        )).all())
+
+        batch_customers = []
+        for customer in customers:
+            matched_customer = find_customer_by_name(known_customers, customer.name)
+            if matched_customer is None:
+                matched_customer = CustomerEstablishment(
+                    name=customer.name,
+                    description=customer.description,
+                    industry=customer.industry,
+                    user_id=user_id
+                )
+                db.add(matched_customer)
+                known_customers.append(matched_customer)
+            batch_customers.append(matched_customer)
+
+        # A single flush inserts every new row (in batches) and sets their ids
+        db.flush()
+        customer_ids = [customer.id for customer in batch_customers]
+        db.commit()
+
+        return customer_ids
+
     @staticmethod
     def get_all_customer(
         db: Ignored[Session],
-        user_id: Ignored[int]
-    ) -> list[CustomerEstablishment]:
+        user_id: Ignored[int],
+        name_prefix: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[int] = None
+    ) -> Page:
         """
-        Obtiene todos los clientes registrador por el usuario.
+        Obtiene los clientes registrados por el usuario, de a una página. Usa los filtros en vez
+        de pedir todos los clientes y buscar en la respuesta.
+
+        Args:
+         - name_prefix: Obtiene solo los clientes cuyo nombre comienza con este texto.
+         - limit: Cantidad máxima de clientes a obtener (por defecto 50, máximo 100).
+         - cursor: Valor de next_cursor de la respuesta anterior, para obtener la página siguiente.
 
         Returns:
-         - list[CustomerEstablishment]: lista con todos los clientes registrados por el usuario.
+         - Page: los clientes de la página (items), la cantidad total de clientes que cumplen los filtros (total_count) y el cursor de la página siguiente (next_cursor, vacío si no hay más).
         """
         query = select(CustomerEstablishment).where(
             CustomerEstablishment.user_id == user_id,
             CustomerEstablishment.deleted == False
         )
 
-        return db.exec(query).all()
+        if name_prefix:
+            query = query.where(CustomerEstablishment.name.startswith(name_prefix, autoescape=True))
+
+        return paginate(db, query, CustomerEstablishment.id, limit, cursor)
+
+    @staticmethod
+    def list_customers(db: Session, user_id: int) -> list[CustomerEstablishment]:
+        """
+        Obtiene todos los clientes registrados por el usuario, sin paginar. Solo para las
+        rutas, el asistente usa get_all_customer.
+        """
+        return db.exec(select(CustomerEstablishment).where(
+            CustomerEstablishment.user_id == user_id,
+            CustomerEstablishment.deleted == False
+        ).order_by(CustomerEstablishment.id)).all()
     
     @staticmethod
     def get_customer_by_id(
@@ -193,8 +289,85 @@ class EstablishmentController:
     
         customers = db.exec(query).all()
 
-        for customer in customers:
-            if name.lower() in customer.name.lower():
-                return customer
-        
-        return None
\ No newline at end of file
+        return find_customer_by_name(customers, name)
+
+
+    # Relationships the customer overview can include, with the model of each one
+    overview_relations = {
+        "contacts": (CustomerEstablishment.contacts, Contact),
+        "tasks": (CustomerEstablishment.tasks, Task),
+        "meets": (CustomerEstablishment.meets, Meet),
+        "opportunities": (CustomerEstablishment.opportunities, Opportunity),
+        "notes": (CustomerEstablishment.additional_notes, AdditionalNote),
+    }
+
+    @staticmethod
+    def get_customer_overview(
+        db: Ignored[Session],
+        user_id: Ignored[int],
+        customer_id: Optional[int] = None,
+        name: Optional[str] = None,
+        include: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        Obtiene en una sola llamada un cliente y todo lo relacionado a él: contactos, tareas,
+        reuniones, oportunidades y títulos de las notas. Úsala para responder preguntas
+        generales sobre un cliente en vez de llamar a cada herramienta por separado.
+
+        Args:
+         - customer_id: ID del cliente. Si no lo conoces, usa name.
+         - name: Nombre (o parte del nombre) del cliente, cuando no se conoce su ID.
+         - include: Relaciones a incluir separadas por coma (contacts, tasks, meets, opportunities, notes). Por defecto se incluyen todas.
+
+        Returns:
+         - dict: el cliente (customer) y las relaciones pedidas. Las notas incluyen solo su título, para obtener el contenido usa get_additional_note.
+        """
+        if include:
+            relation_names = [
+                relation_name.strip() for relation_name in include.split(",")
+                if relation_name.strip() in EstablishmentController.overview_relations
+            ]
+        else:
+            relation_names = list(EstablishmentController.overview_relations)
+
+        # Every relationship is loaded with one extra query (selectin), without deleted rows
+        loader_options = []
+        for relation_name in relation_names:
+            relationship, model = EstablishmentController.overview_relations[relation_name]
+            loader_options.append(selectinload(relationship.and_(model.deleted == False)))
+
+        query = select(CustomerEstablishment).options(*loader_options).where(
+            CustomerEstablishment.user_id == user_id,
+            CustomerEstablishment.deleted == False
+        )
+
+        if customer_id:
+            customer = db.exec(query.where(CustomerEstablishment.id == customer_id)).first()
+        elif name:
+            customer = db.exec(query.where(CustomerEstablishment.name == name)).first()
+            if customer is None:
+                customer = db.exec(query.where(
+                    func.lower(CustomerEstablishment.name).contains(name.lower(), autoescape=True)
+                ).order_by(CustomerEstablishment.id)).first()
+        else:
+            return None
+
+        if customer is None:
+            return None
+
+        overview = {"customer": customer}
+        for relation_name in relation_names:
+            relationship, _ = EstablishmentController.overview_relations[relation_name]
+            overview[relation_name] = getattr(customer, relationship.key)
+
+        if "notes" in overview:
+            overview["notes"] = [
+                AdditionalNoteSummarizedResponse(
+                    id=note.id,
+                    title=note.title,
+                    customer_establishment_id=note.customer_establishment_id
+                )
+                for note in overview["notes"]
+            ]
+
+        return overview
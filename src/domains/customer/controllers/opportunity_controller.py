@@ -1,6 +1,7 @@
 from datetime import datetime
 from src.domains.openai_integration import Ignored, DateTimeString
 from src.domains.customer.models.opportunity import Opportunity
+from src.utils.pagination import Page, paginate, DEFAULT_PAGE_SIZE
 from sqlmodel import Session, select
 from typing import Optional
 
@@ -53,22 +54,58 @@ class OpportunityController:
     def get_all_opportunities(
         db: Ignored[Session],
         user_id: Ignored[int],
-        customer_id: Optional[int] = None
-    ) -> list[Opportunity]:
+        customer_id: Optional[int] = None,
+        stage: Optional[str] = None,
+        close_date_from: Optional[DateTimeString] = None,
+        close_date_to: Optional[DateTimeString] = None,
+        product_prefix: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[int] = None
+    ) -> Page:
         """
-        Obtiene todas las oportunidades registradas por el usuario.
+        Obtiene las oportunidades registradas por el usuario, de a una página. Usa los filtros
+        para obtener solo las oportunidades que necesitas.
 
         Args:
          - customer_id: ID del cliente al que pertenecen las oportunidades.
+         - stage: Obtiene solo las oportunidades que están en esta etapa.
+         - close_date_from: Obtiene solo las oportunidades que cierran desde esta fecha. (Formato ISO 8601)
+         - close_date_to: Obtiene solo las oportunidades que cierran hasta esta fecha. (Formato ISO 8601)
+         - product_prefix: Obtiene solo las oportunidades cuyo producto comienza con este texto.
+         - limit: Cantidad máxima de oportunidades a obtener (por defecto 50, máximo 100).
+         - cursor: Valor de next_cursor de la respuesta anterior, para obtener la página siguiente.
 
         Returns:
-         - list[Opportunity]: lista con todas las oportunidades registradas por el usuario.
+         - Page: las oportunidades de la página (items), la cantidad total de oportunidades que cumplen los filtros (total_count) y el cursor de la página siguiente (next_cursor, vacío si no hay más).
         """
-        query = select(Opportunity).where(Opportunity.user_id == user_id)
+        query = select(Opportunity).where(
+            Opportunity.user_id == user_id,
+            Opportunity.deleted == False
+        )
+
         if customer_id:
             query = query.where(Opportunity.customer_establishment_id == customer_id)
+        if stage:
+            query = query.where(Opportunity.stage == stage)
+        if close_date_from:
+            query = query.where(Opportunity.close_date >= datetime.fromisoformat(close_date_from))
+        if close_date_to:
+            query = query.where(Opportunity.close_date <= datetime.fromisoformat(close_date_to))
+        if product_prefix:
+            query = query.where(Opportunity.product.startswith(product_prefix, autoescape=True))
+
+        return paginate(db, query, Opportunity.id, limit, cursor)
 
-        return db.exec(query).all()
+    @staticmethod
+    def list_opportunities(db: Session, user_id: int) -> list[Opportunity]:
+        """
+        Obtiene todas las oportunidades registradas por el usuario, sin paginar. Solo para las
+        rutas, el asistente usa get_all_opportunities.
+        """
+        return db.exec(select(Opportunity).where(
+            Opportunity.user_id == user_id,
+            Opportunity.deleted == False
+        ).order_by(Opportunity.id)).all()
     
     
     @staticmethod
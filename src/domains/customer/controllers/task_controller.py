@@ -3,7 +3,8 @@ from typing import Optional
 from datetime import datetime
 
 from src.domains.openai_integration import Ignored, DateTimeString
-from src.domains.customer.models.task import Task
+from src.domains.customer.models.task import Task, TaskCreateItem
+from src.utils.pagination import Page, paginate, DEFAULT_PAGE_SIZE
 
 
 class TaskController:
@@ -49,21 +50,70 @@ class TaskController:
         db.refresh(new_task)
 
         return new_task
+
+    @staticmethod
+    def create_tasks(
+        db: Ignored[Session],
+        user_id: Ignored[int],
+        tasks: list[TaskCreateItem]
+    ) -> list[int]:
+        """
+        Registra varias tareas en una sola llamada. Úsala en vez de llamar varias veces a
+        create_task cuando hay que registrar más de una tarea.
+
+        Args:
+         - tasks: Tareas que se van a registrar.
+
+        Returns:
+         - list[int]: IDs de las tareas registradas, en el mismo orden en que fueron enviadas.
+        """
+        new_tasks = [
+            Task(
+                name=task.name,
+                description=task.description,
+                due_date=task.due_date,
+                completed=task.completed,
+                user_id=user_id,
+                establishment_id=task.customer_id
+            )
+            for task in tasks
+        ]
+
+        # A single flush inserts every row (in batches) and sets their ids
+        db.add_all(new_tasks)
+        db.flush()
+        task_ids = [task.id for task in new_tasks]
+        db.commit()
+
+        return task_ids
     
     @staticmethod
     def get_all_tasks(
         db: Ignored[Session],
         user_id: Ignored[int],
-        customer_id: Optional[int] = None
-    ) -> list[Task]:
+        customer_id: Optional[int] = None,
+        completed: Optional[bool] = None,
+        due_date_from: Optional[DateTimeString] = None,
+        due_date_to: Optional[DateTimeString] = None,
+        name_prefix: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[int] = None
+    ) -> Page:
         """
-        Obtiene todas las tareas registradas por el usuario.
+        Obtiene las tareas registradas por el usuario, de a una página. Usa los filtros para
+        obtener solo las tareas que necesitas (por ejemplo las pendientes de esta semana).
 
         Args:
          - customer_id: ID del cliente al que están relacionadas las tareas.
+         - completed: Obtiene solo las tareas completadas (true) o solo las pendientes (false).
+         - due_date_from: Obtiene solo las tareas que vencen desde esta fecha. (Formato ISO 8601)
+         - due_date_to: Obtiene solo las tareas que vencen hasta esta fecha. (Formato ISO 8601)
+         - name_prefix: Obtiene solo las tareas cuyo nombre comienza con este texto.
+         - limit: Cantidad máxima de tareas a obtener (por defecto 50, máximo 100).
+         - cursor: Valor de next_cursor de la respuesta anterior, para obtener la página siguiente.
 
         Returns:
-         - list[Task]: lista con todas las tareas registradas por el usuario.
+         - Page: las tareas de la página (items), la cantidad total de tareas que cumplen los filtros (total_count) y el cursor de la página siguiente (next_cursor, vacío si no hay más).
         """
         query = select(Task).where(
             Task.user_id == user_id,
@@ -72,8 +122,16 @@ class TaskController:
 
         if customer_id:
             query = query.where(Task.establishment_id == customer_id)
-
-        return db.exec(query).all()
+        if completed is not None:
+            query = query.where(Task.completed == completed)
+        if due_date_from:
+            query = query.where(Task.due_date >= datetime.fromisoformat(due_date_from))
+        if due_date_to:
+            query = query.where(Task.due_date <= datetime.fromisoformat(due_date_to))
+        if name_prefix:
+            query = query.where(Task.name.startswith(name_prefix, autoescape=True))
+
+        return paginate(db, query, Task.id, limit, cursor)
     
     
     @staticmethod
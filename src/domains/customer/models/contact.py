@@ -27,4 +27,11 @@ class Contact(ContactBase, DeletableModel, table=True):
     establishment_id: int = Field(foreign_key="customer_establishment.id")
     establishment: "CustomerEstablishment" = Relationship(back_populates="contacts")
     
-    meets: list["Meet"] = Relationship(back_populates="contacts", link_model=MeetContact)
\ No newline at end of file
+    meets: list["Meet"] = Relationship(back_populates="contacts", link_model=MeetContact)
+
+class ContactCreateItem(SQLModel):
+    customer_id: int = Field(description="ID del cliente al que pertenece el contacto.")
+    name: str = Field(description="Nombre del contacto.")
+    role: str = Field(description="Rol del contacto.")
+    email: str = Field(description="Correo del contacto.")
+    phone: str = Field(description="Teléfono del contacto.")
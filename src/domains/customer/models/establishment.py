@@ -32,4 +32,9 @@ class CustomerEstablishment(CustomerEstablishmentBase, DeletableModel, table=Tru
     meets: list["Meet"] = Relationship(back_populates="customer_establishment")
 
 class CustomerEstablishmentResponse(CustomerEstablishmentBase):
-    id: int
\ No newline at end of file
+    id: int
+
+class CustomerEstablishmentCreateItem(SQLModel):
+    name: str = Field(description="Nombre del cliente que se va a registrar.")
+    description: str = Field(description="Descripción detallada de la empresa.")
+    industry: str = Field(description="Industria a la que pertenece la empresa.")
\ No newline at end of file
@@ -21,4 +21,15 @@ class Task(TaskBase, DeletableModel, table=True):
     user: User = Relationship(back_populates="tasks")
 
     establishment_id: int = Field(foreign_key="customer_establishment.id")
-    establishment: CustomerEstablishment = Relationship(back_populates="tasks")
\ No newline at end of file
+    establishment: CustomerEstablishment = Relationship(back_populates="tasks")
+
+class TaskCreateItem(SQLModel):
+    customer_id: int = Field(description="ID del cliente al que está relacionada la tarea.")
+    name: str = Field(description="Nombre de la tarea.")
+    description: str = Field(description="Descripción detallada de la tarea.")
+    due_date: Optional[datetime] = Field(
+        default=None, description="Fecha y hora de vencimiento de la tarea. (Formato ISO 8601)"
+    )
+    completed: Optional[bool] = Field(
+        default=False, description="Indica si la tarea ya fue completada."
+    )
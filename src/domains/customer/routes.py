@@ -18,9 +18,7 @@ def get_all_establishments(
     db: Session = Depends(database.get_db_session),
     user: User = Depends(get_current_active_user)
 ):
-    return EstablishmentController.get_all_customer(
-        db=db, user_id=user.id
-    )
+    return EstablishmentController.list_customers(db, user.id)
 
 @router.get("/{customer_id}/contacts")
 def get_all_contacts(
@@ -28,9 +26,7 @@ def get_all_contacts(
     db: Session = Depends(database.get_db_session),
     user: User = Depends(get_current_active_user)
 ):
-    return ContactController.get_all_contacts(
-        db=db, user_id=user.id, customer_id=customer_id
-    )
+    return ContactController.list_contacts(db, user.id, customer_id)
 
 
 @router.get("/opportunities")
@@ -38,6 +34,4 @@ def get_all_opportunities(
     db: Session = Depends(database.get_db_session),
     user: User = Depends(get_current_active_user)
 ):
-    return OpportunityController.get_all_opportunities(
-        db=db, user_id=user.id
-    )
\ No newline at end of file
+    return OpportunityController.list_opportunities(db, user.id)
\ No newline at end of file
@@ -0,0 +1,87 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import json
+from src.domains.openai_integration.openai_integration import openai, assistant_id
+from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+from src.domains.openai_integration.models import AssistantConfig
+from src.domains.openai_integration.event_handler import SessionFactory
+
+# Key of the assistant metadata where the hash of its config is stored
+CONFIG_HASH_METADATA_KEY = "config_hash"
+
+def get_assistant_config() -> dict:
+    """
+    Configuration of the assistant as it is sent to OpenAI
+    """
+    return {
+        "description": BinnaAssistantDescription.description,
+        "name": BinnaAssistantDescription.name,
+        "instructions": BinnaAssistantDescription.instructions,
+        "model": BinnaAssistantDescription.model,
+        "tools": BinnaAssistantDescription.tools,
+        "temperature": BinnaAssistantDescription.temperature,
+    }
+
+def get_assistant_config_hash() -> str:
+    """
+    Stable hash of the assistant configuration (tools, instructions, model, etc.)
+    """
+    serialized_config = json.dumps(get_assistant_config(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized_config.encode()).hexdigest()
+
+def get_synced_config(db: Session) -> Optional[AssistantConfig]:
+    return db.exec(select(AssistantConfig).where(
+        AssistantConfig.assistant_id == assistant_id
+    )).first()
+
+def sync_assistant_config(session_factory: SessionFactory) -> bool:
+    """
+    Update the OpenAI assistant if its configuration changed since the last sync.
+
+    The hash of the synced configuration is stored in the DB and in the assistant metadata:
+    when the local hash matches, OpenAI isn't called at all, and when only the remote one
+    matches (another instance already synced it) the assistant isn't updated again.
+
+    Returns:
+        bool: the remote assistant was updated
+    """
+    config_hash = get_assistant_config_hash()
+
+    with session_factory() as db:
+        synced_config = get_synced_config(db)
+        synced_hash = synced_config.config_hash if synced_config else None
+    if synced_hash == config_hash:
+        print("Binna assistant config is up to date")
+        return False
+
+    # No session is held during the OpenAI requests
+    assistant = openai.beta.assistants.retrieve(assistant_id)
+    metadata = dict(assistant.metadata or {})
+    updated = metadata.get(CONFIG_HASH_METADATA_KEY) != config_hash
+
+    if updated:
+        print("Binna Config is not equal. Updating Binna assistant config")
+        metadata[CONFIG_HASH_METADATA_KEY] = config_hash
+        openai.beta.assistants.update(
+            assistant_id,
+            metadata=metadata,
+            **get_assistant_config()
+        )
+
+    with session_factory() as db:
+        synced_config = get_synced_config(db)
+        if synced_config is None:
+            synced_config = AssistantConfig(assistant_id=assistant_id, config_hash=config_hash)
+        synced_config.config_hash = config_hash
+        synced_config.synced_at = datetime.now()
+        db.add(synced_config)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another instance registered the same hash at the same time
+            db.rollback()
+
+    return updated
@@ -1,29 +1,409 @@
-from typing import Optional, TypedDict
-from openai import OpenAI, AssistantEventHandler
-from openai.types.beta.threads import Text
+from contextlib import contextmanager, nullcontext
+from typing import AsyncIterator, Callable, Iterator, Optional, TypedDict
+from openai import OpenAI, AssistantEventHandler, AsyncAssistantEventHandler
+from openai.types.beta.threads import Message, Text
+from openai.types.beta.threads.run import Usage
 from sqlmodel import Session, select
 from typing_extensions import override
-import json
-from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+from src.domains.openai_integration.openai_assistant import (
+    BinnaAssistantDescription, ToolArgumentsException
+)
+from src.domains.openai_integration.tool_cache import ToolResultCache
+from src.domains.openai_integration.tool_output_serializer import serialize_tool_output
+from src.domains.openai_integration.stream_events import (
+    ChatStreamEvent, make_event, TEXT_DELTA, TOOL_STARTED, TOOL_FINISHED
+)
 from src.domains.auth.models.user import User
+from src.database.database import UnitOfWorkSession
+from src.utils.settings import TOOL_EXECUTOR_MAX_WORKERS, TOOL_OUTPUT_MAX_BYTES
 
 
 DetailItem = TypedDict("DetailItem", {"title": str, "subtitle": str, "icon": str})
+# Factories open unit-of-work sessions, so mutating tool batches can run in one transaction
+SessionFactory = Callable[[], UnitOfWorkSession]
+
+# Events that end a run. They carry the token usage of the whole run.
+RUN_FINISHED_EVENTS = (
+    "thread.run.completed",
+    "thread.run.incomplete",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+)
+
+# Bounded pool shared by all the conversations to run read-only tools concurrently
+tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="binna-tool"
+)
+
+@contextmanager
+def open_session(
+    db: Optional[Session],
+    session_factory: Optional[SessionFactory] = None
+) -> Iterator[Session]:
+    """
+    Yield the session to work with. In session-factory mode a new session is opened and closed
+    (returning its connection to the pool) when the block exits, otherwise `db` is reused.
+    """
+    if session_factory is None:
+        yield db
+        return
+
+    with session_factory() as session:
+        yield session
 
 class CRUDActionHandler:
     def __init__(self, db: Session, controller):
         self.db = db
         self.controller = controller
 
+class ToolCallRunner:
+    """
+    Execute the tool calls requested by the assistant and build their outputs. It is shared by
+    the sync and the async event handlers.
+    """
+
+    def __init__(
+        self,
+        db: Optional[Session],
+        user: User,
+        session_factory: Optional[SessionFactory] = None,
+        tool_cache: Optional[ToolResultCache] = None
+    ):
+        """
+        Args:
+            db (Optional[Session]): shared session used to execute the tools. Ignored when
+                session_factory is given.
+            user (User): user that owns the conversation
+            session_factory (Optional[SessionFactory]): when given, a short-lived session is
+                opened for each tool call instead of holding `db` during the whole stream.
+            tool_cache (Optional[ToolResultCache]): cache of read-only tool outputs shared by
+                the tool rounds of the run
+        """
+        if db is None and session_factory is None:
+            raise ValueError("ToolCallRunner requires a db session or a session factory")
+
+        self.db = db
+        self.user = user
+        self.session_factory = session_factory
+        self.tool_cache = tool_cache
+
+    def open_session(self):
+        return open_session(self.db, self.session_factory)
+
+    def __make_tool_output(
+        self,
+        tool_call_id: str,
+        success: bool,
+        function_name: str,
+        message: str,
+        detail_list: Optional[list[DetailItem]] = None,
+        **kwargs
+    ):
+        """
+        Create a tool output
+
+        Args:
+            tool_call_id (str): id of the tool call. This id is used to identify the tool call
+            success (bool): a boolean value that indicates if the tool call was successful
+            function_name (str): the name of the function that was executed. Don't use code function name
+            message (str): a message that describes the result of the tool call
+            detail_list (Optional[list]): a list of dictionaries that contains the details of the tool call
+
+        Returns:
+            _type_: _description_
+        """
+        output = {
+            "success": success,
+            "function_name": function_name,
+            "message": message,
+        }
+        if detail_list:
+            output["detail_list"] = detail_list
+        output.update(kwargs) # type: ignore
+
+        return {
+            "tool_call_id": tool_call_id,
+            "output": serialize_tool_output(output, TOOL_OUTPUT_MAX_BYTES)
+        }
+
+    def __run_tool_call(self, tool, db: Optional[Session] = None) -> tuple[dict, float]:
+        """
+        Execute a single tool call in its own session, or in `db` when given
+
+        Returns:
+            tuple[dict, float]: the tool output and the seconds it took
+        """
+        start = time.perf_counter()
+        try:
+            arguments = BinnaAssistantDescription.parse_tool_arguments(
+                tool.function.name, tool.function.arguments
+            )
+        except ToolArgumentsException as error:
+            # The assistant gets the errors as the output, so it can fix the call
+            print(f"Invalid tool call (user_id: {self.user.id}): {error}")
+            return self.__make_tool_output(
+                tool_call_id=tool.id,
+                success=False,
+                function_name=tool.function.name,
+                message="Invalid arguments",
+                errors=error.errors
+            ), time.perf_counter() - start
+        print(f"Arguments: {arguments}")
+
+        if self.tool_cache is not None:
+            cached_output = self.tool_cache.get(self.user.id, tool.function.name, arguments)
+            if cached_output is not None:
+                print(f"Tool cache hit (user_id: {self.user.id}): {tool.function.name}")
+                return {
+                    "tool_call_id": tool.id,
+                    "output": cached_output
+                }, time.perf_counter() - start
+
+        # Outputs are serialized inside the block, so ORM results never outlive their session
+        with nullcontext(db) if db is not None else self.open_session() as db:
+            automatic_registered_tool_output = BinnaAssistantDescription.dispatch_tool(
+                tool.function.name,
+                arguments,
+                db=db,
+                user_id=self.user.id
+            )
+            tool_output = self.__make_tool_output(
+                tool_call_id=tool.id,
+                success=automatic_registered_tool_output is not None,
+                function_name=tool.function.name,
+                message="Successfully executed tool",
+                output=automatic_registered_tool_output
+            )
+
+        if self.tool_cache is not None:
+            self.tool_cache.record(
+                self.user.id, tool.function.name, arguments, tool_output["output"]
+            )
+
+        # if tool.function.name == "get_saved_customers":
+        #     tool_outputs.append(self.__make_tool_output(
+        #         tool_call_id=tool.id,
+        #         success=True,
+        #         function_name="Obtener clientes",
+        #         message="Clientes recuperados exitosamente",
+        #         customers=['Cliente de prueba 1', 'Cliente de prueba 2']
+        #     ))
+
+        return tool_output, time.perf_counter() - start
+
+    def __run_tool_call_reporting_errors(self, tool) -> tuple[dict, float]:
+        """
+        Execute a single tool call outside a unit of work. A failure becomes the output of the
+        tool, as in `__run_unit_of_work`, instead of reaching the stream and killing the run.
+        """
+        start = time.perf_counter()
+        try:
+            return self.__run_tool_call(tool)
+        except Exception as error:
+            print(f"Tool call failed (user_id: {self.user.id}): {tool.function.name} {error!r}")
+            if self.session_factory is None:
+                # Discard what the failed tool left pending in the shared session
+                self.db.rollback()
+            return self.__make_tool_output(
+                tool_call_id=tool.id,
+                success=False,
+                function_name=tool.function.name,
+                message="Error executing tool",
+                error=str(error)
+            ), time.perf_counter() - start
+
+    def __supports_unit_of_work(self) -> bool:
+        """
+        Whether batches with mutating tools can run in a single transaction. Session factories
+        open `UnitOfWorkSession`s (see `Database.session_factory`), so no session is opened to
+        find it out.
+        """
+        return self.session_factory is not None or isinstance(self.db, UnitOfWorkSession)
+
+    def run_tool_calls(self, tool_calls) -> list[dict]:
+        """
+        Execute the tool calls of a requires_action event
+
+        Args:
+            tool_calls (list): tool calls from `required_action.submit_tool_outputs`
+
+        Returns:
+            list[dict]: the tool outputs to submit, in the same order as the tool calls
+        """
+        return [tool_output for tool_output, _ in self.run_tool_calls_timed(tool_calls)]
+
+    def run_tool_calls_timed(self, tool_calls) -> list[tuple[dict, float]]:
+        """
+        Execute the tool calls of a requires_action event. Consecutive read-only tools run
+        concurrently (each one with its own session) when a session factory is available.
+        Batches with mutating tools run one by one, keeping the order requested by the
+        assistant, in a single transaction when the session supports it (see
+        `UnitOfWorkSession`). On both paths a failing tool is reported in the outputs, so the
+        assistant can react to it.
+
+        Args:
+            tool_calls (list): tool calls from `required_action.submit_tool_outputs`
+
+        Returns:
+            list[tuple[dict, float]]: the tool outputs to submit with the seconds each tool
+            took, in the same order as the tool calls
+        """
+        for tool in tool_calls:
+            print(f"Tool call (user_id: {self.user.id}): {tool.function.name}")
+
+        has_mutations = not all(
+            BinnaAssistantDescription.is_read_only_tool(tool.function.name) for tool in tool_calls
+        )
+        if has_mutations and self.__supports_unit_of_work():
+            with self.open_session() as db:
+                return self.__run_unit_of_work(tool_calls, db)
+
+        batch_start = time.perf_counter()
+        tool_outputs: list[Optional[dict]] = [None] * len(tool_calls)
+        durations = [0.0] * len(tool_calls)
+        # With a shared session tools can't run at the same time
+        can_run_concurrently = self.session_factory is not None
+        pending_reads: list[int] = []
+
+        def run_pending_reads():
+            if can_run_concurrently and len(pending_reads) > 1:
+                futures = {
+                    index: tool_executor.submit(
+                        self.__run_tool_call_reporting_errors, tool_calls[index]
+                    )
+                    for index in pending_reads
+                }
+                for index, future in futures.items():
+                    tool_outputs[index], durations[index] = future.result()
+            else:
+                for index in pending_reads:
+                    tool_outputs[index], durations[index] = \
+                        self.__run_tool_call_reporting_errors(tool_calls[index])
+            pending_reads.clear()
+
+        for index, tool in enumerate(tool_calls):
+            if BinnaAssistantDescription.is_read_only_tool(tool.function.name):
+                pending_reads.append(index)
+                continue
+
+            run_pending_reads()
+            tool_outputs[index], durations[index] = self.__run_tool_call_reporting_errors(tool)
+
+        run_pending_reads()
+
+        if len(tool_calls) > 1:
+            batch_elapsed = time.perf_counter() - batch_start
+            serial_elapsed = sum(durations)
+            print(
+                f"Tool batch (user_id: {self.user.id}): {len(tool_calls)} calls in "
+                f"{batch_elapsed:.3f}s ({serial_elapsed:.3f}s if run serially, "
+                f"{serial_elapsed - batch_elapsed:.3f}s saved)"
+            )
+
+        return list(zip(tool_outputs, durations))
+
+    def __make_batch_error_outputs(
+        self,
+        tool_calls,
+        tool_outputs: list[Optional[dict]],
+        failed_index: Optional[int],
+        error: Exception
+    ) -> list[dict]:
+        """
+        Outputs of a tool batch that was rolled back: the failed tool gets its error, the
+        mutating tools that were executed are reported as rolled back and the tools after the
+        failure as not executed
+        """
+        error_outputs = []
+        for index, tool in enumerate(tool_calls):
+            if index == failed_index:
+                message = "Error executing tool"
+            elif tool_outputs[index] is None:
+                message = "Not executed, another tool of the batch failed"
+            elif not BinnaAssistantDescription.is_read_only_tool(tool.function.name):
+                message = "Rolled back, another tool of the batch failed"
+            else:
+                error_outputs.append(tool_outputs[index])
+                continue
+
+            error_outputs.append(self.__make_tool_output(
+                tool_call_id=tool.id,
+                success=False,
+                function_name=tool.function.name,
+                message=message,
+                # A failed commit is the error of every mutating tool
+                **({"error": str(error)} if index == failed_index or failed_index is None else {})
+            ))
+        return error_outputs
+
+    def __run_unit_of_work(self, tool_calls, db: UnitOfWorkSession) -> list[tuple[dict, float]]:
+        """
+        Execute a batch with mutating tools in a single transaction: the tools run one by one
+        in the same session, their commits only flush, and the batch is committed once at the
+        end. If a tool fails, nothing of the batch is saved.
+        """
+        batch_start = time.perf_counter()
+        tool_outputs: list[Optional[dict]] = [None] * len(tool_calls)
+        durations = [0.0] * len(tool_calls)
+        failed_index = None
+        error = None
+
+        db.begin_unit_of_work()
+        try:
+            for index, tool in enumerate(tool_calls):
+                failed_index = index
+                tool_outputs[index], durations[index] = self.__run_tool_call(tool, db)
+            failed_index = None
+            db.end_unit_of_work(commit=True)
+        except Exception as batch_error:
+            error = batch_error
+            print(f"Tool batch rolled back (user_id: {self.user.id}): {batch_error!r}")
+            db.end_unit_of_work(commit=False)
+            # Cached reads of this batch may have seen the rolled back writes
+            if self.tool_cache is not None:
+                self.tool_cache.clear()
+
+        print(
+            f"Tool batch (user_id: {self.user.id}): {len(tool_calls)} calls in one transaction, "
+            f"{time.perf_counter() - batch_start:.3f}s"
+        )
+
+        if error is not None:
+            tool_outputs = self.__make_batch_error_outputs(
+                tool_calls, tool_outputs, failed_index, error
+            )
+        return list(zip(tool_outputs, durations))
+
 class EventHandler(AssistantEventHandler):
     tool_outputs = None
     executing_tool = False
+    run_usage: Optional[Usage] = None
+    required_tool_calls = []
 
-    def __init__(self, db: Session, user: User):
+    def __init__(
+        self,
+        db: Optional[Session],
+        user: User,
+        session_factory: Optional[SessionFactory] = None,
+        tool_cache: Optional[ToolResultCache] = None
+    ):
         self.db = db
         self.user = user
+        self.tool_runner = ToolCallRunner(
+            db, user, session_factory=session_factory, tool_cache=tool_cache
+        )
+        # Messages of the assistant completed in this stream, stored by the thread manager
+        self.completed_messages: list[Message] = []
         super().__init__()
 
+    def open_session(self):
+        return self.tool_runner.open_session()
+
     @override
     def on_text_created(self, text) -> None:
         print(f"\ngenerating new binna response ", end="", flush=True)
@@ -31,11 +411,15 @@ class EventHandler(AssistantEventHandler):
     @override
     def on_text_delta(self, delta, snapshot):
         print(delta.value, end="", flush=True)
-    
+
     @override
     def on_text_done(self, text: Text) -> None:
         print(f"\n\n")
 
+    @override
+    def on_message_done(self, message: Message) -> None:
+        self.completed_messages.append(message)
+
     def on_tool_call_created(self, tool_call):
         print(f"\nassistant > {tool_call.type}\n", flush=True)
 
@@ -61,86 +445,129 @@ class EventHandler(AssistantEventHandler):
         if event.event == "thread.run.requires_action":
             run_id = event.data.id
             self.handle_requires_action(event.data, run_id)
+        elif event.event in RUN_FINISHED_EVENTS and event.data.usage:
+            self.run_usage = event.data.usage
 
-    def __make_tool_output(
+    def handle_requires_action(self, data, run_id):
+        """
+        Handle the requires action event
+
+        Args:
+            data (_type_): _description_
+            run_id (_type_): _description_
+        """
+        self.executing_tool = True
+        self.required_tool_calls = data.required_action.submit_tool_outputs.tool_calls
+        self.tool_outputs = self.tool_runner.run_tool_calls(self.required_tool_calls)
+        self.executing_tool = False
+
+class AsyncEventHandler(AsyncAssistantEventHandler):
+    """
+    Async version of `EventHandler`, used with the `AsyncOpenAI` client.
+
+    Besides printing, the callbacks queue typed `ChatStreamEvent`s that the thread manager
+    collects with `pop_events` after each event of the stream. Tools aren't executed inside the
+    stream: `requires_action` only stores the tool calls, and `run_required_tools` executes them
+    in a worker thread once the stream has stopped.
+    """
+    tool_outputs = None
+    executing_tool = False
+    run_usage: Optional[Usage] = None
+
+    def __init__(
         self,
-        tool_call_id: str,
-        success: bool,
-        function_name: str,
-        message: str,
-        detail_list: Optional[list[DetailItem]] = None,
-        **kwargs
+        user: User,
+        session_factory: SessionFactory,
+        tool_cache: Optional[ToolResultCache] = None
     ):
         """
-        Create a tool output
-
         Args:
-            tool_call_id (str): id of the tool call. This id is used to identify the tool call
-            success (bool): a boolean value that indicates if the tool call was successful
-            function_name (str): the name of the function that was executed. Don't use code function name
-            message (str): a message that describes the result of the tool call
-            detail_list (Optional[list]): a list of dictionaries that contains the details of the tool call
+            user (User): user that owns the conversation
+            session_factory (SessionFactory): factory of the sessions used by the tools. A shared
+                session can't be used here because tools run outside the event loop thread.
+            tool_cache (Optional[ToolResultCache]): cache of read-only tool outputs shared by
+                the tool rounds of the run
+        """
+        self.db = None
+        self.user = user
+        self.tool_runner = ToolCallRunner(
+            None, user, session_factory=session_factory, tool_cache=tool_cache
+        )
+        self.required_tool_calls = []
+        self.pending_events: list[ChatStreamEvent] = []
+        # Messages of the assistant completed in this stream, stored by the thread manager
+        self.completed_messages: list[Message] = []
+        super().__init__()
 
-        Returns:
-            _type_: _description_
+    def open_session(self):
+        return self.tool_runner.open_session()
+
+    def pop_events(self) -> list[ChatStreamEvent]:
         """
-        output = {
-            success: success,
-            function_name: function_name,
-            message: message,
-        }
-        if detail_list:
-            output["detail_list"] = detail_list
-        output.update(kwargs) # type: ignore
+        Return and forget the events queued by the callbacks
+        """
+        events, self.pending_events = self.pending_events, []
+        return events
 
-        return {
-            "tool_call_id": tool_call_id,
-            "output": json.dumps(output, default=str)
-        }
-    
-    def handle_requires_action(self, data, run_id):
+    @override
+    async def on_text_created(self, text) -> None:
+        print(f"\ngenerating new binna response ", end="", flush=True)
+
+    @override
+    async def on_text_delta(self, delta, snapshot):
+        print(delta.value, end="", flush=True)
+        if delta.value:
+            self.pending_events.append(make_event(TEXT_DELTA, value=delta.value))
+
+    @override
+    async def on_text_done(self, text: Text) -> None:
+        print(f"\n\n")
+
+    @override
+    async def on_message_done(self, message: Message) -> None:
+        self.completed_messages.append(message)
+
+    @override
+    async def on_tool_call_created(self, tool_call):
+        print(f"\nassistant > {tool_call.type}\n", flush=True)
+
+    @override
+    async def on_event(self, event):
         """
-        Handle the requires action event
+        Retrieve events thats are denoted with 'requires_action'
+        since these will have our tool_calls
 
         Args:
-            data (_type_): _description_
-            run_id (_type_): _description_
+            event (_type_): _description_
         """
-        self.executing_tool = True
-        tool_outputs = []
-
-        for tool in data.required_action.submit_tool_outputs.tool_calls:
-            print(f"Tool call (user_id: {self.user.id}): {tool.function.name}")
+        if event.event == "thread.run.requires_action":
+            self.required_tool_calls = event.data.required_action.submit_tool_outputs.tool_calls
+        elif event.event in RUN_FINISHED_EVENTS and event.data.usage:
+            self.run_usage = event.data.usage
 
-        for tool in data.required_action.submit_tool_outputs.tool_calls:
-            arguments = json.loads(tool.function.arguments)
-            print(f"Arguments: {arguments}")
+    async def run_required_tools(self) -> AsyncIterator[ChatStreamEvent]:
+        """
+        Execute the tool calls requested by the run and store their outputs in `tool_outputs`
 
-            automatic_registered_tool_output = BinnaAssistantDescription.call_function_tool(
-                function_name=tool.function.name,
-                db=self.db,
-                user_id=self.user.id,
-                **arguments
-            )
-            tool_outputs.append(self.__make_tool_output(
-                tool_call_id=tool.id,
-                success=automatic_registered_tool_output is not None,
-                function_name=tool.function.name,
-                message="Successfully executed tool",
-                output=automatic_registered_tool_output
-            ))
+        Yields:
+            ChatStreamEvent: `tool.started` for every tool before running the batch, and
+            `tool.finished` with its duration once the batch is done
+        """
+        for tool in self.required_tool_calls:
+            yield make_event(TOOL_STARTED, tool_call_id=tool.id, name=tool.function.name)
 
-            # if tool.function.name == "get_saved_customers":
-            #     tool_outputs.append(self.__make_tool_output(
-            #         tool_call_id=tool.id,
-            #         success=True,
-            #         function_name="Obtener clientes",
-            #         message="Clientes recuperados exitosamente",
-            #         customers=['Cliente de prueba 1', 'Cliente de prueba 2']
-            #     ))
-            
-
-        self.tool_outputs = tool_outputs
+        self.executing_tool = True
+        timed_tool_outputs = await asyncio.to_thread(
+            self.tool_runner.run_tool_calls_timed,
+            self.required_tool_calls
+        )
         self.executing_tool = False
+        self.tool_outputs = [tool_output for tool_output, _ in timed_tool_outputs]
 
-        
\ No newline at end of file
+        for tool, (_, duration) in zip(self.required_tool_calls, timed_tool_outputs):
+            yield make_event(
+                TOOL_FINISHED,
+                tool_call_id=tool.id,
+                name=tool.function.name,
+                duration_ms=round(duration * 1000)
+            )
@@ -0,0 +1,416 @@
+from typing import Iterator, AsyncIterator, Optional
+from email.utils import parsedate_tz, mktime_tz
+import asyncio
+import random
+import threading
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from src.utils.settings import (
+    OPENAI_API_KEY, OPENAI_HTTP_MAX_CONNECTIONS, OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS, OPENAI_HTTP_CONNECT_TIMEOUT_SECONDS,
+    OPENAI_HTTP_READ_TIMEOUT_SECONDS, OPENAI_HTTP_MAX_RETRIES, OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS,
+    OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS, OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+    OPENAI_CIRCUIT_RESET_SECONDS
+)
+
+# Requests that can be sent again without side effects
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Statuses retried on idempotent requests. 429 is retried on any request: it was rejected
+# before being processed.
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+class OpenAIUnavailableException(Exception):
+    """
+    This error is triggered when the circuit breaker of OpenAI is open: the last requests to
+    OpenAI failed and new ones are rejected at once until `retry_after` seconds pass.
+    """
+    def __init__(self, retry_after: int):
+        super().__init__("OpenAI is unavailable")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Tracks the health of an upstream from the outcome of its requests.
+
+    After `failure_threshold` consecutive failures (connection errors, timeouts and 5xx
+    responses) the circuit opens and requests are rejected without reaching the upstream.
+    After `reset_seconds` a single request is let through to probe it: its success closes the
+    circuit and its failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def __probe_is_due(self, now: float) -> bool:
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_seconds
+        # A probe that never reported back doesn't keep the circuit half open forever
+        return self.probe_started_at is None or now - self.probe_started_at >= self.reset_seconds
+
+    def is_available(self) -> bool:
+        """
+        Whether a request would be let through now. Unlike `allow_request` it doesn't take the
+        probe of a half open circuit.
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self.lock:
+            return self.state == self.CLOSED or self.__probe_is_due(time.monotonic())
+
+    def allow_request(self) -> bool:
+        """
+        Whether a request can be sent to the upstream. Rejected requests are counted.
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.__probe_is_due(now):
+                self.state = self.HALF_OPEN
+                self.probe_started_at = now
+                return True
+
+            self.rejected_total += 1
+            return False
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the circuit lets a probe request through
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return 0
+            started_at = self.opened_at if self.state == self.OPEN else self.probe_started_at
+            return max(1, round(started_at + self.reset_seconds - time.monotonic()))
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.state == self.CLOSED:
+                    print(f"OpenAI circuit opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_started_at = None
+                self.opened_total += 1
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opened_total": self.opened_total,
+                "rejected_total": self.rejected_total,
+            }
+
+def is_retryable_error(request: httpx.Request, error: httpx.TransportError) -> bool:
+    # Nothing was sent when the connection couldn't be opened
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    return request.method in IDEMPOTENT_METHODS
+
+def is_retryable_response(request: httpx.Request, response: httpx.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    return request.method in IDEMPOTENT_METHODS and response.status_code in RETRYABLE_STATUSES
+
+def is_upstream_failure(error: httpx.TransportError) -> bool:
+    # A full local connection pool says nothing about the health of the upstream
+    return not isinstance(error, httpx.PoolTimeout)
+
+def get_retry_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Exponential backoff with full jitter, so the retries of many requests don't line up
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def get_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Seconds the upstream asked to wait before retrying, from the `retry-after-ms` or
+    `retry-after` (seconds or HTTP date) headers. None when it didn't send them.
+    """
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0)
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            retry_date = parsedate_tz(retry_after)
+            if retry_date is not None:
+                return max(mktime_tz(retry_date) - time.time(), 0)
+    return None
+
+def get_response_retry_delay(
+    response: Optional[httpx.Response],
+    attempt: int,
+    base_delay: float,
+    max_delay: float
+) -> float:
+    """
+    Delay before retrying a request: the wait asked by the response (like a 429 while rate
+    limited) capped to `max_delay`, or the jittered backoff when it didn't ask for one
+    """
+    retry_after = get_retry_after(response) if response is not None else None
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    return get_retry_delay(attempt, base_delay, max_delay)
+
+def make_unavailable_error(request: httpx.Request) -> httpx.ConnectError:
+    # The SDK turns it into an APIConnectionError, like an unreachable upstream
+    return httpx.ConnectError("OpenAI circuit breaker is open", request=request)
+
+class RecordedByteStream(httpx.SyncByteStream):
+    """
+    Response body that reports to the circuit breaker the errors raised while it is read
+    (like the read timeout of a stalled run stream)
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, circuit_breaker: CircuitBreaker):
+        self.stream = stream
+        self.circuit_breaker = circuit_breaker
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            yield from self.stream
+        except httpx.TransportError as error:
+            if is_upstream_failure(error):
+                self.circuit_breaker.record_failure()
+            raise
+
+    def close(self):
+        self.stream.close()
+
+class AsyncRecordedByteStream(httpx.AsyncByteStream):
+    """
+    Async version of `RecordedByteStream`
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, circuit_breaker: CircuitBreaker):
+        self.stream = stream
+        self.circuit_breaker = circuit_breaker
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        except httpx.TransportError as error:
+            if is_upstream_failure(error):
+                self.circuit_breaker.record_failure()
+            raise
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    Pooled transport that retries failed requests with jittered exponential backoff, or after
+    the wait asked by the `Retry-After` headers (only the requests that are safe to send again,
+    see `is_retryable_error` and `is_retryable_response`) and reports every outcome to the circuit breaker, rejecting
+    requests at once while it is open.
+    """
+
+    def __init__(
+        self,
+        circuit_breaker: CircuitBreaker,
+        limits: httpx.Limits,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float
+    ):
+        self.transport = httpx.HTTPTransport(limits=limits)
+        self.circuit_breaker = circuit_breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise make_unavailable_error(request)
+
+            response = None
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as error:
+                if is_upstream_failure(error):
+                    self.circuit_breaker.record_failure()
+                if attempt >= self.max_retries or not is_retryable_error(request, error):
+                    raise
+            else:
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if attempt >= self.max_retries or not is_retryable_response(request, response):
+                    response.stream = RecordedByteStream(response.stream, self.circuit_breaker)
+                    return response
+                response.close()
+
+            time.sleep(get_response_retry_delay(
+                response, attempt, self.base_delay, self.max_delay
+            ))
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of `RetryTransport`
+    """
+
+    def __init__(
+        self,
+        circuit_breaker: CircuitBreaker,
+        limits: httpx.Limits,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float
+    ):
+        self.transport = httpx.AsyncHTTPTransport(limits=limits)
+        self.circuit_breaker = circuit_breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise make_unavailable_error(request)
+
+            response = None
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as error:
+                if is_upstream_failure(error):
+                    self.circuit_breaker.record_failure()
+                if attempt >= self.max_retries or not is_retryable_error(request, error):
+                    raise
+            else:
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if attempt >= self.max_retries or not is_retryable_response(request, response):
+                    response.stream = AsyncRecordedByteStream(response.stream, self.circuit_breaker)
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(get_response_retry_delay(
+                response, attempt, self.base_delay, self.max_delay
+            ))
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+# Shared by the sync and async clients: both talk to the same upstream
+openai_circuit_breaker = CircuitBreaker(
+    failure_threshold=OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds=OPENAI_CIRCUIT_RESET_SECONDS
+)
+
+default_limits = httpx.Limits(
+    max_connections=OPENAI_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS
+)
+# The read timeout is the max time between two chunks of a response, not its total time
+default_timeout = httpx.Timeout(
+    OPENAI_HTTP_READ_TIMEOUT_SECONDS, connect=OPENAI_HTTP_CONNECT_TIMEOUT_SECONDS
+)
+
+def make_openai_client(
+    circuit_breaker: CircuitBreaker = openai_circuit_breaker,
+    timeout: httpx.Timeout = default_timeout,
+    max_retries: int = OPENAI_HTTP_MAX_RETRIES,
+    base_url: Optional[str] = None
+) -> OpenAI:
+    """
+    OpenAI client with a tuned connection pool, timeouts, retries and the circuit breaker.
+    The retries of the SDK are disabled, the transport does them.
+
+    Args:
+        circuit_breaker (CircuitBreaker): breaker of the upstream
+        timeout (httpx.Timeout): connect and read timeouts
+        max_retries (int): retries of a failed request that is safe to send again
+        base_url (Optional[str]): API url, by default the one of the SDK (OPENAI_BASE_URL)
+    """
+    transport = RetryTransport(
+        circuit_breaker,
+        default_limits,
+        max_retries,
+        OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS,
+        OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS
+    )
+    return OpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=0,
+        http_client=DefaultHttpxClient(transport=transport, timeout=timeout)
+    )
+
+def make_async_openai_client(
+    circuit_breaker: CircuitBreaker = openai_circuit_breaker,
+    timeout: httpx.Timeout = default_timeout,
+    max_retries: int = OPENAI_HTTP_MAX_RETRIES,
+    base_url: Optional[str] = None
+) -> AsyncOpenAI:
+    """
+    Async version of `make_openai_client`
+    """
+    transport = AsyncRetryTransport(
+        circuit_breaker,
+        default_limits,
+        max_retries,
+        OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS,
+        OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS
+    )
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(transport=transport, timeout=timeout)
+    )
+
+def ensure_openai_available():
+    """
+    Raises:
+        OpenAIUnavailableException: the circuit breaker of OpenAI is open
+    """
+    if not openai_circuit_breaker.is_available():
+        raise OpenAIUnavailableException(openai_circuit_breaker.retry_after())
@@ -0,0 +1 @@
+from src.domains.openai_integration.models.assistant_config import AssistantConfig
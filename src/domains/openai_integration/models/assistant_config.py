@@ -0,0 +1,14 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+class AssistantConfig(SQLModel, table=True):
+    """
+    Hash of the configuration last synced to an OpenAI assistant. The remote assistant is only
+    retrieved and updated when the local configuration doesn't match this hash.
+    """
+    __tablename__ = "assistant_config"
+
+    id: int = Field(default=None, primary_key=True)
+    assistant_id: str = Field(index=True, unique=True)
+    config_hash: str
+    synced_at: datetime = Field(default_factory=datetime.now)
@@ -1,5 +1,7 @@
 import inspect
-from typing import List, get_origin, get_args, Union
+from datetime import datetime
+from typing import Annotated, Any, List, Optional, get_origin, get_args, Union
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError, create_model
 from src.domains.openai_integration import IgnoreMe, DateTimeStringClass
 from src.domains.customer.controllers.additional_note_controller import AdditionalNoteController
 from src.domains.customer.controllers.establishment_controller import EstablishmentController
@@ -8,9 +10,9 @@ from src.domains.customer.controllers.task_controller import TaskController
 from src.domains.customer.controllers.opportunity_controller import OpportunityController
 from src.domains.customer.controllers.meet_controller import MeetController
 from src.domains.auth.controllers.user_controller import UserController
+from src.domains.chat.controllers.chat_message_controller import ChatMessageController
 from openai.types.beta.assistant_tool_param import AssistantToolParam
 from openai.types.beta.function_tool_param import FunctionToolParam
-from openai.types.beta.assistant import Assistant
 from openai.types.chat_model import ChatModel
 import json
 
@@ -49,6 +51,30 @@ def check_is_datetime_string(field):
     return get_origin(field) is Union and \
         DateTimeStringClass in get_args(field)
 
+def check_is_list(field):
+    return get_origin(field) is list
+
+def parse_datetime_argument(value: Any) -> str:
+    """
+    Check that a `DateTimeString` argument is an ISO 8601 date and normalize it. The tools
+    receive it as a string.
+    """
+    if not isinstance(value, str):
+        raise ValueError("Debe ser una fecha en formato ISO 8601")
+    return datetime.fromisoformat(value).isoformat()
+
+DateTimeArgument = Annotated[str, BeforeValidator(parse_datetime_argument)]
+
+class ToolArgumentsException(Exception):
+    """
+    This error is triggered when the assistant calls a tool that doesn't exist or with
+    arguments that don't match its parameters
+    """
+    def __init__(self, function_name: str, errors: list[dict]):
+        super().__init__(f"Invalid call to {function_name}: {errors}")
+        self.function_name = function_name
+        self.errors = errors
+
 
 class FunctionParser:
     """
@@ -68,11 +94,25 @@ class FunctionParser:
         }
 
 
+        # Parameters filled by the caller (Ignored) and python types of the tool arguments
+        self.context_parameters = []
+        self.argument_types = {}
+
         self.strict_mode = True
         required_properties = []
         for param_name, param_type in annotations.items():
             if param_name == "return":
                 continue
+
+            if DateTimeStringClass in get_args(param_type):
+                argument_type = DateTimeArgument
+            elif check_is_optional(param_type):
+                argument_type = get_args(param_type)[0]
+            else:
+                argument_type = param_type
+            self.argument_types[param_name] = (
+                Optional[argument_type] if check_is_optional(param_type) else argument_type
+            )
             
             # Si es un Optional, entonces no es requerido
             is_optional = False
@@ -83,10 +123,20 @@ class FunctionParser:
                 param_type_name = get_args(param_type)[0].__name__
                 param_type = get_args(param_type)[0]
             elif check_is_ignored(param_type):
+                del self.argument_types[param_name]
+                self.context_parameters.append(param_name)
                 continue
             elif check_is_datetime_string(param_type):
                 param_type_name = "datetime"
 
+            elif check_is_list(param_type):
+                self.function_parameters['properties'][param_name] = {
+                    **self.__get_array_schema(param_type),
+                    "description": parsed_docstring["args"].get(param_name, ""),
+                }
+                required_properties.append(param_name)
+                continue
+
             elif not isinstance(param_type, type):
                 raise ValueError(
                     f"Invalid type for parameter {param_name} in function {self.function_name}"
@@ -111,6 +161,47 @@ class FunctionParser:
         if self.strict_mode:
             self.function_parameters["additionalProperties"] = False          
     
+    def __get_array_schema(self, param_type) -> dict:
+        """
+        JSON schema of a list parameter. The items can be scalars or pydantic models (objects,
+        their fields are described with `Field(description=...)`)
+        """
+        item_type = get_args(param_type)[0]
+
+        if not (isinstance(item_type, type) and issubclass(item_type, BaseModel)):
+            return {"type": "array", "items": {"type": type_parser_map[item_type.__name__]}}
+
+        properties = {}
+        required_properties = []
+        for field_name, field_info in item_type.model_fields.items():
+            field_type = field_info.annotation
+            if check_is_optional(field_type):
+                field_type = get_args(field_type)[0]
+                # Strict mode needs every property of the objects to be required
+                self.strict_mode = False
+            if field_info.is_required():
+                required_properties.append(field_name)
+
+            properties[field_name] = {
+                "type": type_parser_map[field_type.__name__],
+                "description": field_info.description or "",
+            }
+            if type_regex_map.get(field_type.__name__):
+                properties[field_name]["pattern"] = type_regex_map[field_type.__name__]
+
+        if len(required_properties) < len(properties):
+            self.strict_mode = False
+
+        return {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": properties,
+                "required": required_properties,
+                "additionalProperties": False,
+            },
+        }
+
     def __get_function_description(self):
 
         return {
@@ -167,17 +258,76 @@ class FunctionParser:
             "type": "function",
             "function": self.__get_function_description(),
         }
-    
+
+
+class ToolDispatchEntry:
+    """
+    Precompiled call to a tool, built once from the `FunctionParser` metadata: the context
+    parameters the function accepts and a pydantic validator of its arguments, which drops
+    unknown arguments and coerces the values to the annotated types (numbers sent as strings,
+    ISO dates, etc.).
+    """
+
+    def __init__(self, function, parser: FunctionParser):
+        self.function = function
+        self.function_name = parser.function_name
+        self.context_parameters = frozenset(parser.context_parameters)
+
+        signature = inspect.signature(function)
+        fields = {}
+        for param_name, argument_type in parser.argument_types.items():
+            default = signature.parameters[param_name].default
+            fields[param_name] = (
+                argument_type, ... if default is inspect.Parameter.empty else default
+            )
+
+        self.arguments_model = create_model(
+            f"{self.function_name}_arguments",
+            __config__=ConfigDict(extra="ignore"),
+            **fields
+        )
+
+    def validate(self, arguments: dict) -> dict:
+        """
+        Validate and coerce the arguments sent by the assistant
+
+        Raises:
+            ToolArgumentsException: the arguments don't match the parameters of the tool
+        """
+        try:
+            validated_arguments = self.arguments_model.model_validate(arguments)
+        except ValidationError as error:
+            raise ToolArgumentsException(self.function_name, [
+                {"field": ".".join(str(loc) for loc in detail["loc"]), "message": detail["msg"]}
+                for detail in error.errors(include_url=False)
+            ])
+        # Not dumped, so the items of list parameters keep their model type
+        return {
+            name: getattr(validated_arguments, name)
+            for name in validated_arguments.model_fields_set
+        }
+
+    def call(self, arguments: dict, **context):
+        """
+        Call the tool with validated arguments and the context parameters it accepts
+        """
+        context_arguments = {
+            name: value for name, value in context.items() if name in self.context_parameters
+        }
+        return self.function(**context_arguments, **arguments)
+
 
 # Map the function names to the actual functions
 function_name_map = {
     # Customer Establishment methods
     "create_customer": EstablishmentController.create_customer,
+    "create_customers": EstablishmentController.create_customers,
     "get_all_customer": EstablishmentController.get_all_customer,
     "get_customer_by_id": EstablishmentController.get_customer_by_id,
     "update_customer": EstablishmentController.update_customer,
     "delete_customer": EstablishmentController.delete_customer,
     "get_customer_by_name": EstablishmentController.get_customer_by_name,   
+    "get_customer_overview": EstablishmentController.get_customer_overview,
 
     # Additional Note methods
     "create_additional_note": AdditionalNoteController.create_additional_note,
@@ -189,6 +339,7 @@ function_name_map = {
 
     # Contact methods
     "create_contact": ContactController.create_contact,
+    "create_contacts": ContactController.create_contacts,
     "get_all_contacts": ContactController.get_all_contacts,
     "get_contact": ContactController.get_contact,
     "update_contact": ContactController.update_contact,
@@ -203,6 +354,7 @@ function_name_map = {
 
     # Task methods
     "create_task": TaskController.create_task,
+    "create_tasks": TaskController.create_tasks,
     "get_all_tasks": TaskController.get_all_tasks,
     "update_task": TaskController.update_task,
     "delete_task": TaskController.delete_task,
@@ -217,11 +369,44 @@ function_name_map = {
     # User methods
     "get_user_profile": UserController.get_user_profile,
     "update_user_profile": UserController.update_user_profile,
+
+    # Chat history methods
+    "search_chat_history": ChatMessageController.search_chat_history,
+}
+
+# Tools that only read data. They can run concurrently within the same tool batch.
+read_only_function_names = {
+    function_name for function_name in function_name_map
+    if function_name.startswith(("get_", "search_"))
 }
 
+# Entity type touched by each tool, named after the controller that implements it
+function_entity_map = {
+    function_name: function.__qualname__.split(".")[0]
+    for function_name, function in function_name_map.items()
+}
+
+# Entity types read by each tool. Tools that return related entities read several of them.
+function_read_entities_map = {
+    function_name: frozenset({entity}) for function_name, entity in function_entity_map.items()
+}
+function_read_entities_map["get_customer_overview"] = frozenset({
+    "EstablishmentController", "ContactController", "TaskController", "MeetController",
+    "OpportunityController", "AdditionalNoteController",
+})
+
 # Functions to be used as tools
 # DocStrings are used to generate the description of the tool.
-functions = [ FunctionParser(func).as_tool_param() for func in function_name_map.values() ]
+function_parsers = {
+    function_name: FunctionParser(func) for function_name, func in function_name_map.items()
+}
+functions = [ parser.as_tool_param() for parser in function_parsers.values() ]
+
+# Dispatch entries of the tools, so calls don't inspect the functions again
+tool_dispatch_table = {
+    function_name: ToolDispatchEntry(function_name_map[function_name], parser)
+    for function_name, parser in function_parsers.items()
+}
 
 
 class BinnaAssistantDescription:
@@ -233,54 +418,48 @@ class BinnaAssistantDescription:
     temperature = 1
 
     @classmethod
-    def is_equal(cls, assistant: Assistant):
-        is_same_model = assistant.model == cls.model
-        is_same_name = assistant.name == cls.name
-        is_same_description = assistant.description == cls.description
-        is_same_instructions = assistant.instructions == cls.instructions
-
-        assistant_tools_as_dicts = []
-        for tool in assistant.tools:
-            if tool.type == "function":
-                assistant_tools_as_dicts.append({
-                    "type": tool.type,
-                    "function": tool.function.to_dict()
-                })
-            else:
-                raise NotImplementedError(f"Unknown tool type: {tool.type}")
-
-        is_same_tools = json.dumps(
-            assistant_tools_as_dicts,
-            sort_keys=True
-        ) == json.dumps(
-            cls.tools,
-            sort_keys=True
-        )
-
-        comparison_results = {
-            "is_same_model": is_same_model,
-            "is_same_name": is_same_name,
-            "is_same_description": is_same_description,
-            "is_same_instructions": is_same_instructions,
-            "is_same_tools": is_same_tools
-        }
-
-        for key, value in comparison_results.items():
-            if not value:
-                print(f"{key}: {value}")
+    def is_read_only_tool(cls, function_name: str) -> bool:
+        return function_name in read_only_function_names
 
-        return all(comparison_results.values())
+    @classmethod
+    def get_tool_entity(cls, function_name: str) -> str:
+        return function_entity_map[function_name]
 
     @classmethod
-    def call_function_tool(cls, function_name: str, **kwargs):
-        if function_name in function_name_map:
-            function_to_call = function_name_map[function_name]
-            
-            signature = inspect.signature(function_to_call)
-            expected_params = signature.parameters.keys()
+    def get_tool_read_entities(cls, function_name: str) -> frozenset[str]:
+        return function_read_entities_map[function_name]
 
-            filtered_args = {k: v for k, v in kwargs.items() if k in expected_params}
+    @classmethod
+    def parse_tool_arguments(cls, function_name: str, raw_arguments: str) -> dict:
+        """
+        Parse the JSON arguments of a tool call and validate them
+
+        Raises:
+            ToolArgumentsException: unknown tool, malformed JSON or invalid arguments
+        """
+        dispatch_entry = tool_dispatch_table.get(function_name)
+        if dispatch_entry is None:
+            raise ToolArgumentsException(function_name, [
+                {"field": None, "message": f"La herramienta {function_name} no existe"}
+            ])
+
+        try:
+            arguments = json.loads(raw_arguments or "{}")
+        except json.JSONDecodeError as error:
+            raise ToolArgumentsException(function_name, [
+                {"field": None, "message": f"Los argumentos no son un JSON válido: {error}"}
+            ])
+
+        if not isinstance(arguments, dict):
+            raise ToolArgumentsException(function_name, [
+                {"field": None, "message": "Los argumentos deben ser un objeto JSON"}
+            ])
+
+        return dispatch_entry.validate(arguments)
 
-            return function_to_call(**filtered_args)
-        else:
-            raise ValueError(f"Function {function_name} not found in tools")
+    @classmethod
+    def dispatch_tool(cls, function_name: str, arguments: dict, **context):
+        """
+        Call a tool with arguments already validated by `parse_tool_arguments`
+        """
+        return tool_dispatch_table[function_name].call(arguments, **context)
@@ -1,29 +1,17 @@
-from openai import OpenAI
-from src.utils.settings import OPENAI_API_KEY, OPENAI_ASSISTANT_KEY
+from src.domains.openai_integration.http_client import (
+    make_openai_client, make_async_openai_client
+)
+from src.utils.settings import OPENAI_ASSISTANT_KEY
 
-# Create an instance of the OpenAI class
-openai = OpenAI(api_key=OPENAI_API_KEY)
-
-from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+# Create an instance of the OpenAI class (tuned pool, timeouts, retries and circuit breaker)
+openai = make_openai_client()
+# Async client used by the chat streaming path, so open streams don't hold worker threads
+async_openai = make_async_openai_client()
 
 if not OPENAI_ASSISTANT_KEY:
     # Print an error message
     print("OPENAI_ASSISTANT_KEY is not set")
     raise Exception("OPENAI_ASSISTANT_KEY is not set")
-else:
-    # Retrieve the assistant
-    assistant = openai.beta.assistants.retrieve(OPENAI_ASSISTANT_KEY)
-
-    if not BinnaAssistantDescription.is_equal(assistant):
-        print("Binna Config is not equal. Updating Binna assistant config")
-        my_updated_assistant = openai.beta.assistants.update(
-            OPENAI_ASSISTANT_KEY,
-            description=BinnaAssistantDescription.description,
-            name=BinnaAssistantDescription.name,
 
-            instructions=BinnaAssistantDescription.instructions,
-            model=BinnaAssistantDescription.model,
-            tools=BinnaAssistantDescription.tools,
-            temperature=BinnaAssistantDescription.temperature
-        )
-        assistant = my_updated_assistant
\ No newline at end of file
+# The remote assistant config is synced at startup, see assistant_sync.py
+assistant_id = OPENAI_ASSISTANT_KEY
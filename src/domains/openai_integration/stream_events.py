@@ -0,0 +1,26 @@
+from typing import Any, AsyncIterator, TypedDict
+from contextlib import aclosing
+
+# Typed events of a chat turn, produced by the async event handler and the thread manager
+TEXT_DELTA = "text.delta"
+TOOL_STARTED = "tool.started"
+TOOL_FINISHED = "tool.finished"
+USAGE = "usage"
+ERROR = "error"
+DONE = "done"
+# First event sent when a client reattaches to a run, see ChatRunTracker
+RESUMED = "resumed"
+
+ChatStreamEvent = TypedDict("ChatStreamEvent", {"event": str, "data": dict[str, Any]})
+
+def make_event(event: str, **data) -> ChatStreamEvent:
+    return {"event": event, "data": data}
+
+async def text_deltas(events: AsyncIterator[ChatStreamEvent]) -> AsyncIterator[str]:
+    """
+    Keep only the text of the `text.delta` events
+    """
+    async with aclosing(events):
+        async for chat_event in events:
+            if chat_event["event"] == TEXT_DELTA:
+                yield chat_event["data"]["value"]
@@ -1,60 +1,421 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from sqlmodel import Session
 from src.domains.auth.models.user import User
 from src.domains.auth.models.user_usage import UserUsage
-from src.domains.openai_integration.openai_integration import openai, assistant
-from src.domains.openai_integration.event_handler import EventHandler
+from src.domains.openai_integration.openai_integration import openai, async_openai, assistant_id
+from src.domains.openai_integration.event_handler import (
+    EventHandler, AsyncEventHandler, SessionFactory, open_session
+)
+from src.domains.openai_integration.tool_cache import ToolResultCache
+from src.domains.openai_integration.thread_summary import (
+    summarize_messages, SUMMARY_MAX_MESSAGES
+)
+from src.domains.openai_integration.stream_events import (
+    ChatStreamEvent, make_event, text_deltas, USAGE, DONE
+)
+from openai import APIError, NotFoundError
+from anyio import CancelScope
+from contextlib import aclosing
 from openai.types.beta.threads.run import Usage
+from openai.types.completion_usage import CompletionUsage
+from src.domains.chat.controllers.chat_thread_controller import (
+    ChatThreadController, ThreadNotFoundException
+)
+from src.domains.chat.controllers.chat_message_controller import ChatMessageController
+from src.domains.chat.models.chat_message import ChatMessagePage
+from openai.types.beta.threads import Message
+from src.domains.openai_integration.tool_selection import (
+    ToolSelection, select_tool_groups, get_tool_groups, recent_tool_groups
+)
+from src.utils.settings import (
+    TOOL_CACHE_MAX_ENTRIES, TOOL_SUBSETTING_ENABLED, CHAT_CONTEXT_TIME_RESOLUTION_MINUTES,
+    CHAT_CONTEXT_LAST_MESSAGES, CHAT_CONTEXT_SUMMARY_INTERVAL
+)
 from datetime import datetime
+import asyncio
 import json
 
+# Key of the thread metadata where the id of its owner is stored
+THREAD_OWNER_METADATA_KEY = "user_id"
+
+# Summaries being refreshed in the background, by thread id
+context_summary_tasks: dict[str, asyncio.Task] = {}
+
+def get_cached_tokens(usage: Usage) -> int:
+    """
+    Prompt tokens of a run served from the provider prompt cache. The SDK model doesn't
+    declare the token details, they come as an extra field of the usage.
+    """
+    usage_data = usage.model_dump()
+    token_details = (
+        usage_data.get("prompt_token_details") or usage_data.get("prompt_tokens_details") or {}
+    )
+    return token_details.get("cached_tokens") or 0
+
 class ThreadManager:
 
-    def __init__(self, thread_id: Optional[str], db: Session, user: User):
+    def __init__(
+        self,
+        thread_id: Optional[str],
+        db: Optional[Session],
+        user: User,
+        session_factory: Optional[SessionFactory] = None
+    ):
+        self.db = db
+        self.user = user
+        self.session_factory = session_factory
+        # Usage of the current run, taken from the event that finishes it
+        self.run_usage: Optional[Usage] = None
+        # Handler of the stream in progress, it knows the active run
+        self.event_handler: Optional[AsyncEventHandler] = None
+        # Read-only tool outputs of the current run, shared by its tool rounds
+        self.tool_cache = ToolResultCache(TOOL_CACHE_MAX_ENTRIES)
+        # Tools sent with the current run, the groups its message asked for, the tools it
+        # called and the number of model calls it made (one per tool round plus one)
+        self.tool_selection: Optional[ToolSelection] = None
+        self.message_tool_groups: set[str] = set()
+        self.used_tool_names: set[str] = set()
+        self.model_calls = 0
+        # Messages of the current turn, stored locally when it ends
+        self.input_message: Optional[str] = None
+        self.input_message_created_at = datetime.now()
+        self.run_messages: list[Message] = []
+        # Rolling summary sent with the run, messages stored in the thread before the turn (all
+        # of them and the ones the summary doesn't cover yet) and the usage saved for the turn
+        # (the tokens of the summary are added to it)
+        self.context_summary: Optional[str] = None
+        self.thread_messages = 0
+        self.unsummarized_messages = 0
+        self.usage_id: Optional[int] = None
+
         if thread_id:
-            print("Retrieving existing thread", thread_id)
-            self.thread = openai.beta.threads.retrieve(thread_id)
+            self.thread_id = self.__get_user_thread_id(thread_id)
         else:
             print("Creating new thread")
-            self.thread = openai.beta.threads.create()
+            self.thread_id = openai.beta.threads.create(
+                metadata={THREAD_OWNER_METADATA_KEY: str(self.user.id)}
+            ).id
+            with open_session(self.db, self.session_factory) as db:
+                ChatThreadController.register_thread(db, self.user.id, self.thread_id)
 
-        self.db = db
-        self.user = user
+    def __get_user_thread_id(self, thread_id: str) -> str:
+        """
+        Check that the thread belongs to the user using the local registry. OpenAI is only
+        queried for threads that aren't registered yet, which are registered as owned by the
+        user only if their metadata names the user as the owner.
+
+        Raises:
+            ThreadNotFoundException: the thread doesn't exist or belongs to another user
+        """
+        with open_session(self.db, self.session_factory) as db:
+            chat_thread = ChatThreadController.get_thread(db, thread_id)
+            owner_id = chat_thread.user_id if chat_thread else None
+
+        if owner_id is not None:
+            if owner_id != self.user.id:
+                raise ThreadNotFoundException()
+            return thread_id
 
-    def retrieve_messages(self):
+        # No session is held during the OpenAI request
+        print("Retrieving unregistered thread", thread_id)
+        try:
+            thread = openai.beta.threads.retrieve(thread_id)
+        except NotFoundError:
+            raise ThreadNotFoundException()
+
+        # Knowing the id of a thread doesn't make it yours
+        owner_id = (thread.metadata or {}).get(THREAD_OWNER_METADATA_KEY)
+        if owner_id != str(self.user.id):
+            print(f"Unregistered thread {thread_id} isn't owned by user {self.user.id}")
+            raise ThreadNotFoundException()
+
+        with open_session(self.db, self.session_factory) as db:
+            # Its messages are copied from OpenAI the first time the thread is read
+            ChatThreadController.register_thread(db, self.user.id, thread_id, is_new=False)
+        return thread_id
+
+    @property
+    def current_run_id(self) -> Optional[str]:
         """
-        Retrieve the messages of the assistant
+        ID of the run being streamed (or the last one streamed) by this manager
         """
-        messages = openai.beta.threads.messages.list(thread_id=self.thread.id)
-        return messages
+        run = self.event_handler.current_run if self.event_handler else None
+        return run.id if run else None
 
-    def stream_response(self, input_message: Optional[str] = None, tool_outputs: list[dict] = []):
+    def make_event_handler(self) -> EventHandler:
+        return EventHandler(
+            self.db,
+            self.user,
+            session_factory=self.session_factory,
+            tool_cache=self.tool_cache
+        )
+
+    def make_async_event_handler(self) -> AsyncEventHandler:
+        if self.session_factory is None:
+            raise ValueError("The async streaming path requires a session factory")
+        return AsyncEventHandler(self.user, self.session_factory, tool_cache=self.tool_cache)
+
+    def start_run(self, input_message: Optional[str] = None):
         """
-        Stream the response of the assistant
+        Reset the state kept for a run (tool cache, tool selection, counters and messages)
+        """
+        self.tool_cache = ToolResultCache(TOOL_CACHE_MAX_ENTRIES)
+        self.tool_selection = None
+        self.message_tool_groups = set()
+        self.used_tool_names = set()
+        self.model_calls = 0
+        self.input_message = input_message
+        self.input_message_created_at = datetime.now()
+        self.run_messages = []
+        self.usage_id = None
+
+    def finish_run(self):
+        """
+        Remember the tool groups of the run for the next turns and print its tool stats
+        """
+        recent_tool_groups.record(
+            self.thread_id, self.message_tool_groups | get_tool_groups(self.used_tool_names)
+        )
+
+        if self.tool_cache.hits or self.tool_cache.misses:
+            print(
+                f"Tool cache (user_id: {self.user.id}): {self.tool_cache.hits} hits, "
+                f"{self.tool_cache.misses} misses, {self.tool_cache.invalidations} invalidations"
+            )
+
+    @property
+    def saved_prompt_tokens(self) -> int:
+        """
+        Estimated prompt tokens saved in the run by not sending every tool. Tools are part of
+        the prompt of every model call of the run.
+        """
+        if self.tool_selection is None:
+            return 0
+        return self.tool_selection.saved_tokens_per_call * max(self.model_calls, 1)
+
+    def select_tools(self, input_message: str, context: dict) -> ToolSelection:
+        """
+        Choose the tools sent with the run: the groups the message asks for and the groups
+        used in the last turns of the thread
+        """
+        self.message_tool_groups = select_tool_groups(input_message, context)
+        self.tool_selection = ToolSelection(
+            self.message_tool_groups | recent_tool_groups.get(self.thread_id)
+        )
+        print(
+            f"Tool groups (user_id: {self.user.id}): {sorted(self.tool_selection.groups)}, "
+            f"~{self.tool_selection.saved_tokens_per_call} prompt tokens saved per call"
+        )
+        return self.tool_selection
+
+    def retrieve_messages(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None
+    ) -> ChatMessagePage:
+        """
+        Retrieve the messages of the thread from the local copy, newest first. Threads created
+        before the messages were stored locally are copied from OpenAI the first time.
+
+        Args:
+            limit (Optional[int]): max number of messages
+            cursor (Optional[int]): `next_cursor` of the previous page, to get older messages
+        """
+        self.backfill_messages()
+        with open_session(self.db, self.session_factory) as db:
+            return ChatMessageController.get_messages(db, self.thread_id, limit, cursor)
+
+    def backfill_messages(self) -> bool:
+        """
+        Copy the messages of the thread from OpenAI if it was created before the messages were
+        stored locally. They are listed with no DB session open.
+
+        Returns:
+            bool: the messages were copied in this call
+        """
+        with open_session(self.db, self.session_factory) as db:
+            chat_thread = ChatThreadController.get_thread(db, self.thread_id)
+            is_synced = chat_thread is None or chat_thread.messages_synced_at is not None
+        if is_synced:
+            return False
+
+        print(f"Backfilling messages of thread {self.thread_id}")
+        # The page iterator requests the next pages as needed
+        messages = list(openai.beta.threads.messages.list(
+            thread_id=self.thread_id, order="asc", limit=100
+        ))
+
+        with open_session(self.db, self.session_factory) as db:
+            return ChatMessageController.save_backfilled_messages(db, self.thread_id, messages)
+
+    def save_messages(self):
+        """
+        Store the messages of the turn in the local copy of the thread
+        """
+        try:
+            # The copy of an old thread already has the messages of this turn
+            if self.backfill_messages():
+                return
+            with open_session(self.db, self.session_factory) as db:
+                ChatMessageController.save_turn(
+                    db,
+                    self.thread_id,
+                    self.input_message,
+                    self.input_message_created_at,
+                    self.run_messages
+                )
+        except Exception as error:
+            # The answer was already streamed, a failed copy mustn't break the turn
+            print(f"Could not store the messages of thread {self.thread_id}: {error!r}")
+
+    @property
+    def context_messages(self) -> int:
+        """
+        Messages of the thread the run can read, the new message included
+        """
+        new_messages = 1 if self.input_message else 0
+        if not CHAT_CONTEXT_LAST_MESSAGES:
+            return self.thread_messages + new_messages
+        if not CHAT_CONTEXT_SUMMARY_INTERVAL:
+            return min(self.thread_messages + new_messages, CHAT_CONTEXT_LAST_MESSAGES)
+
+        # Every message after the summary is read, so none is left out of both. The window
+        # only moves when the summary is refreshed, which keeps the prompt prefix cacheable.
+        return max(min(
+            self.unsummarized_messages + new_messages,
+            CHAT_CONTEXT_LAST_MESSAGES + CHAT_CONTEXT_SUMMARY_INTERVAL
+        ), 1)
+
+    def load_thread_context(self):
+        """
+        Read the rolling summary of the thread and the number of messages stored in it, in
+        total and after the last summarized message
+        """
+        with open_session(self.db, self.session_factory) as db:
+            chat_thread = ChatThreadController.get_thread(db, self.thread_id)
+            self.context_summary = chat_thread.context_summary if chat_thread else None
+            self.thread_messages = ChatMessageController.count_messages(db, self.thread_id)
+            summary_until_id = chat_thread.context_summary_until_id if chat_thread else None
+            self.unsummarized_messages = (
+                ChatMessageController.count_messages(db, self.thread_id, summary_until_id)
+                if summary_until_id is not None else self.thread_messages
+            )
+
+    def update_context_summary(self, usage_id: Optional[int] = None):
+        """
+        Refresh the rolling summary of the thread once CHAT_CONTEXT_SUMMARY_INTERVAL messages
+        were left out of the context of the runs since the last summary. The summary request
+        is made with no DB session open.
+
+        Args:
+            usage_id (Optional[int]): usage of the turn, the tokens of the summary are added to it
+        """
+        if not CHAT_CONTEXT_LAST_MESSAGES or not CHAT_CONTEXT_SUMMARY_INTERVAL:
+            return
+
+        try:
+            with open_session(self.db, self.session_factory) as db:
+                chat_thread = ChatThreadController.get_thread(db, self.thread_id)
+                previous_summary = chat_thread.context_summary
+                # The next run reads its new message and the last stored messages
+                messages = ChatMessageController.get_messages_outside_context(
+                    db,
+                    self.thread_id,
+                    CHAT_CONTEXT_LAST_MESSAGES - 1,
+                    chat_thread.context_summary_until_id
+                )
+            if len(messages) < CHAT_CONTEXT_SUMMARY_INTERVAL:
+                return
+            messages = messages[:SUMMARY_MAX_MESSAGES]
+
+            summary, summary_usage = summarize_messages(previous_summary, messages)
+
+            with open_session(self.db, self.session_factory) as db:
+                chat_thread = ChatThreadController.get_thread(db, self.thread_id)
+                ChatThreadController.save_context_summary(
+                    db, chat_thread, summary, messages[-1].id
+                )
+            print(f"Summarized {len(messages)} messages of thread {self.thread_id}")
+        except Exception as error:
+            # The runs keep the previous summary, it is refreshed again on the next turn
+            print(f"Could not summarize thread {self.thread_id}: {error!r}")
+            return
+
+        if summary_usage:
+            self.__save_summary_usage(summary_usage, usage_id)
+
+    def start_context_summary(self):
+        """
+        Refresh the rolling summary in a background task, so the end of the turn doesn't wait
+        for the summary request. A thread is summarized by one task at a time.
+        """
+        if self.thread_id in context_summary_tasks:
+            return
+        task = asyncio.create_task(asyncio.to_thread(self.update_context_summary, self.usage_id))
+        context_summary_tasks[self.thread_id] = task
+        task.add_done_callback(lambda _: context_summary_tasks.pop(self.thread_id, None))
+
+    def get_run_params(self, input_message: Optional[str] = None) -> dict:
+        """
+        Parameters to start a run. The user message is sent along with the run (as an
+        additional message) instead of creating it with a separate request first.
 
         Args:
             input_message (str): The message to send to the assistant
         """
-        # Create a new message
+        context = self.get_context_data()
+        additional_instructions = "contexto: " + json.dumps(context)
+        run_params = {
+            "thread_id": self.thread_id,
+            "assistant_id": assistant_id,
+        }
+
+        # The run reads only the messages the summary doesn't cover, see `context_messages`
+        if CHAT_CONTEXT_LAST_MESSAGES:
+            run_params["truncation_strategy"] = {
+                "type": "last_messages",
+                "last_messages": self.context_messages
+            }
+            if self.context_summary:
+                additional_instructions = (
+                    "resumen de la conversación anterior: " + self.context_summary + "\n"
+                    + additional_instructions
+                )
+        run_params["additional_instructions"] = additional_instructions
+
         if input_message:
-            openai.beta.threads.messages.create(
-                thread_id=self.thread.id,
-                role="user",
-                content=input_message
-            )
+            run_params["additional_messages"] = [{"role": "user", "content": input_message}]
+
+            if TOOL_SUBSETTING_ENABLED:
+                tool_selection = self.select_tools(input_message, context)
+                if tool_selection.tools is not None:
+                    run_params["tools"] = tool_selection.tools
+
+        return run_params
 
-        event_handler = EventHandler(self.db, self.user)
+    def stream_response(self, input_message: Optional[str] = None, tool_outputs: list[dict] = []):
+        """
+        Stream the response of the assistant
+
+        Args:
+            input_message (str): The message to send to the assistant
+        """
+        self.start_run(input_message)
+        self.load_thread_context()
+        event_handler = self.make_event_handler()
 
         # Stream result assistant response
         with openai.beta.threads.runs.stream(
-            thread_id=self.thread.id,
-            assistant_id=assistant.id,
             event_handler=event_handler,
-            additional_instructions= "contexto: " + json.dumps(self.get_context_data())
+            **self.get_run_params(input_message)
         ) as stream:
             yield from stream.text_deltas
             stream.until_done()
+        self.run_usage = event_handler.run_usage
+        self.model_calls += 1
+        self.run_messages.extend(event_handler.completed_messages)
+        self.used_tool_names.update(tool.function.name for tool in event_handler.required_tool_calls)
 
         # Streaming tool outputs if exists
         if event_handler.tool_outputs:
@@ -63,12 +424,11 @@ class ThreadManager:
                 event_handler.tool_outputs
             )
 
-        run_usage = openai.beta.threads.runs.retrieve(
-            thread_id=self.thread.id,
-            run_id=event_handler.current_run.id
-        ).usage
-        
-        self.__save_usage(run_usage)
+        self.finish_run()
+        self.save_messages()
+        if self.run_usage:
+            self.__save_usage(self.run_usage)
+        self.update_context_summary(self.usage_id)
 
     def stream_tool_outputs(self, run_id: str, tool_outputs: list[dict]):
         """
@@ -77,16 +437,20 @@ class ThreadManager:
         Args:
             tool_outputs (list[dict]): The tool outputs to send to the assistant
         """
-        event_handler = EventHandler(self.db, self.user)
+        event_handler = self.make_event_handler()
 
         with openai.beta.threads.runs.submit_tool_outputs_stream(
-            thread_id=self.thread.id,
+            thread_id=self.thread_id,
             run_id=run_id,
             tool_outputs=tool_outputs,
             event_handler=event_handler
         ) as stream:
             yield from stream.text_deltas
             stream.until_done()
+        self.run_usage = event_handler.run_usage or self.run_usage
+        self.model_calls += 1
+        self.run_messages.extend(event_handler.completed_messages)
+        self.used_tool_names.update(tool.function.name for tool in event_handler.required_tool_calls)
 
         if event_handler.tool_outputs:
             yield from self.stream_tool_outputs(
@@ -96,13 +460,138 @@ class ThreadManager:
         
         # yield "Resultado:\n" + json.dumps(event_handler.tool_outputs)
 
+    async def astream_response(self, input_message: Optional[str] = None):
+        """
+        Async version of `stream_response`. It yields only the text of the answer, see
+        `astream_events` for the typed events.
+
+        Args:
+            input_message (str): The message to send to the assistant
+        """
+        async with aclosing(text_deltas(self.astream_events(input_message))) as texts:
+            async for text in texts:
+                yield text
+
+    async def astream_events(
+        self,
+        input_message: Optional[str] = None
+    ) -> AsyncIterator[ChatStreamEvent]:
+        """
+        Stream a turn of the assistant as typed events: `text.delta`, `tool.started`,
+        `tool.finished`, `usage` and `done`. It runs on the event loop using the async OpenAI
+        client, so an open chat doesn't take a worker thread. Tools and DB writes are offloaded
+        to threads.
+
+        If the stream is interrupted (the HTTP client disconnected and the response task was
+        cancelled, or the generator was closed) the active run is cancelled so it stops spending
+        tokens, and the usage it reached is still recorded.
+
+        Args:
+            input_message (str): The message to send to the assistant
+        """
+        finished = False
+        self.start_run(input_message)
+        try:
+            await asyncio.to_thread(self.load_thread_context)
+            run_stream = async_openai.beta.threads.runs.stream(
+                event_handler=self.make_async_event_handler(),
+                **self.get_run_params(input_message)
+            )
+            async with aclosing(self.__astream_run(run_stream)) as events:
+                async for chat_event in events:
+                    yield chat_event
+
+            finished = True
+            self.finish_run()
+            await asyncio.to_thread(self.save_messages)
+            if self.run_usage:
+                await asyncio.to_thread(self.__save_usage, self.run_usage)
+                yield make_event(USAGE, **self.run_usage.model_dump())
+
+            # Started before `done`: the client may close the stream as soon as it gets it
+            self.start_context_summary()
+            yield make_event(DONE, thread_id=self.thread_id, run_id=self.current_run_id)
+        finally:
+            if not finished:
+                # The request is being cancelled, shield the cleanup so it can still await
+                with CancelScope(shield=True):
+                    await self.__afinish_interrupted_run()
+
+    async def __astream_run(self, stream_manager) -> AsyncIterator[ChatStreamEvent]:
+        """
+        Stream the events of a run (or of a tool outputs submission), executing the tools it
+        requires and streaming the rest of the run after submitting their outputs.
+
+        Args:
+            stream_manager: `runs.stream` or `runs.submit_tool_outputs_stream` manager
+        """
+        async with stream_manager as event_handler:
+            self.event_handler = event_handler
+            async for _ in event_handler:
+                for chat_event in event_handler.pop_events():
+                    yield chat_event
+        self.run_usage = event_handler.run_usage or self.run_usage
+        self.model_calls += 1
+        self.run_messages.extend(event_handler.completed_messages)
+
+        if not event_handler.required_tool_calls:
+            return
+
+        self.used_tool_names.update(tool.function.name for tool in event_handler.required_tool_calls)
+
+        async with aclosing(event_handler.run_required_tools()) as tool_events:
+            async for chat_event in tool_events:
+                yield chat_event
+
+        tool_outputs_stream = async_openai.beta.threads.runs.submit_tool_outputs_stream(
+            thread_id=self.thread_id,
+            run_id=event_handler.current_run.id,
+            tool_outputs=event_handler.tool_outputs,
+            event_handler=self.make_async_event_handler()
+        )
+        async with aclosing(self.__astream_run(tool_outputs_stream)) as events:
+            async for chat_event in events:
+                yield chat_event
+
+    async def __afinish_interrupted_run(self):
+        """
+        Cancel the run left active by an interrupted stream and record the tokens it used
+        """
+        run = self.event_handler.current_run if self.event_handler else None
+        if run is None:
+            return
+
+        # The user message and the answers completed before the interruption
+        await asyncio.to_thread(self.save_messages)
+
+        usage = self.run_usage
+        if usage is None:
+            print("Cancelling interrupted run", run.id)
+            try:
+                run = await async_openai.beta.threads.runs.cancel(
+                    run_id=run.id,
+                    thread_id=self.thread_id
+                )
+                # Cancelling is asynchronous on OpenAI side, the usage may come later
+                if run.usage is None:
+                    run = await async_openai.beta.threads.runs.retrieve(
+                        run_id=run.id,
+                        thread_id=self.thread_id
+                    )
+                usage = run.usage
+            except APIError as error:
+                # The run may have finished in the meantime
+                print("Could not cancel run", run.id, error)
+
+        if usage:
+            await asyncio.to_thread(self.__save_usage, usage)
+
     def get_context_data(self):
         proactive_actions = []
         
-        context = {
-            "current_datetime": datetime.now().isoformat(),
-            "current_day": datetime.now().strftime("%A"),
-        }
+        # The date goes last and is rounded down, so the additional instructions (and the
+        # prompt prefix that the provider caches) stay the same between turns
+        context = {}
 
         if self.user.first_name:
             context["user_first_name"] = self.user.first_name
@@ -115,6 +604,16 @@ class ThreadManager:
             proactive_actions.append('Pregunta por la descripción de su negocio o empresa')
 
         context["proactive_actions"] = proactive_actions
+
+        now = datetime.now()
+        window = max(CHAT_CONTEXT_TIME_RESOLUTION_MINUTES, 1)
+        day_minutes = (now.hour * 60 + now.minute) // window * window
+        current_datetime = now.replace(
+            hour=day_minutes // 60, minute=day_minutes % 60, second=0, microsecond=0
+        )
+        context["current_day"] = current_datetime.strftime("%A")
+        context["current_datetime"] = current_datetime.isoformat(timespec="minutes")
+
         print("Context data", context)
         return context
 
@@ -125,17 +624,48 @@ class ThreadManager:
         Args:
             usage (Usage): token usage of the assistant
         """
-        cached_tokens = usage.model_dump().get(
-            "prompt_tokens_detail", {}
-        ).get("cached_tokens", 0)
+        from src.domains.auth.controllers.user_usage_controller import UserUsageController
+
+        with open_session(self.db, self.session_factory) as db:
+            self.usage_id = UserUsageController.registry_usage(
+                db,
+                self.user.id,
+                total_tokens=usage.total_tokens,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                cached_tokens=get_cached_tokens(usage),
+                saved_prompt_tokens=self.saved_prompt_tokens,
+                thread_id=self.thread_id,
+                thread_messages=self.thread_messages,
+                context_messages=self.context_messages
+            ).id
+
+    def __save_summary_usage(self, usage: CompletionUsage, usage_id: Optional[int]):
+        """
+        Save the tokens of a summary as part of the usage of the turn that refreshed it
 
+        Args:
+            usage (CompletionUsage): token usage of the summary request
+            usage_id (Optional[int]): usage of the turn, a new usage is saved when missing
+        """
         from src.domains.auth.controllers.user_usage_controller import UserUsageController
 
-        UserUsageController.registry_usage(
-            self.db,
-            self.user.id,
-            total_tokens=usage.total_tokens,
-            prompt_tokens=usage.prompt_tokens,
-            completion_tokens=usage.completion_tokens,
-            cached_tokens=cached_tokens
-        )
\ No newline at end of file
+        with open_session(self.db, self.session_factory) as db:
+            if usage_id is None:
+                UserUsageController.registry_usage(
+                    db,
+                    self.user.id,
+                    total_tokens=usage.total_tokens,
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                    cached_tokens=0,
+                    thread_id=self.thread_id
+                )
+                return
+            UserUsageController.add_usage_tokens(
+                db,
+                usage_id,
+                total_tokens=usage.total_tokens,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens
+            )
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import Optional
+from openai.types.completion_usage import CompletionUsage
+from src.domains.chat.models.chat_message import ChatMessage
+from src.domains.openai_integration.openai_integration import openai
+from src.utils.settings import CHAT_CONTEXT_SUMMARY_MODEL, CHAT_CONTEXT_SUMMARY_MAX_TOKENS
+
+SUMMARY_INSTRUCTIONS = (
+    "Eres parte de Binna, un asistente de ventas. Resume la conversación entre el usuario y "
+    "Binna para que Binna pueda continuarla sin leer los mensajes. Si hay un resumen "
+    "anterior, intégralo con los mensajes nuevos. Conserva los nombres de clientes, "
+    "contactos, montos, fechas, acuerdos y pendientes, y lo que el usuario pidió recordar. "
+    "Omite saludos y detalles que ya estén guardados como datos. Escribe en español, en "
+    "frases cortas, sin introducción."
+)
+
+# Messages longer than this are cut before summarizing them
+SUMMARY_MESSAGE_MAX_CHARS = 1000
+# Messages added to the summary at once. Long threads summarized for the first time catch up
+# over several turns.
+SUMMARY_MAX_MESSAGES = 100
+
+ROLE_NAMES = {"user": "Usuario", "assistant": "Binna"}
+
+def format_messages(messages: list[ChatMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = message.content
+        if len(content) > SUMMARY_MESSAGE_MAX_CHARS:
+            content = content[:SUMMARY_MESSAGE_MAX_CHARS] + "…"
+        lines.append(f"{ROLE_NAMES.get(message.role, message.role)}: {content}")
+    return "\n".join(lines)
+
+def summarize_messages(
+    previous_summary: Optional[str],
+    messages: list[ChatMessage]
+) -> tuple[str, Optional[CompletionUsage]]:
+    """
+    Summarize the messages of a thread, merged with the previous summary of the thread
+
+    Args:
+        previous_summary (Optional[str]): summary of the messages before `messages`
+        messages (list[ChatMessage]): messages to add to the summary, oldest first
+
+    Returns:
+        tuple[str, Optional[CompletionUsage]]: the new summary and the tokens it used
+    """
+    content = f"Mensajes:\n{format_messages(messages)}"
+    if previous_summary:
+        content = f"Resumen anterior:\n{previous_summary}\n\n{content}"
+
+    completion = openai.chat.completions.create(
+        model=CHAT_CONTEXT_SUMMARY_MODEL,
+        max_tokens=CHAT_CONTEXT_SUMMARY_MAX_TOKENS,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": content},
+        ]
+    )
+    return completion.choices[0].message.content or "", completion.usage
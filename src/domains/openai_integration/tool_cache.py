@@ -0,0 +1,123 @@
+from typing import Optional
+from collections import OrderedDict
+import json
+import threading
+from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+
+class ToolCacheStats:
+    """
+    Hit and miss counters of the tool caches, shared by all the runs of the process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def add(self, hits: int = 0, misses: int = 0, invalidations: int = 0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.invalidations += invalidations
+
+    def metrics(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
+
+tool_cache_stats = ToolCacheStats()
+
+class ToolResultCache:
+    """
+    LRU cache of the outputs of read-only tools during a chat run, so a tool called again in a
+    later tool round (with the same arguments) doesn't query the DB again.
+
+    Entries are keyed by (user_id, function_name, normalized arguments) and remember the
+    versions of the entity types the tool reads (the controllers of its results). A mutating
+    tool bumps the version of its entity type, which makes every cached read of that type
+    stale.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.__entries: OrderedDict[tuple, tuple[tuple, str]] = OrderedDict()
+        self.__entity_versions: dict[str, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(user_id: int, function_name: str, arguments: dict) -> tuple:
+        # Optional arguments sent as null are the same call as omitting them
+        normalized_arguments = {
+            name: value for name, value in arguments.items() if value is not None
+        }
+        return (user_id, function_name, json.dumps(normalized_arguments, sort_keys=True, default=str))
+
+    def __get_versions(self, function_name: str) -> tuple:
+        return tuple(sorted(
+            (entity, self.__entity_versions.get(entity, 0))
+            for entity in BinnaAssistantDescription.get_tool_read_entities(function_name)
+        ))
+
+    def clear(self):
+        """
+        Forget every entry, e.g. when the writes they may have seen were rolled back
+        """
+        with self.lock:
+            self.__entries.clear()
+
+    def get(self, user_id: int, function_name: str, arguments: dict) -> Optional[str]:
+        """
+        Serialized output of a previous call to the read-only tool, if it's still valid
+        """
+        if not BinnaAssistantDescription.is_read_only_tool(function_name):
+            return None
+
+        key = self.make_key(user_id, function_name, arguments)
+
+        with self.lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] == self.__get_versions(function_name):
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                hit = True
+            else:
+                if entry is not None:
+                    del self.__entries[key]
+                self.misses += 1
+                hit = False
+
+        tool_cache_stats.add(hits=int(hit), misses=int(not hit))
+        return entry[1] if hit else None
+
+    def record(self, user_id: int, function_name: str, arguments: dict, output: str):
+        """
+        Store the output of a read-only tool, or invalidate the reads of the entity type
+        touched by a mutating tool
+        """
+        if not BinnaAssistantDescription.is_read_only_tool(function_name):
+            entity = BinnaAssistantDescription.get_tool_entity(function_name)
+            with self.lock:
+                self.__entity_versions[entity] = self.__entity_versions.get(entity, 0) + 1
+                self.invalidations += 1
+            tool_cache_stats.add(invalidations=1)
+            return
+
+        if self.max_entries <= 0:
+            return
+
+        key = self.make_key(user_id, function_name, arguments)
+        with self.lock:
+            self.__entries[key] = (self.__get_versions(function_name), output)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
@@ -0,0 +1,163 @@
+from typing import Any, Optional
+from datetime import date, datetime
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+import json
+from src.domains.auth.models.user import User
+from src.domains.customer.models import (
+    CustomerEstablishment, AdditionalNote, Contact, Task, Opportunity, Meet
+)
+
+# Fields of each model sent to the assistant. Flags (`deleted`), owner ids and secrets are
+# never sent, the foreign keys the assistant needs to chain tool calls are kept.
+MODEL_FIELD_WHITELIST: dict[type, tuple[str, ...]] = {
+    CustomerEstablishment: ("id", "name", "industry", "description"),
+    AdditionalNote: ("id", "customer_establishment_id", "title", "content"),
+    Contact: ("id", "establishment_id", "name", "role", "email", "phone"),
+    Task: ("id", "establishment_id", "name", "due_date", "completed", "description"),
+    Opportunity: (
+        "id", "customer_establishment_id", "product", "stage", "price", "close_date", "notes"
+    ),
+    Meet: (
+        "id", "customer_establishment_id", "opportunity_id", "name", "date", "duration_minutes",
+        "status", "address", "description"
+    ),
+    User: ("first_name", "last_name", "my_business_description", "biography"),
+}
+
+# Fields never sent for models without a whitelist
+HIDDEN_FIELDS = {"deleted", "user_id", "hashed_password"}
+
+# Long texts are cut in lists, the assistant can get the whole item with its get_* tool
+LIST_TEXT_MAX_CHARS = 160
+
+TRUNCATION_MARKER = "…[truncado]"
+
+def dumps_compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _compact_scalar(value: Any, in_list: bool) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    if in_list and isinstance(value, str) and len(value) > LIST_TEXT_MAX_CHARS:
+        return value[:LIST_TEXT_MAX_CHARS] + "…"
+    return value
+
+def get_record_fields(item: Any) -> Optional[dict]:
+    """
+    Whitelisted fields of a model instance or a DB row, None if `item` isn't a record
+    """
+    if isinstance(item, Row):
+        return {
+            name: value for name, value in item._mapping.items() if name not in HIDDEN_FIELDS
+        }
+
+    if not isinstance(item, BaseModel):
+        return None
+
+    whitelist = MODEL_FIELD_WHITELIST.get(type(item))
+    if whitelist is None:
+        return {
+            name: getattr(item, name) for name in type(item).model_fields
+            if name not in HIDDEN_FIELDS
+        }
+    return {name: getattr(item, name, None) for name in whitelist}
+
+def compact_value(value: Any, in_list: bool = False) -> Any:
+    """
+    Compact representation of a tool result: records keep only their whitelisted fields,
+    nulls are dropped and lists of records become a table (`columns` plus `rows`).
+    """
+    record = get_record_fields(value)
+    if record is not None:
+        value = record
+
+    if isinstance(value, dict):
+        return {
+            name: compact_value(field_value, in_list)
+            for name, field_value in value.items() if field_value is not None
+        }
+
+    if isinstance(value, (list, tuple)):
+        records = [get_record_fields(item) for item in value]
+        if value and all(record is not None for record in records):
+            return compact_table(records)
+        return [compact_value(item, in_list=True) for item in value]
+
+    return _compact_scalar(value, in_list)
+
+def compact_table(records: list[dict]) -> dict:
+    """
+    Render records as a header row plus one row of values per record. Columns that are null
+    in every record are dropped.
+    """
+    columns = []
+    for record in records:
+        for name, field_value in record.items():
+            if field_value is not None and name not in columns:
+                columns.append(name)
+
+    return {
+        "columns": columns,
+        "rows": [
+            [compact_value(record.get(name), in_list=True) for name in columns]
+            for record in records
+        ],
+    }
+
+def _find_tables(value: Any) -> list[dict]:
+    if isinstance(value, dict):
+        if "columns" in value and "rows" in value:
+            return [value]
+        return [table for field_value in value.values() for table in _find_tables(field_value)]
+    if isinstance(value, list):
+        return [table for item in value for table in _find_tables(item)]
+    return []
+
+def _fit_table(payload: dict, table: dict, max_bytes: int):
+    """
+    Keep the most rows of the table that fit in the budget (binary search)
+    """
+    all_rows = table["rows"]
+    low, high = 0, len(all_rows)
+    while low < high:
+        middle = (low + high + 1) // 2
+        table["rows"] = all_rows[:middle]
+        table["truncated"] = f"{middle} de {len(all_rows)} filas"
+        if len(dumps_compact(payload).encode()) <= max_bytes:
+            low = middle
+        else:
+            high = middle - 1
+
+    table["rows"] = all_rows[:low]
+    table["truncated"] = (
+        f"{low} de {len(all_rows)} filas. La respuesta es muy larga, usa filtros o un limit menor"
+    )
+
+def serialize_tool_output(output: dict, max_bytes: int) -> str:
+    """
+    Serialize the output of a tool for the assistant, compacted and within `max_bytes`
+    (UTF-8). When it doesn't fit, the rows of the biggest table are cut with a `truncated`
+    note; as a last resort the text is cut and ends with a truncation marker.
+
+    Args:
+        output (dict): tool output, may contain model instances, rows or lists of them
+        max_bytes (int): budget of the serialized output (0 disables it)
+    """
+    payload = compact_value(output)
+    serialized_output = dumps_compact(payload)
+    if max_bytes <= 0 or len(serialized_output.encode()) <= max_bytes:
+        return serialized_output
+
+    tables = _find_tables(payload)
+    if tables:
+        _fit_table(payload, max(tables, key=lambda table: len(table["rows"])), max_bytes)
+        serialized_output = dumps_compact(payload)
+        if len(serialized_output.encode()) <= max_bytes:
+            return serialized_output
+
+    marker_bytes = len(TRUNCATION_MARKER.encode())
+    truncated_output = serialized_output.encode()[:max(max_bytes - marker_bytes, 0)]
+    return truncated_output.decode(errors="ignore") + TRUNCATION_MARKER
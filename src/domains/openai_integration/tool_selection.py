@@ -0,0 +1,166 @@
+from typing import Iterable
+from collections import OrderedDict, deque
+import json
+import re
+import threading
+import unicodedata
+from src.domains.openai_integration.openai_assistant import (
+    BinnaAssistantDescription, function_entity_map
+)
+from src.utils.settings import TOOL_SUBSETTING_RECENT_TURNS
+
+# Tool groups, named after the controller of their tools
+TOOL_GROUP_BY_ENTITY = {
+    "EstablishmentController": "customers",
+    "AdditionalNoteController": "notes",
+    "ContactController": "contacts",
+    "MeetController": "meets",
+    "TaskController": "tasks",
+    "OpportunityController": "opportunities",
+    "UserController": "profile",
+    "ChatMessageController": "history",
+}
+
+# Keyword prefixes (lowercase, without accents) that route a message to a group
+TOOL_GROUP_KEYWORDS = {
+    "customers": ("client", "empresa", "compan", "establecimiento", "negocio", "tienda", "local"),
+    "notes": ("nota", "apunte", "anota", "comentario", "observacion"),
+    "contacts": (
+        "contacto", "telefono", "celular", "correo", "email", "mail", "whatsapp", "encargad",
+        "gerente", "duen"
+    ),
+    "meets": ("reunion", "junta", "cita", "visita", "llamada", "agenda", "meet", "videollamada"),
+    "tasks": ("tarea", "pendiente", "recordatorio", "recordar", "recuerdame", "seguimiento"),
+    "opportunities": (
+        "oportunidad", "venta", "vender", "cotiza", "propuesta", "precio", "monto", "trato",
+        "deal", "cierre", "cerrar", "producto", "etapa"
+    ),
+    "profile": (
+        "perfil", "me llamo", "mi nombre", "soy ", "mi negocio", "mi empresa", "biografia",
+        "mi apellido", "me dedico"
+    ),
+    "history": (
+        "te dije", "te conte", "te hable", "te mencione", "te pase", "hablamos", "conversamos",
+        "conversacion", "historial", "chat"
+    ),
+}
+
+# Messages asking for an overview of everything get every group
+ALL_GROUPS_KEYWORDS = ("resumen", "todo lo que", "toda la informacion", "que sabes")
+
+# Groups whose tools need the ids found with the tools of other groups
+TOOL_GROUP_DEPENDENCIES = {
+    "notes": {"customers"},
+    "contacts": {"customers"},
+    "meets": {"customers", "contacts"},
+    "tasks": {"customers"},
+    "opportunities": {"customers"},
+}
+
+tool_group_map = {
+    function_name: TOOL_GROUP_BY_ENTITY[entity]
+    for function_name, entity in function_entity_map.items()
+}
+
+# Rough prompt tokens of every tool schema (~4 characters per token)
+estimated_tool_tokens = {
+    tool["function"]["name"]: len(json.dumps(tool, ensure_ascii=False)) // 4
+    for tool in BinnaAssistantDescription.tools
+}
+
+def normalize_text(text: str) -> str:
+    decomposed_text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed_text if not unicodedata.combining(char))
+
+def compile_keywords(keywords: Iterable[str]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+
+keyword_patterns = {
+    group: compile_keywords(keywords) for group, keywords in TOOL_GROUP_KEYWORDS.items()
+}
+all_groups_pattern = compile_keywords(ALL_GROUPS_KEYWORDS)
+
+def get_tool_groups(function_names: Iterable[str]) -> set[str]:
+    return {
+        tool_group_map[function_name]
+        for function_name in function_names if function_name in tool_group_map
+    }
+
+class ToolSelection:
+    """
+    Tools sent with a run. `tools` is None when every group is selected, so the run uses
+    the tools of the assistant.
+    """
+
+    def __init__(self, groups: set[str]):
+        self.groups = groups
+
+        if groups >= set(TOOL_GROUP_BY_ENTITY.values()):
+            self.tools = None
+            self.saved_tokens_per_call = 0
+            return
+
+        self.tools = [
+            tool for tool in BinnaAssistantDescription.tools
+            if tool_group_map[tool["function"]["name"]] in groups
+        ]
+        self.saved_tokens_per_call = sum(
+            tokens for function_name, tokens in estimated_tool_tokens.items()
+            if tool_group_map[function_name] not in groups
+        )
+
+class RecentToolGroups:
+    """
+    Tool groups used in the last turns of each thread (in memory, the least recently used
+    threads are forgotten)
+    """
+
+    def __init__(self, max_turns: int, max_threads: int):
+        self.max_turns = max_turns
+        self.max_threads = max_threads
+        self.lock = threading.Lock()
+        self.__turns_by_thread: OrderedDict[str, deque[set[str]]] = OrderedDict()
+
+    def get(self, thread_id: str) -> set[str]:
+        with self.lock:
+            turns = self.__turns_by_thread.get(thread_id)
+            return set().union(*turns) if turns else set()
+
+    def record(self, thread_id: str, groups: set[str]):
+        with self.lock:
+            turns = self.__turns_by_thread.setdefault(thread_id, deque(maxlen=self.max_turns))
+            turns.append(set(groups))
+            self.__turns_by_thread.move_to_end(thread_id)
+            while len(self.__turns_by_thread) > self.max_threads:
+                self.__turns_by_thread.popitem(last=False)
+
+def select_tool_groups(message: str, context: dict) -> set[str]:
+    """
+    Choose the tool groups a message may need from cheap local signals: its keywords and the
+    missing profile data in the context. The groups of the last turns of the thread are added
+    by the caller (see `recent_tool_groups`).
+
+    Args:
+        message (str): message of the user
+        context (dict): context data sent with the run
+    """
+    normalized_message = normalize_text(message)
+
+    if all_groups_pattern.search(normalized_message):
+        return set(TOOL_GROUP_BY_ENTITY.values())
+
+    groups = {
+        group for group, pattern in keyword_patterns.items()
+        if pattern.search(normalized_message)
+    }
+
+    # The assistant is asked to complete the profile, the answer may not have any keyword
+    if context.get("proactive_actions"):
+        groups.add("profile")
+
+    for group in list(groups):
+        groups |= TOOL_GROUP_DEPENDENCIES.get(group, set())
+
+    return groups
+
+recent_tool_groups = RecentToolGroups(max_turns=TOOL_SUBSETTING_RECENT_TURNS, max_threads=10000)
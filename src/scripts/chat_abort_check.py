@@ -0,0 +1,178 @@
+"""
+Check what happens to the OpenAI run when a chat client goes away mid-answer
+(`ThreadManager.astream_events`), against a local fake Assistants server: the run must be
+cancelled so it stops spending tokens, and the usage it reached and the user message must
+still be saved.
+
+The stream is interrupted three ways: the events generator is closed, the task streaming it is
+cancelled (what a dropped HTTP request does) and the only client of a tracked run detaches
+until the reattach grace period ends.
+
+Usage:
+    python -m src.scripts.chat_abort_check
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import aclosing
+from datetime import datetime, timedelta
+
+from src.scripts.fake_assistants_server import FakeAssistantsServer, DEFAULT_USAGE
+
+PORT = 8769
+GRACE_SECONDS = 0.2
+
+# Point the OpenAI clients to the fake server before they are created on import
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "check")
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+def create_user(database):
+    from sqlmodel import Session
+    from src.domains.auth.models import User, UserUsageLimit
+
+    with Session(database.engine) as db:
+        user = User(username="check", email="check@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        db.add(UserUsageLimit(
+            user_id=user.id,
+            max_total_tokens_usage=10_000_000,
+            start_period_date=datetime.now() - timedelta(days=1),
+            finish_period_date=datetime.now() + timedelta(days=1),
+        ))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+async def close_after_first_delta(thread_manager):
+    async with aclosing(thread_manager.astream_events("Hola, cierro enseguida")) as events:
+        async for chat_event in events:
+            if chat_event["event"] == "text.delta":
+                return
+
+
+async def cancel_after_first_delta(thread_manager):
+    first_delta = asyncio.Event()
+
+    async def stream():
+        async for chat_event in thread_manager.astream_events("Hola, me desconecto"):
+            if chat_event["event"] == "text.delta":
+                first_delta.set()
+
+    task = asyncio.create_task(stream())
+    await first_delta.wait()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def detach_from_tracked_run(thread_manager):
+    from src.domains.chat.run_tracker import ChatRunTracker
+
+    tracker = ChatRunTracker(
+        max_buffer_bytes=64 * 1024, grace_seconds=GRACE_SECONDS, retention_seconds=60
+    )
+    tracked_run = tracker.track(thread_manager, thread_manager.astream_events("Hola, no vuelvo"))
+    async with aclosing(tracked_run.subscribe()) as events:
+        async for chat_event in events:
+            if chat_event["event"] == "text.delta":
+                break
+    # Nobody reattaches: the run is abandoned after the grace period
+    while not tracked_run.finished:
+        await asyncio.sleep(0.05)
+    return tracked_run.status
+
+
+async def check_interrupted_turn(server, database, user, name: str, interrupt) -> None:
+    from sqlmodel import Session, select
+    from src.domains.auth.models import UserUsage
+    from src.domains.chat.models import ChatMessage
+    from src.domains.openai_integration.thread_manager import ThreadManager
+
+    print(name)
+    thread_manager = ThreadManager(None, None, user, session_factory=database.session_factory)
+    server.reset_calls()
+
+    result = await interrupt(thread_manager)
+    if result is not None:
+        check("the tracked run ends cancelled", result == "cancelled", result)
+
+    run_id = thread_manager.current_run_id
+    calls = server.fetch_calls()
+    check(
+        "runs.cancel is called for the active run",
+        ("POST", f"threads/{thread_manager.thread_id}/runs/{run_id}/cancel") in calls,
+        run_id or "no run"
+    )
+
+    with Session(database.engine) as db:
+        usages = db.exec(select(UserUsage).where(
+            UserUsage.thread_id == thread_manager.thread_id
+        )).all()
+        messages = db.exec(select(ChatMessage).where(
+            ChatMessage.thread_id == thread_manager.thread_id
+        )).all()
+    check(
+        "the usage reached by the run is saved",
+        len(usages) == 1 and usages[0].total_tokens == DEFAULT_USAGE["total_tokens"],
+        f"{[usage.total_tokens for usage in usages]}"
+    )
+    check(
+        "the user message is stored",
+        [message.role for message in messages] == ["user"],
+        f"{[message.role for message in messages]}"
+    )
+
+
+async def check_interrupted_turns(server, database, user):
+    # One event loop for every turn: the async OpenAI client keeps its connections
+    await check_interrupted_turn(
+        server, database, user, "Stream closed by the client", close_after_first_delta
+    )
+    await check_interrupted_turn(
+        server, database, user, "Streaming task cancelled", cancel_after_first_delta
+    )
+    await check_interrupted_turn(
+        server, database, user, "Tracked run abandoned", detach_from_tracked_run
+    )
+
+
+def main():
+    # Slow answer, so the stream is always interrupted before the run completes
+    server = FakeAssistantsServer(port=PORT, delta_delay=0.1).start()
+    try:
+        from src.database.database import Database
+
+        database = Database(os.path.join(tempfile.mkdtemp(), "check.db"))
+        database.migrate()
+        user = create_user(database)
+
+        asyncio.run(check_interrupted_turns(server, database, user))
+    finally:
+        server.stop()
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
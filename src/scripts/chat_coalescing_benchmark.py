@@ -0,0 +1,116 @@
+"""
+Micro-benchmark of the writes and bytes per answer sent by /chat/send, with and without
+coalescing the text deltas.
+
+The answer is replayed from synthetic 1-2 character deltas arriving every few milliseconds
+(simulated clock, the benchmark doesn't sleep).
+
+Usage:
+    python -m src.scripts.chat_coalescing_benchmark [--chars 1500] [--delta-interval-ms 8]
+"""
+import argparse
+import asyncio
+import os
+import random
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from src.domains.chat.coalescing import coalesce_text_deltas
+from src.domains.chat.sse import encode_sse
+from src.domains.openai_integration.stream_events import (
+    make_event, TEXT_DELTA, TOOL_STARTED, TOOL_FINISHED, DONE
+)
+from src.utils.settings import CHAT_STREAM_FLUSH_INTERVAL_MS, CHAT_STREAM_FLUSH_BYTES
+
+WORDS = "hola cliente reunión oportunidad tarea contacto propuesta seguimiento venta".split()
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def build_answer(chars: int) -> list[str]:
+    text = ""
+    while len(text) < chars:
+        text += random.choice(WORDS) + " "
+
+    deltas, start = [], 0
+    while start < len(text):
+        size = random.choice((1, 2))
+        deltas.append(text[start:start + size])
+        start += size
+    return deltas
+
+
+async def replay(deltas: list[str], clock: SimulatedClock, delta_interval_ms: float):
+    """
+    Events of a turn: half of the answer, a tool round and the other half
+    """
+    half = len(deltas) // 2
+    for index, delta in enumerate(deltas):
+        if index == half:
+            yield make_event(TOOL_STARTED, tool_call_id="call_0", name="get_all_customer")
+            yield make_event(TOOL_FINISHED, tool_call_id="call_0", name="get_all_customer", duration_ms=5)
+        clock.now += delta_interval_ms / 1000
+        yield make_event(TEXT_DELTA, value=delta)
+    yield make_event(DONE, thread_id="thread_benchmark", run_id="run_benchmark")
+
+
+async def measure(events) -> dict:
+    plain_writes = plain_bytes = sse_writes = sse_bytes = 0
+    async for chat_event in events:
+        sse_writes += 1
+        sse_bytes += len(encode_sse(chat_event).encode())
+        if chat_event["event"] == TEXT_DELTA:
+            plain_writes += 1
+            plain_bytes += len(chat_event["data"]["value"].encode())
+    return {
+        "plain_writes": plain_writes,
+        "plain_bytes": plain_bytes,
+        "sse_writes": sse_writes,
+        "sse_bytes": sse_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes and bytes per answer")
+    parser.add_argument("--chars", type=int, default=1500)
+    parser.add_argument("--delta-interval-ms", type=float, default=8)
+    parser.add_argument("--flush-interval-ms", type=int, default=CHAT_STREAM_FLUSH_INTERVAL_MS)
+    parser.add_argument("--flush-bytes", type=int, default=CHAT_STREAM_FLUSH_BYTES)
+    args = parser.parse_args()
+
+    random.seed(0)
+    deltas = build_answer(args.chars)
+
+    clock = SimulatedClock()
+    raw = asyncio.run(measure(replay(deltas, clock, args.delta_interval_ms)))
+
+    clock = SimulatedClock()
+    coalesced = asyncio.run(measure(coalesce_text_deltas(
+        replay(deltas, clock, args.delta_interval_ms),
+        flush_interval_ms=args.flush_interval_ms,
+        flush_bytes=args.flush_bytes,
+        clock=clock
+    )))
+
+    print(
+        f"Answer: {len(deltas)} deltas, {args.chars}+ chars, one delta every "
+        f"{args.delta_interval_ms}ms (flush every {args.flush_interval_ms}ms or "
+        f"{args.flush_bytes} bytes)"
+    )
+    print(f"{'':>12} {'plain writes':>13} {'plain bytes':>12} {'sse writes':>11} {'sse bytes':>10}")
+    for name, result in (("raw", raw), ("coalesced", coalesced)):
+        print(
+            f"{name:>12} {result['plain_writes']:>13} {result['plain_bytes']:>12} "
+            f"{result['sse_writes']:>11} {result['sse_bytes']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Check the reattach of `/chat/stream` (`ChatRunTracker`) when two messages are sent back to back
+on one thread: the second run waits for the first one in the scheduler, and a client that
+reattaches must get the run producing output, not the queued one. Runs are simulated (no
+OpenAI requests).
+
+Usage:
+    python -m src.scripts.chat_run_tracker_check
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "check")
+
+from src.domains.chat.run_tracker import ChatRunTracker
+from src.domains.chat.scheduler import ChatRunScheduler
+from src.domains.openai_integration.stream_events import make_event, DONE, RESUMED, TEXT_DELTA
+
+THREAD_ID = "thread_check"
+USER_ID = 1
+GRACE_SECONDS = 0.2
+DELTAS = 10
+DELTA_SECONDS = 0.05
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+class FakeThreadManager:
+    """
+    What the tracker reads of a ThreadManager
+    """
+
+    def __init__(self, run_id: str):
+        self.thread_id = THREAD_ID
+        self.user = SimpleNamespace(id=USER_ID)
+        self.current_run_id = run_id
+
+
+async def fake_run(run_id: str, log: list[str]):
+    try:
+        for index in range(DELTAS):
+            await asyncio.sleep(DELTA_SECONDS)
+            yield make_event(TEXT_DELTA, value=f"{run_id}:{index} ")
+        yield make_event(DONE, thread_id=THREAD_ID, run_id=run_id)
+        log.append(f"{run_id} completed")
+    except BaseException:
+        log.append(f"{run_id} cancelled")
+        raise
+
+
+def send(scheduler: ChatRunScheduler, tracker: ChatRunTracker, run_id: str, log: list[str]):
+    """
+    What `send_message` does: admit the run, track it and start it in the background
+    """
+    ticket = scheduler.admit(USER_ID, THREAD_ID)
+    tracked_run = tracker.track(
+        FakeThreadManager(run_id), scheduler.run(ticket, fake_run(run_id, log))
+    )
+    tracked_run.start()
+    return tracked_run
+
+
+async def check_back_to_back_messages():
+    print("Two messages sent back to back on one thread")
+    scheduler = ChatRunScheduler(
+        max_active_runs=10, max_active_runs_per_user=5, max_queued_per_thread=5
+    )
+    tracker = ChatRunTracker(
+        max_buffer_bytes=64 * 1024, grace_seconds=GRACE_SECONDS, retention_seconds=60
+    )
+    log: list[str] = []
+
+    first_run = send(scheduler, tracker, "run_1", log)
+    second_run = send(scheduler, tracker, "run_2", log)
+
+    # The client of the first message loses the connection after the first delta
+    first_events = first_run.subscribe()
+    await first_events.__anext__()
+    await first_events.aclose()
+    # The client of the second message keeps waiting for its answer
+    second_events = asyncio.create_task(collect(second_run.subscribe()))
+
+    reattached_run = tracker.get_run(THREAD_ID, USER_ID)
+    check(
+        "reattaches to the active run, not the queued one",
+        reattached_run is first_run,
+        reattached_run.thread_manager.current_run_id
+    )
+
+    # Reattach after the grace period would have abandoned an unattended run
+    await asyncio.sleep(GRACE_SECONDS / 2)
+    resumed_events = await collect(reattached_run.subscribe(resumed=True))
+    check(
+        "the reattached client gets the whole answer of the active run",
+        resumed_events[0]["event"] == RESUMED
+        and resumed_events[-1]["data"].get("run_id") == "run_1"
+        and sum(1 for event in resumed_events if event["event"] == TEXT_DELTA) == DELTAS,
+        f"{len(resumed_events)} events"
+    )
+
+    check(
+        "the queued run becomes the one to reattach to",
+        tracker.get_run(THREAD_ID, USER_ID) is second_run
+    )
+    second_events = await second_events
+    check(
+        "both runs complete, none is abandoned",
+        log == ["run_1 completed", "run_2 completed"],
+        ", ".join(log)
+    )
+    check(
+        "the last finished run is kept to reattach to",
+        tracker.get_run(THREAD_ID, USER_ID) is second_run
+        and tracker.metrics()["tracked_runs"] == 1,
+        f"{tracker.metrics()['tracked_runs']} tracked runs"
+    )
+
+
+async def collect(events) -> list:
+    return [event async for event in events]
+
+
+def main():
+    asyncio.run(check_back_to_back_messages())
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Burst load against the chat run scheduler with simulated runs (no OpenAI requests).
+
+Every user sends bursts of messages to a few threads. The script checks that the runs of a
+thread never overlap and keep their order, that the per-user and global caps hold, and
+prints the admitted, queued and rejected messages.
+
+Usage:
+    python -m src.scripts.chat_scheduler_load [--users 50] [--threads-per-user 2] [--messages 6]
+"""
+import argparse
+import asyncio
+import os
+import random
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "load")
+
+from src.domains.chat.scheduler import ChatRunScheduler, ChatRunLimitException
+from src.utils.settings import (
+    CHAT_MAX_ACTIVE_RUNS, CHAT_MAX_ACTIVE_RUNS_PER_USER, CHAT_MAX_QUEUED_PER_THREAD
+)
+
+
+class RunTracker:
+    def __init__(self):
+        self.running_threads: set[str] = set()
+        self.running_by_user: dict[int, int] = {}
+        self.peak_global = 0
+        self.peak_per_user = 0
+        self.finished_order: dict[str, list[int]] = {}
+
+    async def fake_run(self, user_id: int, thread_id: str, sequence: int, seconds: float):
+        assert thread_id not in self.running_threads, f"Overlapping runs on {thread_id}"
+        self.running_threads.add(thread_id)
+        self.running_by_user[user_id] = self.running_by_user.get(user_id, 0) + 1
+        self.peak_global = max(self.peak_global, len(self.running_threads))
+        self.peak_per_user = max(self.peak_per_user, self.running_by_user[user_id])
+        try:
+            await asyncio.sleep(seconds)
+            yield "ok"
+        finally:
+            self.running_threads.discard(thread_id)
+            self.running_by_user[user_id] -= 1
+            self.finished_order.setdefault(thread_id, []).append(sequence)
+
+
+async def send(scheduler, tracker, user_id, thread_id, sequence, run_seconds, results):
+    try:
+        ticket = scheduler.admit(user_id, thread_id)
+    except ChatRunLimitException as e:
+        results[e.reason] = results.get(e.reason, 0) + 1
+        return
+
+    async for _ in scheduler.run(ticket, tracker.fake_run(user_id, thread_id, sequence, run_seconds)):
+        pass
+    results["answered"] = results.get("answered", 0) + 1
+
+
+async def load(args) -> tuple[ChatRunScheduler, RunTracker, dict]:
+    scheduler = ChatRunScheduler(
+        max_active_runs=args.max_active_runs,
+        max_active_runs_per_user=args.max_active_runs_per_user,
+        max_queued_per_thread=args.max_queued_per_thread
+    )
+    tracker = RunTracker()
+    results: dict[str, int] = {}
+    sequence = 0
+    tasks = []
+
+    for _ in range(args.messages):
+        for user_id in range(args.users):
+            for thread_number in range(args.threads_per_user):
+                sequence += 1
+                thread_id = f"thread_{user_id}_{thread_number}"
+                run_seconds = random.uniform(0.05, 0.2)
+                tasks.append(asyncio.create_task(
+                    send(scheduler, tracker, user_id, thread_id, sequence, run_seconds, results)
+                ))
+        await asyncio.sleep(0.02)
+
+    await asyncio.gather(*tasks)
+    return scheduler, tracker, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burst load against the chat run scheduler")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads-per-user", type=int, default=2)
+    parser.add_argument("--messages", type=int, default=6, help="Bursts sent to every thread")
+    parser.add_argument("--max-active-runs", type=int, default=CHAT_MAX_ACTIVE_RUNS)
+    parser.add_argument("--max-active-runs-per-user", type=int, default=CHAT_MAX_ACTIVE_RUNS_PER_USER)
+    parser.add_argument("--max-queued-per-thread", type=int, default=CHAT_MAX_QUEUED_PER_THREAD)
+    args = parser.parse_args()
+
+    random.seed(0)
+    scheduler, tracker, results = asyncio.run(load(args))
+
+    for thread_id, order in tracker.finished_order.items():
+        assert order == sorted(order), f"Runs of {thread_id} finished out of order"
+    assert tracker.peak_global <= args.max_active_runs
+    assert tracker.peak_per_user <= args.max_active_runs_per_user
+
+    metrics = scheduler.metrics()
+    assert metrics["active_runs"] == 0 and metrics["queued_messages"] == 0
+
+    print(f"Messages: {args.users * args.threads_per_user * args.messages}")
+    for name, count in sorted(results.items()):
+        print(f"  {name}: {count}")
+    print(f"Queued behind a thread run: {metrics['queued_total']}")
+    print(f"Peak runs: {tracker.peak_global} global, {tracker.peak_per_user} per user")
+
+
+if __name__ == "__main__":
+    main()
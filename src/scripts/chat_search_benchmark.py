@@ -0,0 +1,113 @@
+"""
+Latency of the full-text search of the chat history on a SQLite file (FTS5 index).
+
+Stores the given number of messages for 20 users (50 threads each) and runs searches of
+rare, common and prefix words for one of them.
+
+Usage:
+    python -m src.scripts.chat_search_benchmark [--messages 100000] [--runs 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from sqlmodel import Session
+from src.database.database import Database
+from src.domains.auth.models import User
+from src.domains.chat.models import ChatMessage, ChatThread
+from src.domains.chat.search import search_messages
+
+USERS = 20
+THREADS_PER_USER = 50
+
+WORDS = (
+    "cliente reunión propuesta precio precios cotización contrato entrega visita llamada "
+    "producto descuento volumen pedido factura pago semana mes próximo gerente compras "
+    "bodega despacho stock envío condiciones plazo oferta interesado seguimiento correo "
+    "tienda sucursal campaña catálogo muestra calidad proveedor competencia margen"
+).split()
+COMPANIES = ("Acme", "Globex", "Initech", "Umbrella", "Hooli", "Soylent", "Stark", "Wayne")
+
+SEARCHES = {
+    "rare word": "Umbrella contrato",
+    "common word": "precio",
+    "prefix": "cotiz",
+    "two words": "precio Acme",
+}
+
+
+def make_message(generator: random.Random) -> str:
+    words = generator.choices(WORDS, k=generator.randint(8, 40))
+    words.insert(generator.randrange(len(words)), generator.choice(COMPANIES))
+    return " ".join(words)
+
+
+def create_messages(database: Database, messages: int):
+    generator = random.Random(7)
+    start = datetime.now() - timedelta(days=365)
+
+    with Session(database.engine) as db:
+        users = [
+            User(username=f"user{index}", email=f"user{index}@binna.app", hashed_password="")
+            for index in range(USERS)
+        ]
+        db.add_all(users)
+        db.flush()
+
+        thread_ids = []
+        for user in users:
+            for index in range(THREADS_PER_USER):
+                thread_id = f"thread_{user.id}_{index}"
+                db.add(ChatThread(thread_id=thread_id, user_id=user.id))
+                thread_ids.append(thread_id)
+        db.flush()
+
+        db.add_all(
+            ChatMessage(
+                thread_id=thread_ids[index % len(thread_ids)],
+                role="user" if index % 2 == 0 else "assistant",
+                content=make_message(generator),
+                created_at=start + timedelta(minutes=index)
+            )
+            for index in range(messages)
+        )
+        db.commit()
+        return users[0].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the chat history search")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    database.migrate()
+    user_id = create_messages(database, args.messages)
+
+    print(f"Messages: {args.messages} ({USERS} users, {THREADS_PER_USER} threads each)")
+    with Session(database.engine) as db:
+        for name, query in SEARCHES.items():
+            latencies = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                results = search_messages(db, user_id, query)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            print(
+                f"  {name:12} {len(results):3} results  "
+                f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms"
+            )
+        print(f"  example: {results[0].snippet if results else None}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare the sync and the async chat streaming paths against a local fake Assistants server.
+
+The sync path is driven by a pool of 40 threads, the same default limit Starlette uses to
+iterate sync generators in a `StreamingResponse`. The async path runs every stream on a single
+event loop.
+
+Usage:
+    python -m src.scripts.chat_stream_benchmark [--streams 200] [--delta-delay 0.02]
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The benchmark never reaches OpenAI, but the settings module requires these variables
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from openai import OpenAI, AsyncOpenAI
+from src.domains.auth.models.user import User
+from src.domains.openai_integration.event_handler import EventHandler, AsyncEventHandler
+from src.scripts.fake_assistants_server import FakeAssistantsServer
+
+STARLETTE_THREADPOOL_SIZE = 40
+
+
+class QuietEventHandler(EventHandler):
+    def on_text_created(self, text):
+        pass
+
+    def on_text_delta(self, delta, snapshot):
+        pass
+
+    def on_text_done(self, text):
+        pass
+
+
+class QuietAsyncEventHandler(AsyncEventHandler):
+    async def on_text_created(self, text):
+        pass
+
+    async def on_text_delta(self, delta, snapshot):
+        pass
+
+    async def on_text_done(self, text):
+        pass
+
+
+def no_session():
+    raise RuntimeError("The benchmark runs don't execute tools")
+
+
+def run_sync(client: OpenAI, user: User, streams: int) -> float:
+    def stream_one(index: int) -> str:
+        handler = QuietEventHandler(None, user, session_factory=no_session)
+        with client.beta.threads.runs.stream(
+            thread_id=f"thread_{index}",
+            assistant_id="asst_fake",
+            event_handler=handler,
+        ) as stream:
+            text = "".join(stream.text_deltas)
+            stream.until_done()
+        return text
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=STARLETTE_THREADPOOL_SIZE) as executor:
+        list(executor.map(stream_one, range(streams)))
+    return time.perf_counter() - start
+
+
+async def run_async(client: AsyncOpenAI, user: User, streams: int) -> float:
+    async def stream_one(index: int) -> str:
+        handler = QuietAsyncEventHandler(user, session_factory=no_session)
+        async with client.beta.threads.runs.stream(
+            thread_id=f"thread_{index}",
+            assistant_id="asst_fake",
+            event_handler=handler,
+        ) as stream:
+            text = "".join([delta async for delta in stream.text_deltas])
+            await stream.until_done()
+        return text
+
+    start = time.perf_counter()
+    await asyncio.gather(*[stream_one(index) for index in range(streams)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async chat streaming benchmark")
+    parser.add_argument("--streams", type=int, default=200, help="Concurrent conversations")
+    parser.add_argument("--delta-delay", type=float, default=0.02, help="Seconds between deltas")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FakeAssistantsServer(port=args.port, delta_delay=args.delta_delay).start()
+    user = User(id=1, username="benchmark", email="benchmark@binna.app", hashed_password="")
+
+    try:
+        sync_client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+        async_client = AsyncOpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+
+        # Time of a single stream, the lower bound of both paths
+        single_stream = run_sync(sync_client, user, 1)
+
+        sync_elapsed = run_sync(sync_client, user, args.streams)
+        async_elapsed = asyncio.run(run_async(async_client, user, args.streams))
+    finally:
+        server.stop()
+
+    print(f"Concurrent streams: {args.streams} (single stream: {single_stream:.2f}s)")
+    for name, elapsed in (("sync (40 threads)", sync_elapsed), ("async", async_elapsed)):
+        print(f"{name:>18}: {elapsed:6.2f}s total, {args.streams / elapsed:7.1f} streams/s")
+
+
+if __name__ == "__main__":
+    main()
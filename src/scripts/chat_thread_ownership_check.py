@@ -0,0 +1,147 @@
+"""
+Check who can use a thread id (`ThreadManager.__get_user_thread_id`) against a local fake
+Assistants server: a thread missing from the registry is only registered for the user named as
+its owner in the thread metadata, and a thread registered by a concurrent request is never
+taken over by another user.
+
+Usage:
+    python -m src.scripts.chat_thread_ownership_check
+"""
+import os
+import sys
+import tempfile
+
+PORT = 8770
+
+# Point the OpenAI clients to the fake server before they are created on import
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "check")
+
+from sqlmodel import Session
+from src.scripts.fake_assistants_server import FakeAssistantsServer
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+def create_user(database, username: str):
+    from src.domains.auth.models import User
+
+    with Session(database.engine) as db:
+        user = User(username=username, email=f"{username}@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+def open_thread(database, thread_id: str, user) -> str:
+    """
+    ID of the thread resolved for the user, or the name of the exception raised
+    """
+    from src.domains.openai_integration.thread_manager import ThreadManager
+
+    try:
+        return ThreadManager(
+            thread_id, None, user, session_factory=database.session_factory
+        ).thread_id
+    except Exception as error:
+        return type(error).__name__
+
+
+def get_owner_id(database, thread_id: str):
+    from src.domains.chat.controllers.chat_thread_controller import ChatThreadController
+
+    with Session(database.engine) as db:
+        chat_thread = ChatThreadController.get_thread(db, thread_id)
+        return chat_thread.user_id if chat_thread else None
+
+
+def register(database, user, thread_id: str) -> str:
+    from src.domains.chat.controllers.chat_thread_controller import ChatThreadController
+
+    with database.session_factory() as db:
+        try:
+            return str(ChatThreadController.register_thread(db, user.id, thread_id).user_id)
+        except Exception as error:
+            return type(error).__name__
+
+
+def main():
+    server = FakeAssistantsServer(port=PORT).start()
+    try:
+        from src.database.database import Database
+        from src.domains.openai_integration.openai_integration import openai
+        from src.domains.openai_integration.thread_manager import (
+            ThreadManager, THREAD_OWNER_METADATA_KEY
+        )
+
+        database = Database(os.path.join(tempfile.mkdtemp(), "check.db"))
+        database.migrate()
+        owner = create_user(database, "owner")
+        stranger = create_user(database, "stranger")
+
+        print("New threads")
+        thread_id = ThreadManager(
+            None, None, owner, session_factory=database.session_factory
+        ).thread_id
+        metadata = openai.beta.threads.retrieve(thread_id).metadata
+        check(
+            "the owner is stored in the thread metadata",
+            metadata.get(THREAD_OWNER_METADATA_KEY) == str(owner.id),
+            f"{metadata}"
+        )
+        check(
+            "another user can't open it",
+            open_thread(database, thread_id, stranger) == "ThreadNotFoundException"
+        )
+
+        print("Threads missing from the registry")
+        openai.beta.threads.update(
+            "thread_unregistered", metadata={THREAD_OWNER_METADATA_KEY: str(owner.id)}
+        )
+        check(
+            "another user can't claim it",
+            open_thread(database, "thread_unregistered", stranger) == "ThreadNotFoundException"
+            and get_owner_id(database, "thread_unregistered") is None
+        )
+        check(
+            "the owner named in the metadata can open it, and it is registered",
+            open_thread(database, "thread_unregistered", owner) == "thread_unregistered"
+            and get_owner_id(database, "thread_unregistered") == owner.id
+        )
+        check(
+            "a thread with no owner in its metadata is rejected",
+            open_thread(database, "thread_no_owner", owner) == "ThreadNotFoundException"
+            and get_owner_id(database, "thread_no_owner") is None
+        )
+
+        print("Threads registered by a concurrent request")
+        result = register(database, owner, "thread_unregistered")
+        check("registering it again for its owner returns it", result == str(owner.id), result)
+        result = register(database, stranger, "thread_unregistered")
+        check(
+            "registering it for another user is rejected",
+            result == "ThreadNotFoundException" and get_owner_id(
+                database, "thread_unregistered"
+            ) == owner.id,
+            result
+        )
+    finally:
+        server.stop()
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure the OpenAI requests and the latency of a chat turn (`ThreadManager.astream_response`)
+against a local fake Assistants server.
+
+Usage:
+    python -m src.scripts.chat_turn_benchmark [--turns 20] [--with-tools]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from src.scripts.fake_assistants_server import FakeAssistantsServer
+
+PORT = 8766
+ID_PREFIXES = ("thread_", "run_", "msg_", "asst_")
+
+# Point the OpenAI clients to the fake server before they are created on import
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+
+def create_user(database):
+    from sqlmodel import Session
+    from src.domains.auth.models import User, UserUsageLimit
+
+    with Session(database.engine) as db:
+        user = User(username="benchmark", email="benchmark@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        db.add(UserUsageLimit(
+            user_id=user.id,
+            max_total_tokens_usage=10_000_000,
+            start_period_date=datetime.now() - timedelta(days=1),
+            finish_period_date=datetime.now() + timedelta(days=1),
+        ))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+async def run_turns(thread_manager, turns: int) -> list[float]:
+    latencies = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        async for _ in thread_manager.astream_response(f"Mensaje de prueba {turn}"):
+            pass
+        latencies.append(time.perf_counter() - start)
+
+    # The rolling summaries of the thread are refreshed in the background
+    from src.domains.openai_integration.thread_manager import context_summary_tasks
+    await asyncio.gather(*context_summary_tasks.values())
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI requests and latency per chat turn")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--delta-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--with-tools", action="store_true", help="Every turn runs a round of read-only tools"
+    )
+    args = parser.parse_args()
+
+    tool_calls = [{"name": "get_all_customer"}, {"name": "get_all_tasks"}] if args.with_tools else None
+    server = FakeAssistantsServer(
+        port=PORT, delta_delay=args.delta_delay, tool_calls=tool_calls
+    ).start()
+
+    try:
+        from src.database.database import Database
+        from src.domains.openai_integration.thread_manager import ThreadManager
+
+        database = Database(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+        database.migrate()
+        user = create_user(database)
+
+        thread_manager = ThreadManager(None, None, user, session_factory=database.session_factory)
+        server.reset_calls()
+
+        latencies = asyncio.run(run_turns(thread_manager, args.turns))
+        calls = server.fetch_calls()
+    finally:
+        server.stop()
+
+    print(f"Turns: {args.turns}")
+    print(f"OpenAI requests per turn: {len(calls) / args.turns:.1f}")
+    for (method, path), count in Counter(
+        (method, "/".join(
+            "{id}" if part.startswith(ID_PREFIXES) else part for part in path.split("/")
+        ))
+        for method, path in calls
+    ).most_common():
+        print(f"  {count / args.turns:4.1f} x {method} /{path}")
+    print(f"Average turn latency: {sum(latencies) / len(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
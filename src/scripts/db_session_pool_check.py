@@ -0,0 +1,254 @@
+"""
+Check that the chat pipeline doesn't hold DB connections while it waits for OpenAI: concurrent
+chat turns (with a batch of read-only tools each), legacy threads registered and backfilled on
+first use, rolling summaries and the assistant config sync run against a local fake Assistants
+server that answers every request after a delay.
+
+Every checkout of the pool is recorded. The check fails if the tool batches hold more
+connections than the tool calls in flight, or if a connection is held for as long as an OpenAI
+request takes (it was open around one).
+
+Usage:
+    python -m src.scripts.db_session_pool_check [--threads 6] [--turns 4]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from src.scripts.fake_assistants_server import FakeAssistantsServer
+
+PORT = 8768
+OPENAI_DELAY_SECONDS = 0.3
+# A connection held this long was open around an OpenAI request
+MAX_HOLD_SECONDS = OPENAI_DELAY_SECONDS / 2
+TOOL_CALLS = [{"name": "get_all_customer"}, {"name": "get_all_tasks"}]
+
+# Point the OpenAI clients to the fake server before they are created on import, and summarize
+# the threads every few turns
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ["CHAT_CONTEXT_LAST_MESSAGES"] = "4"
+os.environ["CHAT_CONTEXT_SUMMARY_INTERVAL"] = "2"
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "check")
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+class PoolMonitor:
+    """
+    Connections checked out of the pool, the tool calls in flight and how long every
+    connection was held, split between tool batches and the rest of the pipeline
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.tool_calls_in_flight = 0
+        self.tool_connections = 0
+        self.connections = 0
+        self.peak_connections = 0
+        self.peak_tool_calls = 0
+        self.excess_tool_connections = []
+        self.checkouts: dict[int, tuple[float, bool]] = {}
+        self.hold_seconds = {True: [], False: []}
+
+    def is_tool_thread(self) -> bool:
+        # Read-only tools of a batch run in the tool executor
+        return getattr(self.local, "in_tool_batch", False) or \
+            threading.current_thread().name.startswith("binna-tool")
+
+    def watch(self, engine, tool_runner_class):
+        from sqlalchemy import event
+
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+
+        run_tool_calls_timed = tool_runner_class.run_tool_calls_timed
+        monitor = self
+
+        def monitored_run_tool_calls_timed(tool_runner, tool_calls):
+            with monitor.lock:
+                monitor.tool_calls_in_flight += len(tool_calls)
+                monitor.peak_tool_calls = max(monitor.peak_tool_calls, monitor.tool_calls_in_flight)
+            monitor.local.in_tool_batch = True
+            try:
+                return run_tool_calls_timed(tool_runner, tool_calls)
+            finally:
+                monitor.local.in_tool_batch = False
+                with monitor.lock:
+                    monitor.tool_calls_in_flight -= len(tool_calls)
+
+        tool_runner_class.run_tool_calls_timed = monitored_run_tool_calls_timed
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        is_tool = self.is_tool_thread()
+        with self.lock:
+            self.checkouts[id(connection_record)] = (time.perf_counter(), is_tool)
+            self.connections += 1
+            self.peak_connections = max(self.peak_connections, self.connections)
+            if is_tool:
+                self.tool_connections += 1
+                if self.tool_connections > self.tool_calls_in_flight:
+                    self.excess_tool_connections.append(
+                        (self.tool_connections, self.tool_calls_in_flight)
+                    )
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            checkout = self.checkouts.pop(id(connection_record), None)
+            if checkout is None:
+                return
+            checked_out_at, is_tool = checkout
+            self.hold_seconds[is_tool].append(time.perf_counter() - checked_out_at)
+            self.connections -= 1
+            if is_tool:
+                self.tool_connections -= 1
+
+
+def create_user(database):
+    from sqlmodel import Session
+    from src.domains.auth.models import User, UserUsageLimit
+
+    with Session(database.engine) as db:
+        user = User(username="check", email="check@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        db.add(UserUsageLimit(
+            user_id=user.id,
+            max_total_tokens_usage=10_000_000,
+            start_period_date=datetime.now() - timedelta(days=1),
+            finish_period_date=datetime.now() + timedelta(days=1),
+        ))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+async def chat(database, user, thread_number: int, turns: int):
+    from src.domains.chat import controller as chat_controller
+    from src.domains.openai_integration.openai_integration import async_openai
+    from src.domains.openai_integration.thread_manager import ThreadManager, THREAD_OWNER_METADATA_KEY
+
+    # Even threads are created by /chat/create. Odd threads are missing from the registry: found
+    # on OpenAI (owned by the user according to their metadata), registered and backfilled by
+    # /chat/retrieve.
+    if thread_number % 2:
+        thread_id = f"thread_legacy_{thread_number}"
+        await async_openai.beta.threads.update(
+            thread_id, metadata={THREAD_OWNER_METADATA_KEY: str(user.id)}
+        )
+        await asyncio.to_thread(
+            chat_controller.retrieve_messages, thread_id, user, database.session_factory, 20
+        )
+    else:
+        thread_id = await asyncio.to_thread(
+            chat_controller.create_thread, user, database.session_factory
+        )
+    thread_manager = await asyncio.to_thread(
+        ThreadManager, thread_id, None, user, session_factory=database.session_factory
+    )
+
+    for turn in range(turns):
+        async for _ in thread_manager.astream_response(f"Mensaje {turn} del hilo {thread_number}"):
+            pass
+
+
+async def run_chats(database, user, threads: int, turns: int):
+    from src.domains.openai_integration.thread_manager import context_summary_tasks
+
+    await asyncio.gather(*(chat(database, user, number, turns) for number in range(threads)))
+    await asyncio.gather(*context_summary_tasks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB connections held while waiting for OpenAI")
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeAssistantsServer(port=PORT, delta_delay=0.01, tool_calls=TOOL_CALLS).start()
+    try:
+        from src.database.database import Database
+        from src.domains.openai_integration.assistant_sync import sync_assistant_config
+        from src.domains.openai_integration.event_handler import ToolCallRunner
+
+        database = Database(os.path.join(tempfile.mkdtemp(), "check.db"))
+        database.migrate()
+        user = create_user(database)
+
+        monitor = PoolMonitor()
+        monitor.watch(database.engine, ToolCallRunner)
+        server.set_faults(delay=OPENAI_DELAY_SECONDS)
+
+        start = time.perf_counter()
+        sync_assistant_config(database.session_factory)
+        asyncio.run(run_chats(database, user, args.threads, args.turns))
+        elapsed = time.perf_counter() - start
+        calls = server.fetch_calls()
+    finally:
+        server.stop()
+
+    def count_calls(method: str, path_end: str) -> int:
+        return sum(1 for call in calls if call[0] == method and call[1].endswith(path_end))
+
+    tool_holds = monitor.hold_seconds[True]
+    other_holds = monitor.hold_seconds[False]
+    print(
+        f"{args.threads} threads x {args.turns} turns in {elapsed:.1f}s, "
+        f"OpenAI answers after {OPENAI_DELAY_SECONDS}s"
+    )
+    print(
+        f"  connections: peak {monitor.peak_connections}, "
+        f"{len(tool_holds)} checkouts by tools (peak {monitor.peak_tool_calls} tool calls "
+        f"in flight), {len(other_holds)} by the rest of the pipeline"
+    )
+
+    check(
+        "the pipeline exercised every OpenAI call made around a DB session",
+        all((
+            count_calls("GET", "assistants/check") or count_calls("GET", "assistants/asst_fake"),
+            count_calls("GET", "threads/thread_legacy_1"),
+            count_calls("GET", "thread_legacy_1/messages"),
+            count_calls("POST", "chat/completions"),
+        )),
+        f"{count_calls('POST', 'chat/completions')} summaries"
+    )
+    check(
+        "tool batches never hold more connections than tool calls in flight",
+        not monitor.excess_tool_connections and monitor.connections == 0,
+        f"{len(monitor.excess_tool_connections)} excess checkouts, "
+        f"{monitor.connections} left checked out"
+    )
+    check(
+        f"tool connections are released before {MAX_HOLD_SECONDS}s",
+        max(tool_holds, default=0) < MAX_HOLD_SECONDS,
+        f"max {max(tool_holds, default=0) * 1000:.1f} ms"
+    )
+    check(
+        "no connection is held across an OpenAI request",
+        max(other_holds, default=0) < MAX_HOLD_SECONDS,
+        f"max {max(other_holds, default=0) * 1000:.1f} ms"
+    )
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
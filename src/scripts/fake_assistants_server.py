@@ -0,0 +1,354 @@
+"""
+Minimal fake of the OpenAI Assistants API, used by the benchmark scripts to exercise the chat
+pipeline locally without network access or token spend.
+
+It implements just what `ThreadManager` uses: assistant/thread retrieval, messages, streamed
+runs (plain text or a `requires_action` round) and the chat completions of the thread
+summaries. The server runs in its own process so it doesn't compete with the benchmarked code
+for the GIL. Every request is recorded and can be read back with `fetch_calls`. Latency and
+error responses can be injected with `set_faults`.
+
+Usage:
+    server = FakeAssistantsServer(port=8765, delta_delay=0.02).start()
+    client = OpenAI(api_key="fake", base_url=server.base_url)
+    ...
+    server.stop()
+"""
+import asyncio
+import json
+import multiprocessing
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+DEFAULT_ANSWER = "Hola! Soy Binna, tu asistente de ventas. ¿En qué te puedo ayudar hoy?"
+DEFAULT_USAGE = {
+    "prompt_tokens": 1200,
+    "completion_tokens": 40,
+    "total_tokens": 1240,
+    "prompt_token_details": {"cached_tokens": 1024},
+}
+DEFAULT_SUMMARY = "Resumen: el usuario habló de sus clientes y pidió seguimiento."
+SUMMARY_USAGE = {"prompt_tokens": 600, "completion_tokens": 30, "total_tokens": 630}
+
+
+def _sse(event: str, data) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class FakeAssistantsServer:
+    def __init__(
+        self,
+        port: int = 8765,
+        delta_delay: float = 0.02,
+        answer: str = DEFAULT_ANSWER,
+        chunk_size: int = 3,
+        tool_calls: Optional[list[dict]] = None,
+        usage: Optional[dict] = None,
+    ):
+        """
+        Args:
+            port (int): local port to listen on
+            delta_delay (float): seconds between two text deltas, emulates model generation
+            answer (str): text streamed back on every run
+            chunk_size (int): characters per text delta
+            tool_calls (Optional[list[dict]]): `{"name": ..., "arguments": {...}}` items. When
+                given, every new run first stops in `requires_action` with those calls.
+            usage (Optional[dict]): usage reported by completed runs
+        """
+        self.port = port
+        self.delta_delay = delta_delay
+        self.answer = answer
+        self.chunk_size = chunk_size
+        self.tool_calls = tool_calls or []
+        self.usage = usage or DEFAULT_USAGE
+        self.calls: list[tuple[str, str]] = []
+        self.runs: dict[str, str] = {}
+        self.assistant_metadata: dict[str, str] = {}
+        self.thread_metadata: dict[str, dict[str, str]] = {}
+        # Injected faults: delay before every answer, and error status of the next requests
+        self.fault_delay = 0.0
+        self.fault_status: Optional[int] = None
+        self.fault_count = 0
+        self.fault_retry_after: Optional[float] = None
+        self.process: Optional[multiprocessing.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def serve(self):
+        """
+        Run the server in the current process (blocking)
+        """
+        app = Starlette(routes=[
+            Route("/_calls", self.handle_calls, methods=["GET", "DELETE"]),
+            Route("/_faults", self.handle_faults, methods=["POST"]),
+            Route("/v1/{path:path}", self.handle, methods=["GET", "POST", "DELETE"]),
+        ])
+        uvicorn.run(app, host="127.0.0.1", port=self.port, log_level="warning")
+
+    def start(self) -> "FakeAssistantsServer":
+        self.process = multiprocessing.Process(target=self.serve, daemon=True)
+        self.process.start()
+
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{self.port}/_calls")
+                return self
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Fake Assistants server didn't start")
+                time.sleep(0.05)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.join()
+
+    def fetch_calls(self) -> list[tuple[str, str]]:
+        """
+        Requests received by the server as `(method, path)` tuples
+        """
+        response = httpx.get(f"http://127.0.0.1:{self.port}/_calls")
+        return [tuple(call) for call in response.json()]
+
+    def reset_calls(self):
+        httpx.delete(f"http://127.0.0.1:{self.port}/_calls")
+
+    def set_faults(
+        self,
+        delay: float = 0.0,
+        status: Optional[int] = None,
+        count: int = -1,
+        retry_after: Optional[float] = None
+    ):
+        """
+        Inject faults in the next requests. Call it without arguments to remove them.
+
+        Args:
+            delay (float): seconds to wait before answering every request
+            status (Optional[int]): error status answered instead of the normal response
+            count (int): requests answered with `status`, -1 for every request
+            retry_after (Optional[float]): seconds sent in the `retry-after-ms` header of the
+                error responses
+        """
+        httpx.post(
+            f"http://127.0.0.1:{self.port}/_faults",
+            json={"delay": delay, "status": status, "count": count, "retry_after": retry_after}
+        )
+
+    async def handle_faults(self, request: Request):
+        faults = await request.json()
+        self.fault_delay = faults["delay"]
+        self.fault_status = faults["status"]
+        self.fault_count = faults["count"]
+        self.fault_retry_after = faults["retry_after"]
+        return JSONResponse(faults)
+
+    async def handle_calls(self, request: Request):
+        if request.method == "DELETE":
+            self.calls.clear()
+        return JSONResponse(self.calls)
+
+    def _run(self, run_id: str, thread_id: str, status: str, **kwargs) -> dict:
+        return {
+            "id": run_id,
+            "object": "thread.run",
+            "assistant_id": "asst_fake",
+            "thread_id": thread_id,
+            "status": status,
+            "created_at": int(time.time()),
+            "instructions": "",
+            "model": "gpt-4o-mini",
+            "tools": [],
+            "parallel_tool_calls": True,
+            "metadata": {},
+            "usage": None,
+            **kwargs,
+        }
+
+    def _thread(self, thread_id: str) -> dict:
+        return {
+            "id": thread_id,
+            "object": "thread",
+            "created_at": int(time.time()),
+            "metadata": self.thread_metadata.get(thread_id, {}),
+            "tool_resources": None,
+        }
+
+    def _message(self, message_id: str, thread_id: str, role: str, text: str, **kwargs) -> dict:
+        return {
+            "id": message_id,
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}] if text else [],
+            "status": "completed",
+            "attachments": [],
+            "metadata": {},
+            **kwargs,
+        }
+
+    async def _stream_run(self, run_id: str, thread_id: str, ask_for_tools: bool):
+        yield _sse("thread.run.created", self._run(run_id, thread_id, "queued"))
+        yield _sse("thread.run.in_progress", self._run(run_id, thread_id, "in_progress"))
+
+        if ask_for_tools and self.tool_calls:
+            self.runs[run_id] = "requires_action"
+            tool_calls = [
+                {
+                    "id": f"call_{index}",
+                    "type": "function",
+                    "function": {
+                        "name": tool_call["name"],
+                        "arguments": json.dumps(tool_call.get("arguments", {})),
+                    },
+                }
+                for index, tool_call in enumerate(self.tool_calls)
+            ]
+            yield _sse("thread.run.requires_action", self._run(
+                run_id, thread_id, "requires_action",
+                required_action={
+                    "type": "submit_tool_outputs",
+                    "submit_tool_outputs": {"tool_calls": tool_calls},
+                }
+            ))
+            yield _sse("done", "[DONE]")
+            return
+
+        message_id = f"msg_{uuid.uuid4().hex[:12]}"
+        yield _sse("thread.message.created", self._message(
+            message_id, thread_id, "assistant", "", status="in_progress", run_id=run_id
+        ))
+        for start in range(0, len(self.answer), self.chunk_size):
+            await asyncio.sleep(self.delta_delay)
+            yield _sse("thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{
+                    "index": 0,
+                    "type": "text",
+                    "text": {"value": self.answer[start:start + self.chunk_size], "annotations": []},
+                }]},
+            })
+        yield _sse("thread.message.completed", self._message(
+            message_id, thread_id, "assistant", self.answer, run_id=run_id
+        ))
+
+        self.runs[run_id] = "completed"
+        yield _sse("thread.run.completed", self._run(
+            run_id, thread_id, "completed", usage=self.usage
+        ))
+        yield _sse("done", "[DONE]")
+
+    async def handle(self, request: Request):
+        path = request.path_params["path"].strip("/")
+        self.calls.append((request.method, path))
+        parts = path.split("/")
+        body = await request.json() if request.method == "POST" and await request.body() else {}
+
+        if self.fault_delay:
+            await asyncio.sleep(self.fault_delay)
+        if self.fault_status and self.fault_count != 0:
+            self.fault_count -= 1
+            headers = {}
+            if self.fault_retry_after is not None:
+                headers["retry-after-ms"] = str(int(self.fault_retry_after * 1000))
+            return JSONResponse(
+                {"error": {"message": "Injected failure"}},
+                status_code=self.fault_status,
+                headers=headers
+            )
+
+        if parts[0] == "assistants":
+            if request.method == "POST" and "metadata" in body:
+                self.assistant_metadata = body["metadata"]
+            return JSONResponse({
+                "id": parts[1] if len(parts) > 1 else "asst_fake",
+                "object": "assistant",
+                "created_at": 0,
+                "model": "gpt-4o-mini",
+                "tools": [],
+                "metadata": self.assistant_metadata,
+            })
+
+        if parts[:2] == ["chat", "completions"]:
+            # Answers after the generation time of a short text
+            await asyncio.sleep(self.delta_delay * len(DEFAULT_SUMMARY) / self.chunk_size)
+            return JSONResponse({
+                "id": f"chatcmpl_{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": DEFAULT_SUMMARY},
+                }],
+                "usage": SUMMARY_USAGE,
+            })
+
+        if parts[0] != "threads":
+            return JSONResponse({"error": {"message": "Not found"}}, status_code=404)
+
+        if len(parts) == 1 or parts[1] == "runs":
+            # POST /threads and POST /threads/runs (create thread and run)
+            thread_id = f"thread_{uuid.uuid4().hex[:12]}"
+            self.thread_metadata[thread_id] = body.get("metadata") or {}
+            return JSONResponse(self._thread(thread_id))
+
+        thread_id = parts[1]
+        if len(parts) == 2:
+            if request.method == "DELETE":
+                self.thread_metadata.pop(thread_id, None)
+                return JSONResponse({"id": thread_id, "object": "thread.deleted", "deleted": True})
+            if request.method == "POST" and "metadata" in body:
+                self.thread_metadata[thread_id] = body["metadata"]
+            return JSONResponse(self._thread(thread_id))
+
+        if parts[2] == "messages":
+            if request.method == "POST":
+                return JSONResponse(self._message(
+                    f"msg_{uuid.uuid4().hex[:12]}", thread_id, "user", body.get("content", "")
+                ))
+            return JSONResponse({
+                "object": "list", "data": [], "first_id": None, "last_id": None, "has_more": False
+            })
+
+        if parts[2] == "runs":
+            if len(parts) == 3:
+                run_id = f"run_{uuid.uuid4().hex[:12]}"
+                return StreamingResponse(
+                    self._stream_run(run_id, thread_id, ask_for_tools=True),
+                    media_type="text/event-stream"
+                )
+
+            run_id = parts[3]
+            if len(parts) == 5 and parts[4] == "submit_tool_outputs":
+                return StreamingResponse(
+                    self._stream_run(run_id, thread_id, ask_for_tools=False),
+                    media_type="text/event-stream"
+                )
+            if len(parts) == 5 and parts[4] == "cancel":
+                self.runs[run_id] = "cancelled"
+                return JSONResponse(self._run(run_id, thread_id, "cancelling"))
+
+            status = self.runs.get(run_id, "completed")
+            return JSONResponse(self._run(
+                run_id, thread_id, status,
+                usage=self.usage if status in ("completed", "cancelled") else None
+            ))
+
+        return JSONResponse({"error": {"message": "Not found"}}, status_code=404)
@@ -0,0 +1,219 @@
+"""
+Check the OpenAI HTTP client (`http_client.py`) against a local fake Assistants server that
+injects latency and 5xx responses: which requests are retried, that retries and timeouts are
+bounded, and that the circuit breaker fails fast and recovers.
+
+Usage:
+    python -m src.scripts.openai_client_resilience_check
+"""
+import asyncio
+import os
+import sys
+import time
+
+from src.scripts.fake_assistants_server import FakeAssistantsServer
+
+PORT = 8767
+MAX_RETRIES = 2
+READ_TIMEOUT = 0.3
+FAILURE_THRESHOLD = 3
+RESET_SECONDS = 0.5
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+# Short backoff, so the check runs in a few seconds
+os.environ["OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS"] = "0.02"
+os.environ["OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS"] = "0.1"
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from src.domains.openai_integration.http_client import (
+    CircuitBreaker, OpenAIUnavailableException, ensure_openai_available,
+    make_async_openai_client, make_openai_client, openai_circuit_breaker
+)
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+def make_clients(server: FakeAssistantsServer):
+    circuit_breaker = CircuitBreaker(FAILURE_THRESHOLD, RESET_SECONDS)
+    timeout = httpx.Timeout(READ_TIMEOUT, connect=READ_TIMEOUT)
+    client = make_openai_client(circuit_breaker, timeout, MAX_RETRIES, server.base_url)
+    async_client = make_async_openai_client(circuit_breaker, timeout, MAX_RETRIES, server.base_url)
+    return circuit_breaker, client, async_client
+
+
+def count_calls(server: FakeAssistantsServer) -> int:
+    calls = len(server.fetch_calls())
+    server.reset_calls()
+    return calls
+
+
+def call(function) -> tuple[float, Exception | None]:
+    start = time.perf_counter()
+    try:
+        function()
+        error = None
+    except Exception as exception:
+        error = exception
+    return time.perf_counter() - start, error
+
+
+def check_retries(server: FakeAssistantsServer):
+    print("Retries")
+    _, client, async_client = make_clients(server)
+
+    server.set_faults(status=503, count=2)
+    _, error = call(lambda: client.beta.threads.retrieve("thread_1"))
+    check("GET succeeds after two 503", error is None and count_calls(server) == 3, repr(error))
+
+    server.set_faults(status=503, count=2)
+    try:
+        asyncio.run(async_client.beta.threads.retrieve("thread_1"))
+        error = None
+    except Exception as exception:
+        error = exception
+    check("async GET succeeds after two 503", error is None and count_calls(server) == 3, repr(error))
+
+    server.set_faults(status=500, count=1)
+    _, error = call(lambda: client.beta.threads.create())
+    check(
+        "POST isn't retried on 500",
+        isinstance(error, APIStatusError) and count_calls(server) == 1,
+        repr(error)
+    )
+
+    server.set_faults(status=429, count=1)
+    _, error = call(lambda: client.beta.threads.create())
+    check("POST is retried on 429", error is None and count_calls(server) == 2, repr(error))
+
+    # The backoff of the first retry is at most 0.02s
+    server.set_faults(status=429, count=1, retry_after=0.08)
+    elapsed, error = call(lambda: client.beta.threads.create())
+    check(
+        "the retry waits the Retry-After of a 429",
+        error is None and count_calls(server) == 2 and elapsed >= 0.08,
+        f"{elapsed * 1000:.0f} ms"
+    )
+
+    server.set_faults(status=429, count=1, retry_after=30)
+    elapsed, error = call(lambda: client.beta.threads.create())
+    check(
+        "Retry-After is capped to the max retry delay",
+        error is None and count_calls(server) == 2 and elapsed < 1,
+        f"{elapsed * 1000:.0f} ms"
+    )
+
+    server.set_faults(status=503)
+    _, error = call(lambda: client.beta.threads.retrieve("thread_1"))
+    check(
+        f"GET retries are bounded to {MAX_RETRIES}",
+        isinstance(error, APIStatusError) and count_calls(server) == 1 + MAX_RETRIES,
+        repr(error)
+    )
+    server.set_faults()
+
+
+def check_timeouts(server: FakeAssistantsServer):
+    print("Timeouts")
+    _, client, _ = make_clients(server)
+
+    server.set_faults(delay=READ_TIMEOUT * 3)
+    elapsed, error = call(lambda: client.beta.threads.create())
+    check(
+        f"slow POST times out after {READ_TIMEOUT}s",
+        isinstance(error, APITimeoutError) and elapsed < READ_TIMEOUT * 2,
+        f"{elapsed:.2f}s, {count_calls(server)} calls"
+    )
+
+    # New breaker, the timeout of the POST counts as a failure
+    _, client, _ = make_clients(server)
+    elapsed, error = call(lambda: client.beta.threads.retrieve("thread_1"))
+    check(
+        "slow GET is retried and then times out",
+        isinstance(error, APITimeoutError) and elapsed < READ_TIMEOUT * (MAX_RETRIES + 2),
+        f"{elapsed:.2f}s, {count_calls(server)} calls"
+    )
+    server.set_faults()
+
+
+def check_circuit_breaker(server: FakeAssistantsServer):
+    print("Circuit breaker")
+    circuit_breaker, client, _ = make_clients(server)
+
+    server.set_faults(status=500)
+    for _ in range(FAILURE_THRESHOLD):
+        call(lambda: client.beta.threads.create())
+    count_calls(server)
+    check(
+        f"opens after {FAILURE_THRESHOLD} failures",
+        circuit_breaker.state == CircuitBreaker.OPEN,
+        circuit_breaker.state
+    )
+
+    elapsed, error = call(lambda: client.beta.threads.create())
+    check(
+        "fails fast while open",
+        isinstance(error, APIConnectionError) and elapsed < 0.05 and count_calls(server) == 0,
+        f"{elapsed * 1000:.1f} ms"
+    )
+
+    server.set_faults()
+    time.sleep(RESET_SECONDS)
+    _, error = call(lambda: client.beta.threads.create())
+    check(
+        "closes after a successful probe",
+        error is None and circuit_breaker.state == CircuitBreaker.CLOSED,
+        circuit_breaker.state
+    )
+
+    server.set_faults(delay=READ_TIMEOUT * 3)
+    for _ in range(FAILURE_THRESHOLD):
+        call(lambda: client.beta.threads.create())
+    check(
+        "timeouts open it too",
+        circuit_breaker.state == CircuitBreaker.OPEN,
+        circuit_breaker.state
+    )
+    server.set_faults()
+    count_calls(server)
+
+    # The shared breaker of the app makes /chat/send and /chat/create answer 503 at once
+    for _ in range(openai_circuit_breaker.failure_threshold):
+        openai_circuit_breaker.record_failure()
+    try:
+        ensure_openai_available()
+        error = None
+    except OpenAIUnavailableException as exception:
+        error = exception
+    check(
+        "chat requests are rejected while the app breaker is open",
+        error is not None and error.retry_after > 0,
+        f"retry after {error.retry_after}s" if error else "not rejected"
+    )
+    openai_circuit_breaker.record_success()
+
+
+def main():
+    server = FakeAssistantsServer(port=PORT).start()
+    try:
+        check_retries(server)
+        check_timeouts(server)
+        check_circuit_breaker(server)
+    finally:
+        server.stop()
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
-from openai import OpenAI, AssistantEventHandler
+from openai import AssistantEventHandler
 from typing_extensions import override
 import json
-from src.domains.openai_integration.openai_integration import OPENAI_API_KEY, OPENAI_ASSISTANT_KEY
+from src.domains.openai_integration.http_client import make_openai_client
+from src.utils.settings import OPENAI_ASSISTANT_KEY
 
 # Create an instance of the OpenAI class
-openai = OpenAI(api_key=OPENAI_API_KEY)
+openai = make_openai_client()
 thread = openai.beta.threads.create()
 assistant = openai.beta.assistants.retrieve(OPENAI_ASSISTANT_KEY or "NOT_FOUND")
 
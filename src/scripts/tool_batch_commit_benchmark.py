@@ -0,0 +1,111 @@
+"""
+Commits and latency of a batch of mutating tool calls on a SQLite file: a commit per
+controller call (plain sessions) against one transaction per batch (`UnitOfWorkSession`).
+
+Every batch registers 5 contacts and 3 tasks, like a pasted meeting summary.
+
+Usage:
+    python -m src.scripts.tool_batch_commit_benchmark [--batches 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from sqlalchemy import event
+from sqlmodel import Session
+from src.database.database import Database, UnitOfWorkSession
+from src.domains.auth.models import User
+from src.domains.customer.models import CustomerEstablishment
+from src.domains.openai_integration.event_handler import ToolCallRunner
+
+
+def create_user(database: Database) -> User:
+    with Session(database.engine) as db:
+        user = User(username="benchmark", email="benchmark@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        db.add(CustomerEstablishment(name="Cliente", description="d", industry="i", user_id=user.id))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+def make_tool_call(index: int, function_name: str, arguments: dict):
+    return SimpleNamespace(
+        id=f"call_{index}",
+        function=SimpleNamespace(name=function_name, arguments=json.dumps(arguments))
+    )
+
+
+def make_batch() -> list:
+    tool_calls = [
+        make_tool_call(index, "create_contact", {
+            "customer_id": 1, "name": f"Contacto {index}", "role": "Gerente",
+            "email": f"contacto{index}@cliente.cl", "phone": "+56912345678",
+        })
+        for index in range(5)
+    ]
+    tool_calls += [
+        make_tool_call(5 + index, "create_task", {
+            "customer_id": 1, "name": f"Tarea {index}", "description": "Enviar propuesta",
+            "due_date": "2024-11-05T10:00:00",
+        })
+        for index in range(3)
+    ]
+    return tool_calls
+
+
+def measure(runner: ToolCallRunner, commits: list, batches: int) -> tuple[float, list[float]]:
+    commits.clear()
+    latencies = []
+    for _ in range(batches):
+        start = time.perf_counter()
+        runner.run_tool_calls(make_batch())
+        latencies.append(time.perf_counter() - start)
+    return len(commits) / batches, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commits and latency per tool batch")
+    parser.add_argument("--batches", type=int, default=50)
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    database.migrate()
+    user = create_user(database)
+
+    commits = []
+    event.listen(database.engine, "commit", lambda connection: commits.append(1))
+
+    # Session factories open unit-of-work sessions, a shared plain session commits every tool
+    modes = {
+        "commit per tool": lambda: ToolCallRunner(Session(database.engine), user),
+        "transaction per batch": lambda: ToolCallRunner(
+            None, user, session_factory=lambda: UnitOfWorkSession(database.engine)
+        ),
+    }
+
+    print(f"Batches: {args.batches} of 8 mutating tools (SQLite file)")
+    for mode, make_runner in modes.items():
+        runner = make_runner()
+        commits_per_batch, latencies = measure(runner, commits, args.batches)
+        latencies.sort()
+        print(
+            f"  {mode:22} {commits_per_batch:4.1f} commits/batch  "
+            f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the dispatch overhead per tool call: the previous dispatch (`json.loads`,
+`inspect.signature` and a filtered kwargs dict on every call) against the precompiled
+dispatch table (validated and coerced arguments).
+
+The tool functions are replaced by a no-op, so only the dispatch is measured.
+
+Usage:
+    python -m src.scripts.tool_dispatch_benchmark [--calls 20000]
+"""
+import argparse
+import inspect
+import json
+import os
+import time
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from src.domains.openai_integration.openai_assistant import (
+    function_name_map, tool_dispatch_table, BinnaAssistantDescription
+)
+
+# (function name, raw arguments sent by the assistant)
+TOOL_CALLS = [
+    ("get_all_customer", "{}"),
+    ("get_customer_by_name", '{"name": "Panadería Don Pepe"}'),
+    ("create_task", json.dumps({
+        "customer_id": 12,
+        "name": "Enviar propuesta",
+        "description": "Enviar la propuesta comercial revisada",
+        "due_date": "2024-11-05T10:00:00",
+    })),
+    ("update_meet", json.dumps({
+        "task_id": 7,
+        "date": "2024-11-06T15:30:00",
+        "duration_minutes": 45,
+        "status": "confirmada",
+    })),
+]
+
+
+def noop(**kwargs):
+    return None
+
+
+def legacy_dispatch(function_name: str, raw_arguments: str, db, user_id: int):
+    arguments = json.loads(raw_arguments)
+    kwargs = {"db": db, "user_id": user_id, **arguments}
+
+    signature = inspect.signature(function_name_map[function_name])
+    expected_params = signature.parameters.keys()
+    filtered_args = {k: v for k, v in kwargs.items() if k in expected_params}
+
+    return noop(**filtered_args)
+
+
+def precompiled_dispatch(function_name: str, raw_arguments: str, db, user_id: int):
+    arguments = BinnaAssistantDescription.parse_tool_arguments(function_name, raw_arguments)
+    dispatch_entry = tool_dispatch_table[function_name]
+    context_arguments = {
+        name: value for name, value in {"db": db, "user_id": user_id}.items()
+        if name in dispatch_entry.context_parameters
+    }
+    return noop(**context_arguments, **arguments)
+
+
+def measure(dispatch, calls: int) -> float:
+    start = time.perf_counter()
+    for index in range(calls):
+        function_name, raw_arguments = TOOL_CALLS[index % len(TOOL_CALLS)]
+        dispatch(function_name, raw_arguments, None, 1)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatch overhead per tool call")
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Warm up
+    measure(legacy_dispatch, 1000)
+    measure(precompiled_dispatch, 1000)
+
+    legacy = measure(legacy_dispatch, args.calls)
+    precompiled = measure(precompiled_dispatch, args.calls)
+
+    print(f"Calls: {args.calls} ({len(TOOL_CALLS)} different tools)")
+    print(f"  legacy (inspect.signature per call): {legacy * 1e6:6.1f} us/call")
+    print(f"  precompiled (validated arguments):   {precompiled * 1e6:6.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Check that a failing tool is reported to the assistant the same way on every path of
+`ToolCallRunner.run_tool_calls`: read-only batches run concurrently (session factory) or one by
+one (shared session), and batches with mutating tools in one transaction. The failed call must
+get an "Error executing tool" output, the other calls their normal outputs, and nothing may
+raise into the stream.
+
+Usage:
+    python -m src.scripts.tool_error_check
+"""
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "check")
+
+from sqlmodel import Session
+from src.database.database import Database
+from src.domains.auth.models import User
+from src.domains.customer.models import CustomerEstablishment
+from src.domains.openai_integration.event_handler import ToolCallRunner
+from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+
+FAILING_TOOL = "get_all_tasks"
+
+failed_checks = []
+
+
+def check(name: str, passed: bool, detail: str = ""):
+    print(f"  {'OK  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not passed:
+        failed_checks.append(name)
+
+
+def create_user(database: Database) -> User:
+    with Session(database.engine) as db:
+        user = User(username="check", email="check@binna.app", hashed_password="")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        db.add(CustomerEstablishment(name="Cliente", description="d", industry="i", user_id=user.id))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+
+
+def make_tool_call(index: int, function_name: str, arguments: dict):
+    return SimpleNamespace(
+        id=f"call_{index}",
+        function=SimpleNamespace(name=function_name, arguments=json.dumps(arguments))
+    )
+
+
+def inject_tool_failure():
+    dispatch_tool = BinnaAssistantDescription.dispatch_tool
+
+    def failing_dispatch_tool(function_name: str, arguments: dict, **context):
+        if function_name == FAILING_TOOL:
+            raise RuntimeError("Injected tool failure")
+        return dispatch_tool(function_name, arguments, **context)
+
+    BinnaAssistantDescription.dispatch_tool = staticmethod(failing_dispatch_tool)
+
+
+def check_batch(name: str, runner: ToolCallRunner, tool_calls: list, expected_messages: list[str]):
+    print(name)
+    try:
+        tool_outputs = runner.run_tool_calls(tool_calls)
+    except Exception as error:
+        check("the batch doesn't raise", False, repr(error))
+        return
+    check("the batch doesn't raise", True)
+
+    messages = [json.loads(tool_output["output"])["message"] for tool_output in tool_outputs]
+    check(
+        "every tool call gets its output",
+        [tool_output["tool_call_id"] for tool_output in tool_outputs]
+        == [tool_call.id for tool_call in tool_calls]
+    )
+    check("the failure is reported in the outputs", messages == expected_messages, f"{messages}")
+
+
+def main():
+    database = Database(os.path.join(tempfile.mkdtemp(), "check.db"))
+    database.migrate()
+    user = create_user(database)
+    inject_tool_failure()
+
+    read_only_batch = [
+        make_tool_call(0, "get_all_customer", {}),
+        make_tool_call(1, FAILING_TOOL, {}),
+    ]
+    check_batch(
+        "Read-only batch, concurrent",
+        ToolCallRunner(None, user, session_factory=database.session_factory),
+        read_only_batch,
+        ["Successfully executed tool", "Error executing tool"]
+    )
+    with Session(database.engine) as db:
+        check_batch(
+            "Read-only batch, shared session",
+            ToolCallRunner(db, user),
+            read_only_batch,
+            ["Successfully executed tool", "Error executing tool"]
+        )
+    check_batch(
+        "Batch with mutations, one transaction",
+        ToolCallRunner(None, user, session_factory=database.session_factory),
+        [
+            make_tool_call(0, "create_task", {
+                "customer_id": 1, "name": "Tarea", "description": "Enviar propuesta",
+                "due_date": "2024-11-05T10:00:00",
+            }),
+            make_tool_call(1, FAILING_TOOL, {}),
+        ],
+        ["Rolled back, another tool of the batch failed", "Error executing tool"]
+    )
+
+    if failed_checks:
+        print(f"{len(failed_checks)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Size of the tool outputs sent to the assistant for a synthetic account with 1,000 customers
+(with contacts and notes): the previous serialization (`json.dumps(default=str)` of the whole
+models) against the compact one (whitelisted fields, no nulls, columnar lists) with and
+without the output budget.
+
+Usage:
+    python -m src.scripts.tool_output_size_benchmark [--customers 1000] [--max-bytes 12000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+for env_name in ("OPENAI_API_KEY", "OPENAI_ASSISTANT_KEY", "AUTH_SECRET_KEY", "AUTH_TOKEN_ALGORITHM"):
+    os.environ.setdefault(env_name, "benchmark")
+
+from sqlmodel import Session
+from src.database.database import Database
+from src.domains.auth.models import User
+from src.domains.customer.models import CustomerEstablishment, Contact, AdditionalNote
+from src.domains.openai_integration.openai_assistant import BinnaAssistantDescription
+from src.domains.openai_integration.tool_output_serializer import serialize_tool_output
+from src.utils.pagination import Page, MAX_PAGE_SIZE
+
+INDUSTRIES = ("Retail", "Alimentos", "Construcción", "Tecnología", None)
+ROLES = ("Gerente", "Dueño", "Encargado de compras", "Administrador")
+
+
+def create_account(database: Database, customers: int) -> int:
+    random.seed(7)
+    with Session(database.engine) as db:
+        user = User(username="benchmark", email="benchmark@binna.app", hashed_password="x" * 60)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        for index in range(customers):
+            customer = CustomerEstablishment(
+                name=f"Cliente {index}",
+                description=f"Empresa {index} dedicada a la venta de productos " * 2,
+                industry=random.choice(INDUSTRIES),
+                user_id=user.id
+            )
+            db.add(customer)
+            db.flush()
+            db.add(Contact(
+                name=f"Contacto {index}",
+                role=random.choice(ROLES),
+                email=f"contacto{index}@cliente{index}.cl",
+                phone=f"+5691234{index:04d}",
+                user_id=user.id,
+                establishment_id=customer.id
+            ))
+            for note_index in range(3):
+                db.add(AdditionalNote(
+                    title=f"Nota {note_index} del cliente {index}",
+                    content="Conversamos sobre la próxima compra y los plazos de entrega. " * 6,
+                    customer_establishment_id=customer.id
+                ))
+        db.commit()
+        return user.id
+
+
+def legacy_serialize(output: dict) -> str:
+    # The list tools returned every row as a plain list
+    if isinstance(output["output"], Page):
+        output = {**output, "output": output["output"].items}
+    return json.dumps(output, default=str)
+
+
+def make_output(function_name: str, result) -> dict:
+    return {
+        "success": result is not None,
+        "function_name": function_name,
+        "message": "Successfully executed tool",
+        "output": result
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size of the tool outputs sent to the assistant")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--max-bytes", type=int, default=12000)
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    database.migrate()
+    user_id = create_account(database, args.customers)
+
+    # The largest pages show the output budget at work. The assistant always gets a page, also
+    # when it sends a null limit.
+    tool_calls = [
+        ("get_all_customer", {"limit": MAX_PAGE_SIZE}),
+        ("get_all_contacts", {"limit": MAX_PAGE_SIZE}),
+        ("get_all_customer", {}),
+        ("get_all_customer", {"limit": None}),
+        ("get_all_additional_notes", {"customer_id": 1}),
+        ("get_all_additional_notes_summarized", {"customer_id": 1}),
+        ("get_customer_by_id", {"customer_id": 1}),
+        ("get_user_profile", {}),
+    ]
+
+    print(f"Account: {args.customers} customers, 1 contact and 3 notes each")
+    print(f"{'tool':52} {'legacy':>9} {'compact':>9} {'budget':>9} {'~tokens':>15} {'ms':>6}")
+    with Session(database.engine) as db:
+        for function_name, arguments in tool_calls:
+            arguments = BinnaAssistantDescription.parse_tool_arguments(
+                function_name, json.dumps(arguments)
+            )
+            result = BinnaAssistantDescription.dispatch_tool(
+                function_name, arguments, db=db, user_id=user_id
+            )
+            output = make_output(function_name, result)
+
+            legacy = len(legacy_serialize(output).encode())
+            compact = len(serialize_tool_output(output, 0).encode())
+            start = time.perf_counter()
+            budgeted = len(serialize_tool_output(output, args.max_bytes).encode())
+            elapsed = (time.perf_counter() - start) * 1000
+
+            label = f"{function_name}({','.join(f'{k}={v}' for k, v in arguments.items())})"
+            print(
+                f"{label:52} {legacy:9} {compact:9} {budgeted:9} "
+                f"{legacy // 4:>7}->{budgeted // 4:<7} {elapsed:6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from typing import Any, Optional
+from pydantic import BaseModel, ConfigDict
+from sqlmodel import Session, func, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+# Page size of the list tools when the assistant doesn't send a limit, and the max allowed
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+class Page(BaseModel):
+    """
+    A page of a list query. `next_cursor` is None on the last page.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    items: list[Any]
+    total_count: int
+    next_cursor: Optional[int] = None
+
+def paginate(
+    db: Session,
+    query: SelectOfScalar,
+    id_column,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    cursor: Optional[int] = None,
+    descending: bool = False
+) -> Page:
+    """
+    Run a filtered query one page at a time, ordered by id (keyset pagination: the cursor is
+    the id of the last item of the previous page, so deep pages cost the same as the first).
+
+    Args:
+        query (SelectOfScalar): query with every filter applied
+        id_column: id column of the model, used to order and as cursor
+        limit (Optional[int]): page size, capped to MAX_PAGE_SIZE. None is DEFAULT_PAGE_SIZE
+        cursor (Optional[int]): `next_cursor` of the previous page
+        descending (bool): newest items (highest ids) first
+    """
+    total_count = db.exec(select(func.count()).select_from(query.subquery())).one()
+
+    if descending:
+        page_query = query.order_by(id_column.desc())
+        if cursor is not None:
+            page_query = page_query.where(id_column < cursor)
+    else:
+        page_query = query.order_by(id_column)
+        if cursor is not None:
+            page_query = page_query.where(id_column > cursor)
+
+    # An explicit null limit sent by the assistant is still a bounded page
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    # One extra row tells if there is a next page without another query
+    items = db.exec(page_query.limit(limit + 1)).all()
+    has_next_page = len(items) > limit
+    items = items[:limit]
+
+    return Page(
+        items=items,
+        total_count=total_count,
+        next_cursor=items[-1].id if has_next_page else None
+    )
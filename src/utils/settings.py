@@ -6,6 +6,23 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_ASSISTANT_KEY = os.getenv('OPENAI_ASSISTANT_KEY')
 
+# HTTP client of OpenAI: connection pool, keep-alive, timeouts (the read timeout is the max wait
+# between two chunks of a response) and retries with jittered backoff of the requests that are
+# safe to send again
+OPENAI_HTTP_MAX_CONNECTIONS = int(os.getenv('OPENAI_HTTP_MAX_CONNECTIONS', 100))
+OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS', 30))
+OPENAI_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('OPENAI_HTTP_CONNECT_TIMEOUT_SECONDS', 5))
+OPENAI_HTTP_READ_TIMEOUT_SECONDS = float(os.getenv('OPENAI_HTTP_READ_TIMEOUT_SECONDS', 60))
+OPENAI_HTTP_MAX_RETRIES = int(os.getenv('OPENAI_HTTP_MAX_RETRIES', 2))
+OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS = float(os.getenv('OPENAI_HTTP_RETRY_BASE_DELAY_SECONDS', 0.5))
+OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS = float(os.getenv('OPENAI_HTTP_RETRY_MAX_DELAY_SECONDS', 4))
+
+# After this many consecutive failed requests to OpenAI the chat fails fast for
+# OPENAI_CIRCUIT_RESET_SECONDS, then a single request probes it again (0 disables the breaker)
+OPENAI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('OPENAI_CIRCUIT_FAILURE_THRESHOLD', 5))
+OPENAI_CIRCUIT_RESET_SECONDS = float(os.getenv('OPENAI_CIRCUIT_RESET_SECONDS', 30))
+
 AUTH_SECRET_KEY = os.getenv('AUTH_SECRET_KEY')
 AUTH_TOKEN_ALGORITHM = os.getenv('AUTH_TOKEN_ALGORITHM')
 
@@ -16,6 +33,62 @@ MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
 USE_MYSQL = MYSQL_HOST is not None
 MYSQL_CONNECTION_URL = f"mysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
 
+# Sync the OpenAI assistant config (tools, instructions, model) at startup when it changed.
+# Disable it for offline and test runs.
+ASSISTANT_CONFIG_SYNC = os.getenv('ASSISTANT_CONFIG_SYNC', 'true').lower() not in ('0', 'false', 'no')
+
+# Max number of read-only assistant tools executed at the same time
+TOOL_EXECUTOR_MAX_WORKERS = int(os.getenv('TOOL_EXECUTOR_MAX_WORKERS', 8))
+
+# Send only the tool groups a turn may need (chosen by keywords and the groups used in the
+# last TOOL_SUBSETTING_RECENT_TURNS turns of the thread) instead of every tool
+TOOL_SUBSETTING_ENABLED = os.getenv('TOOL_SUBSETTING_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+TOOL_SUBSETTING_RECENT_TURNS = int(os.getenv('TOOL_SUBSETTING_RECENT_TURNS', 3))
+
+# Outputs of read-only tools cached during a chat run (0 disables the cache)
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv('TOOL_CACHE_MAX_ENTRIES', 128))
+
+# The date sent in the context of every run is rounded down to this many minutes, so the
+# prompt prefix stays the same (and cacheable by the provider) between turns
+CHAT_CONTEXT_TIME_RESOLUTION_MINUTES = int(os.getenv('CHAT_CONTEXT_TIME_RESOLUTION_MINUTES', 15))
+
+# Runs read only the last messages of the thread (0 reads the whole thread). The older messages
+# are kept as a rolling summary sent with the run, refreshed once CHAT_CONTEXT_SUMMARY_INTERVAL
+# messages fall out of the last CHAT_CONTEXT_LAST_MESSAGES (0 disables it). Runs read every
+# message after the summary, up to CHAT_CONTEXT_LAST_MESSAGES + CHAT_CONTEXT_SUMMARY_INTERVAL.
+CHAT_CONTEXT_LAST_MESSAGES = int(os.getenv('CHAT_CONTEXT_LAST_MESSAGES', 20))
+CHAT_CONTEXT_SUMMARY_INTERVAL = int(os.getenv('CHAT_CONTEXT_SUMMARY_INTERVAL', 10))
+CHAT_CONTEXT_SUMMARY_MODEL = os.getenv('CHAT_CONTEXT_SUMMARY_MODEL', 'gpt-4o-mini')
+CHAT_CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_CONTEXT_SUMMARY_MAX_TOKENS', 400))
+
+# Max size in bytes of a tool output sent to the assistant (~4 bytes per token). Bigger lists
+# are cut with a note asking for a more specific query (0 disables the limit)
+TOOL_OUTPUT_MAX_BYTES = int(os.getenv('TOOL_OUTPUT_MAX_BYTES', 12000))
+
+# Text deltas of the chat stream are merged into a single write until one of these limits is
+# reached. Set both to 0 to send every delta as it arrives.
+CHAT_STREAM_FLUSH_INTERVAL_MS = int(os.getenv('CHAT_STREAM_FLUSH_INTERVAL_MS', 50))
+CHAT_STREAM_FLUSH_BYTES = int(os.getenv('CHAT_STREAM_FLUSH_BYTES', 256))
+
+# Concurrent chat runs admitted by this process. Messages sent to a thread with an active run
+# wait behind it, up to CHAT_MAX_QUEUED_PER_THREAD; anything over the limits gets a 429.
+CHAT_MAX_ACTIVE_RUNS = int(os.getenv('CHAT_MAX_ACTIVE_RUNS', 64))
+CHAT_MAX_ACTIVE_RUNS_PER_USER = int(os.getenv('CHAT_MAX_ACTIVE_RUNS_PER_USER', 3))
+CHAT_MAX_QUEUED_PER_THREAD = int(os.getenv('CHAT_MAX_QUEUED_PER_THREAD', 2))
+
+# Chat runs keep streaming in the background when the client disconnects, so it can reattach
+# with /chat/stream. Bytes of events kept per run, seconds a run continues without any client
+# before it is cancelled, and seconds a finished run stays available.
+CHAT_RUN_BUFFER_BYTES = int(os.getenv('CHAT_RUN_BUFFER_BYTES', 65536))
+CHAT_RUN_REATTACH_GRACE_SECONDS = float(os.getenv('CHAT_RUN_REATTACH_GRACE_SECONDS', 20))
+CHAT_RUN_RETENTION_SECONDS = float(os.getenv('CHAT_RUN_RETENTION_SECONDS', 120))
+
+# Empty threads pre-created in the background so /chat/create doesn't wait for OpenAI, and the
+# max threads created per second to refill the pool. Disabled (0) by default, so offline, test
+# and script runs don't create OpenAI threads.
+CHAT_THREAD_POOL_SIZE = int(os.getenv('CHAT_THREAD_POOL_SIZE', 0))
+CHAT_THREAD_POOL_REFILL_PER_SECOND = float(os.getenv('CHAT_THREAD_POOL_REFILL_PER_SECOND', 2))
+
 ERROR_ON_NULL = {
     'OPENAI_API_KEY': OPENAI_API_KEY, 
     'OPENAI_ASSISTANT_KEY': OPENAI_ASSISTANT_KEY, 